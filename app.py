@@ -3,14 +3,22 @@ import os
 import requests
 import json
 import base64
+import csv
+import gzip
+import io
+import hashlib
+import hmac
+import zlib
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 import psycopg2
 from psycopg2.extras import Json, execute_values
 from zoneinfo import ZoneInfo
 from psycopg2 import pool
 from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
 load_dotenv()
@@ -28,6 +36,61 @@ except Exception as _redis_err:
     print(f"⚠️ Redis no disponible — SSE deshabilitado: {_redis_err}")
 
 
+# Batcher de comandos Redis fire-and-forget: dentro de `with redis_batch():` los
+# comandos que pasan por _redis_deferred() se acumulan en un pipeline por thread y
+# salen en un solo round trip al cerrar el bloque (un request / una iteración de
+# worker). Fuera del bloque se ejecutan en el momento, como antes.
+_redis_batch_local = threading.local()
+
+
+@contextmanager
+def redis_batch():
+    if _redis_client is None or getattr(_redis_batch_local, "pipe", None) is not None:
+        yield  # sin Redis o bloque anidado: usa el pipeline externo
+        return
+    pipe = _redis_client.pipeline(transaction=False)
+    callbacks = []
+    _redis_batch_local.pipe = pipe
+    _redis_batch_local.callbacks = callbacks
+    try:
+        yield
+    finally:
+        _redis_batch_local.pipe = None
+        _redis_batch_local.callbacks = None
+        with _stage("redis_flush"):
+            _flush_redis_batch(pipe, callbacks)
+
+
+def _flush_redis_batch(pipe, callbacks):
+    if not callbacks:
+        return
+    try:
+        replies = pipe.execute(raise_on_error=False)
+    except Exception as err:
+        # error de conexión: falló el pipeline completo
+        replies = [err] * len(callbacks)
+    for reply, on_error in zip(replies, callbacks):
+        if isinstance(reply, Exception):
+            print(f"⚠️ redis_batch: comando falló: {reply}")
+            if on_error is not None:
+                try:
+                    on_error(str(reply))
+                except Exception as cb_err:
+                    print(f"⚠️ redis_batch: fallback falló: {cb_err}")
+
+
+def _redis_deferred(build, on_error=None):
+    """Ejecuta build(cliente) ya, o lo encola en el redis_batch() activo. En modo
+    batch el error llega después, vía on_error(error)."""
+    pipe = getattr(_redis_batch_local, "pipe", None)
+    if pipe is None:
+        return build(_redis_client)
+    before = len(pipe)
+    build(pipe)
+    _redis_batch_local.callbacks.extend([on_error] * (len(pipe) - before))
+    return None
+
+
 def sse_notify(channel: str, data: dict = None):
     """
     Publish an SSE event to Redis pub/sub.
@@ -43,7 +106,7 @@ def sse_notify(channel: str, data: dict = None):
             "data": data or {},
             "timestamp": datetime.now(ZoneInfo("UTC")).isoformat(),
         })
-        _redis_client.publish(f"sse:{channel}", payload)
+        _redis_deferred(lambda client: client.publish(f"sse:{channel}", payload))
     except Exception:
         pass  # Best-effort — never block the webhook
 
@@ -54,11 +117,13 @@ db_pool = pool.ThreadedConnectionPool(
 
 @contextmanager
 def db_cursor():
-    conn = db_pool.getconn()
+    with _stage("db_checkout"):
+        conn = db_pool.getconn()
     try:
         with conn.cursor() as cur:
             yield cur
-        conn.commit()
+        with _stage("db_commit"):
+            conn.commit()
     except Exception:
         conn.rollback()
         raise
@@ -83,14 +148,208 @@ WEBHOOKS_MAX_LIMIT = int(os.getenv("WEBHOOKS_MAX_LIMIT", "500"))
 WEBHOOK_PREVIEW_ASYNC = os.getenv("WEBHOOK_PREVIEW_ASYNC", "0") == "1"
 WEBHOOKS_CURSOR_MODE = os.getenv("WEBHOOKS_CURSOR_MODE", "0") == "1"
 WEBHOOK_TOPICS_CACHE_TTL = float(os.getenv("WEBHOOK_TOPICS_CACHE_TTL", "10"))
+# Ventana (días) del fallback de /api/webhooks que lee `webhooks` cuando no hay
+# webhook_latest. Con la tabla particionada por received_at el planner descarta
+# las particiones fuera de la ventana. 0 = historial completo.
+WEBHOOKS_FALLBACK_LOOKBACK_DAYS = int(os.getenv("WEBHOOKS_FALLBACK_LOOKBACK_DAYS", "0"))
+# El GROUP BY sobre `webhooks` cuando falta webhook_latest es opt-in: sin el flag
+# /api/webhooks responde 503 (el snapshot se arma con rebuild_webhook_latest.py).
+WEBHOOKS_LEGACY_FALLBACK = os.getenv("WEBHOOKS_LEGACY_FALLBACK", "0") == "1"
+# `total` de /api/webhooks: estimate = latest_count de webhook_topic_counts
+# (triggers), exact = COUNT(*) sobre webhook_latest, none = sin total.
+WEBHOOKS_COUNT_MODES = ("exact", "estimate", "none")
+WEBHOOKS_COUNT_DEFAULT = os.getenv("WEBHOOKS_COUNT_DEFAULT", "estimate")
+# GET /api/webhooks/export: stream NDJSON/CSV de webhooks + ml_previews con un
+# cursor server-side sobre una conexión propia (no del pool). Cupo de exports
+# simultáneos; un cliente que deja de leer más de IDLE segundos corta el export
+# (idle_in_transaction_session_timeout) en vez de retener la conexión, y ningún
+# export dura más de MAX segundos de pared (se corta entre batches).
+WEBHOOKS_EXPORT_FETCH = int(os.getenv("WEBHOOKS_EXPORT_FETCH", "2000"))
+WEBHOOKS_EXPORT_CONCURRENCY = int(os.getenv("WEBHOOKS_EXPORT_CONCURRENCY", "2"))
+WEBHOOKS_EXPORT_IDLE_SECONDS = int(os.getenv("WEBHOOKS_EXPORT_IDLE_SECONDS", "60"))
+WEBHOOKS_EXPORT_MAX_SECONDS = int(os.getenv("WEBHOOKS_EXPORT_MAX_SECONDS", "1800"))
+# Con WEBHOOKS_SQL_JSON=1 la lectura sobre webhook_latest arma cada evento en
+# Postgres (jsonb_build_object + to_char en hora de Buenos Aires) y Flask sólo
+# concatena los textos: sin dict ni strftime por fila. El fallback legado sigue
+# por el loop en Python. scripts/bench_webhooks_json.py compara los dos.
+WEBHOOKS_SQL_JSON = os.getenv("WEBHOOKS_SQL_JSON", "0") == "1"
+# /api/webhooks/changes: filas de webhook_latest (received_at) o ml_previews
+# (last_updated) más nuevas que el token. El token es el NOW() de la consulta
+# anterior; se relee con OVERLAP segundos de margen para no perder escrituras
+# que empezaron antes y commitearon después (el cliente mergea por resource,
+# repetir filas es inocuo). Con más de MAX cambios se pide recargar la página.
+WEBHOOKS_CHANGES_OVERLAP_SECONDS = float(os.getenv("WEBHOOKS_CHANGES_OVERLAP_SECONDS", "5"))
+WEBHOOKS_CHANGES_MAX = int(os.getenv("WEBHOOKS_CHANGES_MAX", str(WEBHOOKS_MAX_LIMIT)))
+# Cache de la primera página de /api/webhooks por (topic, limit, modo, count),
+# invalidado con una versión por topic (Redis, compartida entre procesos) que
+# suben los upserts de webhook_latest y los writes de ml_previews. ETag fuerte
+# sobre el body: los polls sin cambios reciben 304 sin tocar la DB.
+WEBHOOKS_PAGE_CACHE = os.getenv("WEBHOOKS_PAGE_CACHE", "0") == "1"
+WEBHOOKS_PAGE_CACHE_TTL = float(os.getenv("WEBHOOKS_PAGE_CACHE_TTL", "60"))
+WEBHOOKS_PAGE_CACHE_SIZE = int(os.getenv("WEBHOOKS_PAGE_CACHE_SIZE", "256"))
+WEBHOOKS_PAGE_VERSION_KEY = os.getenv("WEBHOOKS_PAGE_VERSION_KEY", "webhooks:page_version")
 PREVIEW_QUEUE_KEY = os.getenv("PREVIEW_QUEUE_KEY", "queue:preview:resources")
 PREVIEW_DEAD_QUEUE_KEY = os.getenv("PREVIEW_DEAD_QUEUE_KEY", "queue:preview:dead")
 PROMOS_DIRTY_SET_KEY = os.getenv("PROMOS_DIRTY_SET_KEY", "promos:dirty:mlas")
 PROMOS_WEBHOOK_ENABLED = os.getenv("PROMOS_WEBHOOK_ENABLED", "1") == "1"
+# Group commit: /webhook bufferea eventos unos ms (o N filas) y los escribe en
+# un solo INSERT multi-fila + un upsert batch de webhook_latest.
+WEBHOOK_GROUP_COMMIT = os.getenv("WEBHOOK_GROUP_COMMIT", "0") == "1"
+WEBHOOK_GROUP_COMMIT_MAX_ROWS = int(os.getenv("WEBHOOK_GROUP_COMMIT_MAX_ROWS", "200"))
+WEBHOOK_GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("WEBHOOK_GROUP_COMMIT_MAX_WAIT_MS", "5"))
+WEBHOOK_GROUP_COMMIT_TIMEOUT = float(os.getenv("WEBHOOK_GROUP_COMMIT_TIMEOUT", "10"))
+# Write-ahead en Redis Stream: /webhook hace XADD del body y responde; worker_ingest
+# drena el stream en batches hacia webhooks/webhook_latest.
+WEBHOOK_INGEST_STREAM = os.getenv("WEBHOOK_INGEST_STREAM", "0") == "1"
+INGEST_STREAM_KEY = os.getenv("INGEST_STREAM_KEY", "stream:webhooks:ingest")
+INGEST_STREAM_GROUP = os.getenv("INGEST_STREAM_GROUP", "ingest")
+INGEST_DEAD_QUEUE_KEY = os.getenv("INGEST_DEAD_QUEUE_KEY", "queue:ingest:dead")
+# Guarda el body crudo del request como payload (::jsonb) en vez de re-serializar
+# el dict con Json() para webhooks y webhook_latest.
+WEBHOOK_RAW_JSONB = os.getenv("WEBHOOK_RAW_JSONB", "0") == "1"
+# Filtro in-process de _id recientes: las redeliveries de ML se contestan 200 sin
+# tocar Postgres ni despachar preview. 0 = deshabilitado.
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", "0"))
+WEBHOOK_DEDUP_WINDOW_SECONDS = float(os.getenv("WEBHOOK_DEDUP_WINDOW_SECONDS", "900"))
+# Timers por etapa de /webhook (parse, checkout, INSERT, upsert, commit, Redis) en
+# histogramas in-process; WEBHOOK_SERVER_TIMING=1 además los manda en el header
+# Server-Timing de cada respuesta.
+WEBHOOK_STAGE_TIMING = os.getenv("WEBHOOK_STAGE_TIMING", "1") == "1"
+WEBHOOK_SERVER_TIMING = os.getenv("WEBHOOK_SERVER_TIMING", "0") == "1"
+# Heavy hitters por topic: count-min sketch + top-K por slot de tiempo; la
+# ventana deslizante son los últimos HOT_RESOURCES_SLOTS slots. Se alimenta en
+# /webhook y se lee en /debug/hot-resources.
+HOT_RESOURCES_ENABLED = os.getenv("HOT_RESOURCES_ENABLED", "1") == "1"
+HOT_RESOURCES_WINDOW_SECONDS = float(os.getenv("HOT_RESOURCES_WINDOW_SECONDS", "300"))
+HOT_RESOURCES_SLOTS = max(1, int(os.getenv("HOT_RESOURCES_SLOTS", "5")))
+HOT_RESOURCES_TOP_K = max(1, int(os.getenv("HOT_RESOURCES_TOP_K", "50")))
+HOT_RESOURCES_SKETCH_WIDTH = max(1, int(os.getenv("HOT_RESOURCES_SKETCH_WIDTH", "1024")))
+# 1..16: cada fila toma 4 bytes de un digest blake2b (máx. 64 bytes)
+HOT_RESOURCES_SKETCH_DEPTH = min(16, max(1, int(os.getenv("HOT_RESOURCES_SKETCH_DEPTH", "4"))))
+# POST /webhook/batch (NDJSON, opcionalmente gzip) para replays/migraciones
+# internas: filas por INSERT multi-fila, tope de líneas por request y token
+# opcional (Authorization: Bearer).
+WEBHOOK_BATCH_ROWS = int(os.getenv("WEBHOOK_BATCH_ROWS", "1000"))
+WEBHOOK_BATCH_MAX_LINES = int(os.getenv("WEBHOOK_BATCH_MAX_LINES", "200000"))
+WEBHOOK_BATCH_TOKEN = os.getenv("WEBHOOK_BATCH_TOKEN", "")
+# Outbox transaccional: el job de preview se escribe en preview_outbox dentro de la
+# transacción del INSERT y lo drena worker_outbox.py (reemplaza cola Redis/threads).
+WEBHOOK_PREVIEW_OUTBOX = os.getenv("WEBHOOK_PREVIEW_OUTBOX", "0") == "1"
+# Fallback cuando no hay cola (Redis caído / sync): pool acotado de threads con
+# backlog acotado, coalesce por resource y descarte del más viejo al llenarse.
+# Mínimo 1: con 0 el pool no arranca y el descarte hace popitem() de un backlog vacío.
+PREVIEW_FALLBACK_WORKERS = max(1, int(os.getenv("PREVIEW_FALLBACK_WORKERS", "4")))
+PREVIEW_FALLBACK_MAX_PENDING = max(1, int(os.getenv("PREVIEW_FALLBACK_MAX_PENDING", "500")))
+# Debounce de previews: en vez de la lista PREVIEW_QUEUE_KEY, un sorted set de
+# vencimientos + uno de pendientes (first-seen). Cada notificación del mismo
+# resource corre el vencimiento a now+QUIET, con tope first_seen+MAX_DELAY.
+PREVIEW_COALESCE = os.getenv("PREVIEW_COALESCE", "0") == "1"
+PREVIEW_DUE_KEY = os.getenv("PREVIEW_DUE_KEY", "queue:preview:due")
+PREVIEW_PENDING_KEY = os.getenv("PREVIEW_PENDING_KEY", "queue:preview:pending")
+PREVIEW_ATTEMPTS_KEY = os.getenv("PREVIEW_ATTEMPTS_KEY", "queue:preview:attempts")
+PREVIEW_STATS_KEY = os.getenv("PREVIEW_STATS_KEY", "queue:preview:stats")
+PREVIEW_QUIET_SECONDS = float(os.getenv("PREVIEW_QUIET_SECONDS", "5"))
+PREVIEW_MAX_DELAY_SECONDS = float(os.getenv("PREVIEW_MAX_DELAY_SECONDS", "30"))
+# Lanes de preview por clase de resource (en orden de prioridad). Cada lane tiene
+# su propia cola (`<key>:<lane>`) y el worker desencola weighted-fair: por ronda
+# hasta `peso` jobs de cada lane. Peso 0 = lane pausada.
+PREVIEW_LANES = ("claims", "orders", "shipments", "items", "price_to_win", "other")
+
+
+def _parse_lane_weights(raw: str):
+    weights = {"claims": 8, "orders": 8, "shipments": 4, "items": 2, "price_to_win": 1, "other": 1}
+    for part in (raw or "").split(","):
+        lane, _, value = part.strip().partition("=")
+        if not lane:
+            continue
+        try:
+            if lane not in weights:
+                raise ValueError("lane desconocida")
+            weights[lane] = max(0, int(value))
+        except ValueError as err:
+            print(f"⚠️ PREVIEW_LANE_WEIGHTS: se ignora '{part.strip()}' ({err})")
+    return weights
+
+
+PREVIEW_LANE_WEIGHTS = _parse_lane_weights(os.getenv("PREVIEW_LANE_WEIGHTS", ""))
+# Admission control de previews: si el backlog (profundidad cacheada, se refresca
+# cada PREVIEW_ADMISSION_REFRESH_SECONDS) supera SOFT, no se encolan previews de
+# PREVIEW_SHED_SOFT_LANES; sobre HARD, sólo pasan PREVIEW_SHED_KEEP_LANES. El evento
+# se guarda igual. 0 = umbral deshabilitado.
+PREVIEW_SHED_SOFT_DEPTH = int(os.getenv("PREVIEW_SHED_SOFT_DEPTH", "0"))
+PREVIEW_SHED_HARD_DEPTH = int(os.getenv("PREVIEW_SHED_HARD_DEPTH", "0"))
+PREVIEW_SHED_SOFT_LANES = frozenset(
+    lane.strip() for lane in os.getenv("PREVIEW_SHED_SOFT_LANES", "price_to_win,other").split(",") if lane.strip()
+)
+PREVIEW_SHED_KEEP_LANES = frozenset(
+    lane.strip() for lane in os.getenv("PREVIEW_SHED_KEEP_LANES", "claims,orders").split(",") if lane.strip()
+)
+PREVIEW_ADMISSION_REFRESH_SECONDS = float(os.getenv("PREVIEW_ADMISSION_REFRESH_SECONDS", "2"))
 
 _topics_cache = {"value": None, "expires_at": 0.0}
 _topics_cache_lock = threading.Lock()
 
+# Primera página serializada de /api/webhooks (LRU). Las versiones locales sólo
+# se usan sin Redis (un proceso); con Redis manda la versión compartida.
+_webhooks_page_cache = OrderedDict()  # (topic, limit, cursor_mode, count) -> entry
+_webhooks_page_versions = {}
+_webhooks_page_state = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "version_errors": 0}
+_webhooks_page_lock = threading.Lock()
+
+# Dos generaciones de ids: al llenarse `current` (o vencer la ventana) pasa a
+# `previous` y la anterior se descarta. Exacto (sin falsos positivos) y acotado.
+_dedup_state = {
+    "current": set(),
+    "previous": set(),
+    "rotated_at": time.monotonic(),
+    "rotations": 0,
+    "hits": 0,
+    "misses": 0,
+}
+_dedup_lock = threading.Lock()
+
+# Histogramas de latencia por etapa de /webhook (ms). Cada request acumula sus
+# etapas en un dict thread-local y las vuelca acá una vez, al terminar.
+_STAGE_BUCKETS_MS = (0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_stage_histograms = {}
+_stage_lock = threading.Lock()
+_stage_local = threading.local()
+
+# topic -> lista de slots {"epoch", "sketch", "top", "top_min", "total"}; cada
+# slot cubre WINDOW/SLOTS segundos y se recicla cuando su epoch queda fuera.
+_hot_state = {"topics": {}}
+_hot_lock = threading.Lock()
+
+# Profundidad del backlog de previews vista por este proceso. Un solo thread la
+# refresca (lock no bloqueante); el resto usa el último valor.
+_admission_state = {
+    "depth": None,
+    "level": "ok",
+    "refreshed_at": 0.0,
+    "refresh_errors": 0,
+    "shed": {},
+}
+_admission_lock = threading.Lock()
+_admission_refresh_lock = threading.Lock()
+
+_preview_fallback_executor = ThreadPoolExecutor(
+    max_workers=PREVIEW_FALLBACK_WORKERS, thread_name_prefix="preview-fallback",
+)
+_preview_fallback_pending = OrderedDict()  # resource -> monotonic de alta
+_preview_fallback_lock = threading.Lock()
+_preview_fallback_state = {
+    "active_workers": 0,
+    "accepted": 0,
+    "coalesced": 0,
+    "dropped": 0,
+    "processed": 0,
+    "errors": 0,
+}
+
+_group_commit_cond = threading.Condition()
+_group_commit_queue = []
+_group_commit_thread = None
+
 _sweep_state = {
     "running": False,
     "started_at": None,
@@ -105,6 +364,8 @@ _sweep_state = {
     "min_age_hours": 0,
 }
 _sweep_lock = threading.Lock()
+
+_export_slots = threading.BoundedSemaphore(WEBHOOKS_EXPORT_CONCURRENCY)
 
 
 FAVICON_DIR = "https://ml-webhook.gaussonline.com.ar/assets/white-g-BfxDaKwI.png"
@@ -168,30 +429,961 @@ def _decode_webhooks_cursor(cursor: str):
     return datetime.fromisoformat(ts_raw), resource
 
 
+def _encode_changes_token(watermark: datetime):
+    raw = f"v1|{watermark.isoformat()}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def _decode_changes_token(token: str):
+    decoded = base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8")
+    version, ts_raw = decoded.split("|", 1)
+    if version != "v1":
+        raise ValueError(f"versión de token desconocida: {version}")
+    watermark = datetime.fromisoformat(ts_raw)
+    if watermark.tzinfo is None:
+        raise ValueError("token sin zona horaria")
+    return watermark
+
+
+# KEYS: due, pending, stats — ARGV: resource, now, quiet, max_delay, count_stats, lane
+_PREVIEW_SCHEDULE_LUA = """
+local now = tonumber(ARGV[2])
+local first = redis.call('ZSCORE', KEYS[2], ARGV[1])
+local is_new = 0
+if first then
+    first = tonumber(first)
+else
+    redis.call('ZADD', KEYS[2], now, ARGV[1])
+    first = now
+    is_new = 1
+end
+local due = math.min(now + tonumber(ARGV[3]), first + tonumber(ARGV[4]))
+redis.call('ZADD', KEYS[1], due, ARGV[1])
+if ARGV[5] == '1' then
+    redis.call('HINCRBY', KEYS[3], 'notified', 1)
+    redis.call('HINCRBY', KEYS[3], 'scheduled', is_new)
+    redis.call('HINCRBY', KEYS[3], 'notified:' .. ARGV[6], 1)
+end
+return is_new
+"""
+
+# KEYS: stats, luego (due, pending) por lane — ARGV: now, límite por lane..., nombre por lane...
+# Devuelve los resources vencidos en el orden de las lanes (prioridad).
+_PREVIEW_CLAIM_LUA = """
+local lanes = (#KEYS - 1) / 2
+local out = {}
+for i = 1, lanes do
+    local limit = tonumber(ARGV[1 + i])
+    if limit > 0 then
+        local due_key, pending_key = KEYS[2 * i], KEYS[2 * i + 1]
+        local items = redis.call('ZRANGEBYSCORE', due_key, '-inf', ARGV[1], 'LIMIT', 0, limit)
+        for _, member in ipairs(items) do
+            redis.call('ZREM', due_key, member)
+            redis.call('ZREM', pending_key, member)
+            table.insert(out, member)
+        end
+        if #items > 0 then
+            redis.call('HINCRBY', KEYS[1], 'claimed', #items)
+            redis.call('HINCRBY', KEYS[1], 'claimed:' .. ARGV[1 + lanes + i], #items)
+        end
+    end
+end
+return out
+"""
+
+_redis_scripts = {}
+
+
+def _redis_script(lua):
+    """Script registrado (EVALSHA con fallback a EVAL) para el cliente actual."""
+    key = (id(_redis_client), lua)
+    script = _redis_scripts.get(key)
+    if script is None:
+        script = _redis_client.register_script(lua)
+        _redis_scripts[key] = script
+    return script
+
+
+def _preview_lane(resource: str) -> str:
+    """Clase del resource para elegir lane (mismo ruteo que fetch_and_store_preview)."""
+    if resource.startswith("/post-purchase/v1/claims/"):
+        return "claims"
+    if resource.startswith("/orders/"):
+        return "orders"
+    if resource.startswith("/shipments/"):
+        return "shipments"
+    if resource.endswith("/price_to_win"):
+        return "price_to_win"
+    if resource.startswith("/items/"):
+        return "items"
+    return "other"
+
+
+def _preview_lane_key(base: str, lane: str) -> str:
+    return f"{base}:{lane}"
+
+
+def _schedule_preview(resource: str, delay: float = None, client=None):
+    """Agenda el preview con debounce. `delay` fuerza un vencimiento fijo
+    (reintentos) y no cuenta como notificación. True si no estaba pendiente.
+    `client` permite encolarlo en un pipeline (el resultado llega con execute())."""
+    lane = _preview_lane(resource)
+    quiet = PREVIEW_QUIET_SECONDS if delay is None else delay
+    max_delay = PREVIEW_MAX_DELAY_SECONDS if delay is None else delay
+    is_new = _redis_script(_PREVIEW_SCHEDULE_LUA)(
+        keys=[
+            _preview_lane_key(PREVIEW_DUE_KEY, lane),
+            _preview_lane_key(PREVIEW_PENDING_KEY, lane),
+            PREVIEW_STATS_KEY,
+        ],
+        args=[resource, time.time(), quiet, max_delay, "1" if delay is None else "0", lane],
+        client=client or _redis_client,
+    )
+    return bool(is_new)
+
+
+def _claim_due_previews(rounds: int = 1):
+    """Saca (atómicamente) resources vencidos: hasta `peso * rounds` por lane,
+    ordenados por prioridad de lane."""
+    keys, limits = [PREVIEW_STATS_KEY], []
+    for lane in PREVIEW_LANES:
+        keys += [_preview_lane_key(PREVIEW_DUE_KEY, lane), _preview_lane_key(PREVIEW_PENDING_KEY, lane)]
+        limits.append(PREVIEW_LANE_WEIGHTS.get(lane, 0) * rounds)
+    return _redis_script(_PREVIEW_CLAIM_LUA)(
+        keys=keys,
+        args=[time.time(), *limits, *PREVIEW_LANES],
+    )
+
+
+def _preview_lane_stats():
+    """Profundidad y antigüedad del job más viejo por lane (segundos)."""
+    now = time.time()
+    pipe = _redis_client.pipeline(transaction=False)
+    for lane in PREVIEW_LANES:
+        if PREVIEW_COALESCE:
+            pipe.zcard(_preview_lane_key(PREVIEW_DUE_KEY, lane))
+            pipe.zrange(_preview_lane_key(PREVIEW_PENDING_KEY, lane), 0, 0, withscores=True)
+        else:
+            pipe.llen(_preview_lane_key(PREVIEW_QUEUE_KEY, lane))
+            pipe.lindex(_preview_lane_key(PREVIEW_QUEUE_KEY, lane), 0)
+    replies = pipe.execute()
+
+    lanes = {}
+    for i, lane in enumerate(PREVIEW_LANES):
+        depth, head = replies[2 * i], replies[2 * i + 1]
+        oldest = None
+        if PREVIEW_COALESCE and head:
+            oldest = head[0][1]  # first-seen del pendiente más viejo
+        elif head:
+            try:
+                oldest = datetime.fromisoformat(json.loads(head)["enqueued_at"]).timestamp()
+            except Exception:
+                oldest = None
+        lanes[lane] = {
+            "weight": PREVIEW_LANE_WEIGHTS.get(lane, 0),
+            "depth": int(depth or 0),
+            "oldest_age_seconds": round(max(0.0, now - oldest), 1) if oldest else None,
+        }
+    return lanes
+
+
+def _preview_queue_stats():
+    if _redis_client is None:
+        return {"mode": "coalesce" if PREVIEW_COALESCE else "list", "error": "redis_unavailable"}
+    try:
+        lanes = _preview_lane_stats()
+        depth = sum(lane["depth"] for lane in lanes.values())
+        if not PREVIEW_COALESCE:
+            return {
+                "mode": "list",
+                "depth": depth,
+                # jobs encolados antes de las lanes, que el worker sigue drenando
+                "legacy_depth": _redis_client.llen(PREVIEW_QUEUE_KEY),
+                "lanes": lanes,
+            }
+        raw = _redis_client.hgetall(PREVIEW_STATS_KEY) or {}
+        notified = int(raw.get("notified", 0))
+        claimed = int(raw.get("claimed", 0))
+        for lane, info in lanes.items():
+            info["notified"] = int(raw.get(f"notified:{lane}", 0))
+            info["claimed"] = int(raw.get(f"claimed:{lane}", 0))
+        return {
+            "mode": "coalesce",
+            "depth": depth,
+            "quiet_seconds": PREVIEW_QUIET_SECONDS,
+            "max_delay_seconds": PREVIEW_MAX_DELAY_SECONDS,
+            "notified": notified,
+            "scheduled": int(raw.get("scheduled", 0)),
+            "claimed": claimed,
+            # notificaciones por enriquecimiento real (1.0 = sin coalescing)
+            "coalescing_ratio": round(notified / claimed, 2) if claimed else None,
+            "lanes": lanes,
+        }
+    except Exception as err:
+        return {"error": str(err)}
+
+
+def _preview_backlog_depth():
+    """Jobs pendientes sumando todas las lanes (un round trip)."""
+    pipe = _redis_client.pipeline(transaction=False)
+    for lane in PREVIEW_LANES:
+        if PREVIEW_COALESCE:
+            pipe.zcard(_preview_lane_key(PREVIEW_DUE_KEY, lane))
+        else:
+            pipe.llen(_preview_lane_key(PREVIEW_QUEUE_KEY, lane))
+    if not PREVIEW_COALESCE:
+        pipe.llen(PREVIEW_QUEUE_KEY)
+    return sum(int(depth or 0) for depth in pipe.execute())
+
+
+def _admission_level(depth):
+    if depth is None:
+        return "ok"
+    if PREVIEW_SHED_HARD_DEPTH and depth >= PREVIEW_SHED_HARD_DEPTH:
+        return "hard"
+    if PREVIEW_SHED_SOFT_DEPTH and depth >= PREVIEW_SHED_SOFT_DEPTH:
+        return "soft"
+    return "ok"
+
+
+def _refresh_admission_depth():
+    if time.monotonic() - _admission_state["refreshed_at"] < PREVIEW_ADMISSION_REFRESH_SECONDS:
+        return
+    if not _admission_refresh_lock.acquire(blocking=False):
+        return  # otro request ya está refrescando
+    try:
+        try:
+            depth = _preview_backlog_depth() if _redis_client is not None else None
+        except Exception as err:
+            depth = None
+            with _admission_lock:
+                _admission_state["refresh_errors"] += 1
+            print(f"⚠️ admission: no se pudo leer el backlog de previews: {err}")
+        level = _admission_level(depth)
+        with _admission_lock:
+            if level != _admission_state["level"]:
+                print(f"🔄 admission: backlog de previews {depth} -> nivel {level}")
+            _admission_state["depth"] = depth
+            _admission_state["level"] = level
+            _admission_state["refreshed_at"] = time.monotonic()
+    finally:
+        _admission_refresh_lock.release()
+
+
+def _admit_preview(resource: str):
+    """False si el preview de este resource se descarta por backlog. Sin dato de
+    profundidad (Redis caído) se admite: el fallback ya está acotado."""
+    if not (PREVIEW_SHED_SOFT_DEPTH or PREVIEW_SHED_HARD_DEPTH):
+        return True
+    _refresh_admission_depth()
+    level = _admission_state["level"]
+    if level == "ok":
+        return True
+    lane = _preview_lane(resource)
+    if level == "soft" and lane not in PREVIEW_SHED_SOFT_LANES:
+        return True
+    if level == "hard" and lane in PREVIEW_SHED_KEEP_LANES:
+        return True
+    with _admission_lock:
+        shed = _admission_state["shed"]
+        shed[lane] = shed.get(lane, 0) + 1
+    return False
+
+
+def _admission_stats():
+    with _admission_lock:
+        shed = dict(_admission_state["shed"])
+        return {
+            "enabled": bool(PREVIEW_SHED_SOFT_DEPTH or PREVIEW_SHED_HARD_DEPTH),
+            "soft_depth": PREVIEW_SHED_SOFT_DEPTH,
+            "hard_depth": PREVIEW_SHED_HARD_DEPTH,
+            "depth": _admission_state["depth"],
+            "level": _admission_state["level"],
+            "refresh_errors": _admission_state["refresh_errors"],
+            "shed": shed,
+            "shed_total": sum(shed.values()),
+        }
+
+
 def _enqueue_preview_job(resource: str, attempt: int = 1):
+    """(ok, error). Dentro de redis_batch() el comando sale con el pipeline: si
+    falla ahí, el fallback acotado se dispara desde el propio batch."""
     if _redis_client is None:
         return False, "redis_unavailable"
+    on_error = lambda err: _run_preview_in_background(resource)
     try:
+        if PREVIEW_COALESCE:
+            _redis_deferred(lambda client: _schedule_preview(resource, client=client), on_error)
+            return True, None
         payload = json.dumps({
             "resource": resource,
             "attempt": attempt,
             "enqueued_at": datetime.now(ZoneInfo("UTC")).isoformat(),
         })
-        _redis_client.rpush(PREVIEW_QUEUE_KEY, payload)
+        queue_key = _preview_lane_key(PREVIEW_QUEUE_KEY, _preview_lane(resource))
+        _redis_deferred(lambda client: client.rpush(queue_key, payload), on_error)
         return True, None
     except Exception as err:
         return False, str(err)
 
 
-def _run_preview_in_background(resource: str):
-    def _target():
+def _append_ingest_stream(raw_body: bytes):
+    """XADD del body crudo al stream de ingesta. Devuelve (stream_id, error)."""
+    if _redis_client is None:
+        return None, "redis_unavailable"
+    try:
+        body = raw_body.decode("utf-8") if isinstance(raw_body, bytes) else raw_body
+        # sin MAXLEN: un recorte por largo puede tirar eventos ya contestados con
+        # 200 y todavía sin escribir. worker_ingest recorta sólo lo ya ackeado.
+        stream_id = _redis_client.xadd(INGEST_STREAM_KEY, {"body": body})
+        return stream_id, None
+    except Exception as err:
+        return None, str(err)
+
+
+def _drain_preview_fallback():
+    """Loop de un worker del pool: procesa pendientes (el más viejo primero)
+    hasta vaciar el backlog y libera su lugar."""
+    while True:
+        with _preview_fallback_lock:
+            if not _preview_fallback_pending:
+                _preview_fallback_state["active_workers"] -= 1
+                return
+            resource, _ = _preview_fallback_pending.popitem(last=False)
         try:
             fetch_and_store_preview(resource)
+            outcome = "processed"
         except Exception:
-            pass
+            outcome = "errors"
+        with _preview_fallback_lock:
+            _preview_fallback_state[outcome] += 1
+
+
+def _run_preview_in_background(resource: str):
+    """Encola el preview en el pool acotado. Un resource ya pendiente se coalesce;
+    con el backlog lleno se descarta el pendiente más viejo (quedaría stale)."""
+    start_worker = False
+    with _preview_fallback_lock:
+        if resource in _preview_fallback_pending:
+            _preview_fallback_state["coalesced"] += 1
+            return
+        if len(_preview_fallback_pending) >= PREVIEW_FALLBACK_MAX_PENDING:
+            _preview_fallback_pending.popitem(last=False)
+            _preview_fallback_state["dropped"] += 1
+        _preview_fallback_pending[resource] = time.monotonic()
+        _preview_fallback_state["accepted"] += 1
+        if _preview_fallback_state["active_workers"] < PREVIEW_FALLBACK_WORKERS:
+            _preview_fallback_state["active_workers"] += 1
+            start_worker = True
+    if start_worker:
+        _preview_fallback_executor.submit(_drain_preview_fallback)
+
+
+def _preview_fallback_stats():
+    with _preview_fallback_lock:
+        oldest = next(iter(_preview_fallback_pending.values()), None)
+        return {
+            "workers": PREVIEW_FALLBACK_WORKERS,
+            "max_pending": PREVIEW_FALLBACK_MAX_PENDING,
+            "pending": len(_preview_fallback_pending),
+            "oldest_pending_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else None,
+            **_preview_fallback_state,
+        }
+
+
+def _dedup_rotate_locked():
+    now = time.monotonic()
+    if (len(_dedup_state["current"]) >= WEBHOOK_DEDUP_CACHE_SIZE
+            or now - _dedup_state["rotated_at"] >= WEBHOOK_DEDUP_WINDOW_SECONDS):
+        _dedup_state["previous"] = _dedup_state["current"]
+        _dedup_state["current"] = set()
+        _dedup_state["rotated_at"] = now
+        _dedup_state["rotations"] += 1
+
+
+def _dedup_seen(webhook_id):
+    """True si el _id ya se persistió hace poco (redelivery confirmada)."""
+    if WEBHOOK_DEDUP_CACHE_SIZE <= 0 or not webhook_id:
+        return False
+    with _dedup_lock:
+        _dedup_rotate_locked()
+        if webhook_id in _dedup_state["current"] or webhook_id in _dedup_state["previous"]:
+            _dedup_state["hits"] += 1
+            return True
+        _dedup_state["misses"] += 1
+        return False
+
+
+def _dedup_remember(webhook_id):
+    """Registrar el _id sólo cuando ya es durable (insertado o duplicado en DB)."""
+    if WEBHOOK_DEDUP_CACHE_SIZE <= 0 or not webhook_id:
+        return
+    with _dedup_lock:
+        _dedup_rotate_locked()
+        _dedup_state["current"].add(webhook_id)
+
+
+def _dedup_stats():
+    with _dedup_lock:
+        hits, misses = _dedup_state["hits"], _dedup_state["misses"]
+        return {
+            "enabled": WEBHOOK_DEDUP_CACHE_SIZE > 0,
+            "cache_size": WEBHOOK_DEDUP_CACHE_SIZE,
+            "window_seconds": WEBHOOK_DEDUP_WINDOW_SECONDS,
+            "tracked_ids": len(_dedup_state["current"]) + len(_dedup_state["previous"]),
+            "rotations": _dedup_state["rotations"],
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+
+@contextmanager
+def _stage(name):
+    """Suma la duración del bloque a la etapa `name` del request en curso (no-op
+    fuera de un request instrumentado)."""
+    timings = getattr(_stage_local, "timings", None)
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _stage_begin():
+    if not WEBHOOK_STAGE_TIMING:
+        return None
+    _stage_local.timings = {}
+    _stage_local.started = time.perf_counter()
+    return _stage_local.timings
+
+
+def _stage_end():
+    """Cierra el request: agrega `total` y vuelca las etapas en los histogramas."""
+    timings = getattr(_stage_local, "timings", None)
+    if timings is None:
+        return None
+    timings["total"] = (time.perf_counter() - _stage_local.started) * 1000
+    _stage_local.timings = None
+    with _stage_lock:
+        for name, ms in timings.items():
+            hist = _stage_histograms.get(name)
+            if hist is None:
+                hist = _stage_histograms[name] = {
+                    "count": 0, "sum_ms": 0.0, "max_ms": 0.0,
+                    "buckets": [0] * (len(_STAGE_BUCKETS_MS) + 1),
+                }
+            hist["count"] += 1
+            hist["sum_ms"] += ms
+            hist["max_ms"] = max(hist["max_ms"], ms)
+            idx = 0
+            while idx < len(_STAGE_BUCKETS_MS) and ms > _STAGE_BUCKETS_MS[idx]:
+                idx += 1
+            hist["buckets"][idx] += 1
+    return timings
+
+
+def _server_timing_header(timings):
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in timings.items())
+
+
+def _bucket_percentile(buckets, count, pct):
+    """Cota superior del bucket donde cae el percentil (None si pasa del último)."""
+    target = pct / 100 * count
+    seen = 0
+    for idx, n in enumerate(buckets):
+        seen += n
+        if seen >= target and n:
+            return _STAGE_BUCKETS_MS[idx] if idx < len(_STAGE_BUCKETS_MS) else None
+    return None
+
+
+def _stage_stats():
+    with _stage_lock:
+        snapshot = {name: {**h, "buckets": list(h["buckets"])} for name, h in _stage_histograms.items()}
+    stages = {}
+    for name, h in sorted(snapshot.items()):
+        count = h["count"]
+        stages[name] = {
+            "count": count,
+            "avg_ms": round(h["sum_ms"] / count, 3) if count else None,
+            "max_ms": round(h["max_ms"], 3),
+            "p50_ms_le": _bucket_percentile(h["buckets"], count, 50),
+            "p95_ms_le": _bucket_percentile(h["buckets"], count, 95),
+            "p99_ms_le": _bucket_percentile(h["buckets"], count, 99),
+            "buckets": dict(zip([f"le_{b:g}" for b in _STAGE_BUCKETS_MS] + ["inf"], h["buckets"])),
+        }
+    return {
+        "enabled": WEBHOOK_STAGE_TIMING,
+        "server_timing_header": WEBHOOK_SERVER_TIMING,
+        "stages": stages,
+    }
+
+
+def _hot_slot_seconds():
+    return HOT_RESOURCES_WINDOW_SECONDS / HOT_RESOURCES_SLOTS
+
+
+def _hot_new_slot(epoch):
+    return {
+        "epoch": epoch,
+        "sketch": [[0] * HOT_RESOURCES_SKETCH_WIDTH for _ in range(HOT_RESOURCES_SKETCH_DEPTH)],
+        "top": {},
+        "top_min": 0,
+        "total": 0,
+    }
+
+
+def _hot_cells(resource):
+    # una celda por fila desde bytes distintos del digest: filas independientes.
+    # hash((row, resource)) no sirve: dos resources que chocan en una fila
+    # chocan en todas y el count-min queda con profundidad efectiva 1.
+    digest = hashlib.blake2b(resource.encode("utf-8"), digest_size=4 * HOT_RESOURCES_SKETCH_DEPTH).digest()
+    return [
+        int.from_bytes(digest[4 * row:4 * row + 4], "little") % HOT_RESOURCES_SKETCH_WIDTH
+        for row in range(HOT_RESOURCES_SKETCH_DEPTH)
+    ]
+
+
+def _hot_track(topic, resource, now=None):
+    """Cuenta una notificación de (topic, resource) en el slot actual. Es sólo
+    observabilidad: un error acá nunca rechaza la ingesta."""
+    if not HOT_RESOURCES_ENABLED or not resource:
+        return
+    try:
+        _hot_count(topic, resource, now)
+    except Exception as e:
+        print(f"⚠️ hot resources: {e}")
+
+
+def _hot_count(topic, resource, now=None):
+    """O(depth) salvo cuando el top-K se llena y hay que desplazar al mínimo (O(K))."""
+    epoch = int((now if now is not None else time.time()) // _hot_slot_seconds())
+    cells = _hot_cells(resource)
+    with _hot_lock:
+        slots = _hot_state["topics"].get(topic or "sin_topic")
+        if slots is None:
+            slots = _hot_state["topics"][topic or "sin_topic"] = [None] * HOT_RESOURCES_SLOTS
+        slot = slots[epoch % HOT_RESOURCES_SLOTS]
+        if slot is None or slot["epoch"] != epoch:
+            slot = slots[epoch % HOT_RESOURCES_SLOTS] = _hot_new_slot(epoch)
+
+        estimate = None
+        for row, cell in enumerate(cells):
+            slot["sketch"][row][cell] += 1
+            value = slot["sketch"][row][cell]
+            estimate = value if estimate is None else min(estimate, value)
+        slot["total"] += 1
+
+        top = slot["top"]
+        if resource in top or len(top) < HOT_RESOURCES_TOP_K:
+            top[resource] = estimate
+        elif estimate > slot["top_min"]:
+            # top_min puede haber quedado bajo (los candidatos sólo crecen)
+            victim = min(top, key=top.get)
+            slot["top_min"] = top[victim]
+            if estimate > top[victim]:
+                del top[victim]
+                top[resource] = estimate
+                slot["top_min"] = min(top.values())
+
+
+def _hot_resources(topic=None, limit=20, now=None):
+    """Top `limit` resources por topic en la ventana, con conteo estimado (cota
+    superior del count-min) y tasa por minuto."""
+    now = now if now is not None else time.time()
+    current = int(now // _hot_slot_seconds())
+    with _hot_lock:
+        topics = {
+            t: [slot for slot in slots if slot is not None and current - slot["epoch"] < HOT_RESOURCES_SLOTS]
+            for t, slots in _hot_state["topics"].items()
+            if topic is None or t == topic
+        }
+        out = {}
+        for t, slots in topics.items():
+            total = sum(slot["total"] for slot in slots)
+            if not total:
+                continue
+            candidates = set()
+            for slot in slots:
+                candidates.update(slot["top"])
+            ranked = []
+            for resource in candidates:
+                cells = _hot_cells(resource)
+                count = sum(
+                    min(slot["sketch"][row][cell] for row, cell in enumerate(cells))
+                    for slot in slots
+                )
+                ranked.append((count, resource))
+            ranked.sort(reverse=True)
+            out[t] = (total, ranked[:limit])
+
+    # ventana efectiva: los slots completos más lo que va del actual
+    covered = (HOT_RESOURCES_SLOTS - 1) * _hot_slot_seconds() + (now % _hot_slot_seconds())
+    minutes = max(covered, 1.0) / 60
+    return {
+        "enabled": HOT_RESOURCES_ENABLED,
+        "window_seconds": HOT_RESOURCES_WINDOW_SECONDS,
+        "topics": {
+            t: {
+                "total": total,
+                "per_minute": round(total / minutes, 2),
+                "top": [
+                    {
+                        "resource": resource,
+                        "count": count,
+                        "per_minute": round(count / minutes, 2),
+                        "share": round(count / total, 4),
+                    }
+                    for count, resource in ranked
+                ],
+            }
+            for t, (total, ranked) in sorted(out.items(), key=lambda kv: -kv[1][0])
+        },
+    }
+
+
+def _webhooks_page_version(topic):
+    """Versión actual del topic (str). Sin Redis, la del proceso."""
+    if _redis_client is None:
+        with _webhooks_page_lock:
+            return str(_webhooks_page_versions.get(topic, 0))
+    return _redis_client.get(f"{WEBHOOKS_PAGE_VERSION_KEY}:{topic}") or "0"
+
+
+def _invalidate_webhooks_page(*topics):
+    """Sube la versión de cada topic: la primera página cacheada deja de valer.
+    Dentro de redis_batch() el INCR sale en el pipeline del request."""
+    if not WEBHOOKS_PAGE_CACHE:
+        return
+    for topic in {t for t in topics if t}:
+        with _webhooks_page_lock:
+            _webhooks_page_versions[topic] = _webhooks_page_versions.get(topic, 0) + 1
+            _webhooks_page_state["invalidations"] += 1
+        if _redis_client is not None:
+            key = f"{WEBHOOKS_PAGE_VERSION_KEY}:{topic}"
+            try:
+                _redis_deferred(lambda client, key=key: client.incr(key))
+            except Exception as e:
+                print(f"⚠️ page cache: no se pudo invalidar {topic}: {e}")
+
+
+def _webhooks_page_get(key, version):
+    with _webhooks_page_lock:
+        entry = _webhooks_page_cache.get(key)
+        if entry is None or entry["version"] != version or time.monotonic() >= entry["expires_at"]:
+            _webhooks_page_state["misses"] += 1
+            return None
+        _webhooks_page_cache.move_to_end(key)
+        _webhooks_page_state["hits"] += 1
+        return entry
+
+
+def _webhooks_page_put(key, version, body):
+    entry = {
+        "version": version,
+        "body": body,
+        "etag": hashlib.sha1(body).hexdigest(),
+        "expires_at": time.monotonic() + WEBHOOKS_PAGE_CACHE_TTL,
+    }
+    with _webhooks_page_lock:
+        _webhooks_page_cache[key] = entry
+        _webhooks_page_cache.move_to_end(key)
+        while len(_webhooks_page_cache) > WEBHOOKS_PAGE_CACHE_SIZE:
+            _webhooks_page_cache.popitem(last=False)
+    return entry
+
+
+def _webhooks_page_response(entry, hit):
+    response = app.response_class(entry["body"], mimetype="application/json")
+    response.set_etag(entry["etag"])
+    # el navegador guarda la respuesta pero revalida siempre (If-None-Match)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Cache"] = "hit" if hit else "miss"
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        with _webhooks_page_lock:
+            _webhooks_page_state["not_modified"] += 1
+    return response
+
+
+def _webhooks_page_stats():
+    with _webhooks_page_lock:
+        return {
+            "enabled": WEBHOOKS_PAGE_CACHE,
+            "entries": len(_webhooks_page_cache),
+            "ttl_seconds": WEBHOOKS_PAGE_CACHE_TTL,
+            **_webhooks_page_state,
+        }
+
+
+def _topics_for_resource(cur, resource):
+    """Topics de webhook_latest que muestran el resource (idx por resource,
+    migración 20261016_05). Savepoint: un error no aborta la transacción."""
+    cur.execute("SAVEPOINT topics_for_resource")
+    try:
+        cur.execute("SELECT topic FROM webhook_latest WHERE resource = %s", (resource,))
+        topics = [row[0] for row in cur.fetchall()]
+        cur.execute("RELEASE SAVEPOINT topics_for_resource")
+        return topics
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT topics_for_resource")
+        print(f"⚠️ page cache: topics de {resource}: {e}")
+        return []
 
-    t = threading.Thread(target=_target, daemon=True)
-    t.start()
+
+def _uses_preview_outbox(resource):
+    """Los previews de este resource viajan por preview_outbox (no por Redis/threads)."""
+    return WEBHOOK_PREVIEW_OUTBOX and bool(resource) and not resource.startswith("/seller-promotions/")
+
+
+def _raw_json_text(raw_body):
+    """Body crudo como str para castear ::jsonb en Postgres (None si no es UTF-8)."""
+    if raw_body is None:
+        return None
+    if isinstance(raw_body, str):
+        return raw_body
+    try:
+        return raw_body.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _webhook_payload_param(evento, raw=None):
+    """Parámetro de la columna payload. Con WEBHOOK_RAW_JSONB el body original va
+    tal cual (el SQL castea ::jsonb) y nos ahorramos re-serializar con Json()."""
+    if raw is not None:
+        return raw
+    return Json(evento)
+
+
+def _webhook_payload_full(payload, topic=None, user_id=None, resource=None, webhook_id=None):
+    """Payload original a partir del compacto (migración 20261016_04): las claves
+    que el trigger sacó por estar en columnas vuelven desde las columnas. Con
+    payloads viejos (sin compactar) es un no-op."""
+    if not isinstance(payload, dict):
+        return payload
+    for key, value in (("_id", webhook_id), ("topic", topic), ("user_id", user_id), ("resource", resource)):
+        if value is not None and value != "" and key not in payload:
+            payload[key] = value
+    return payload
+
+
+def _insert_webhook_batch(cur, eventos, raws=None, outbox=True):
+    """INSERT multi-fila en webhooks + upsert batch de webhook_latest.
+
+    Corre sobre el cursor recibido (el commit lo hace el caller). `raws` es
+    opcional y alineado con `eventos`: body crudo de cada evento (o None).
+    Con outbox=False no se generan jobs en preview_outbox (replays sin preview).
+    Devuelve (inserted, latest_error): `inserted` es una lista de bools alineada
+    con `eventos` (False = webhook_id ya existente o repetido dentro del batch).
+    """
+    if not eventos:
+        return [], None
+
+    payloads = [
+        _webhook_payload_param(e, raws[i] if raws else None)
+        for i, e in enumerate(eventos)
+    ]
+    rows = [
+        (e.get("topic"), e.get("user_id"), e.get("resource", ""), payloads[i], e.get("_id"))
+        for i, e in enumerate(eventos)
+    ]
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO webhooks (topic, user_id, resource, payload, webhook_id)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        RETURNING webhook_id
+        """,
+        rows,
+        template="(%s, %s, %s, %s::jsonb, %s)",
+        page_size=len(rows),
+        fetch=True,
+    )
+
+    # RETURNING no garantiza orden: contamos ids devueltos y los asignamos al
+    # primer evento con ese _id (los repetidos dentro del batch quedan como dup).
+    pending = {}
+    for (webhook_id,) in returned:
+        pending[webhook_id] = pending.get(webhook_id, 0) + 1
+    inserted = []
+    for e in eventos:
+        webhook_id = e.get("_id")
+        if pending.get(webhook_id, 0) > 0:
+            pending[webhook_id] -= 1
+            inserted.append(True)
+        else:
+            inserted.append(False)
+
+    outbox_rows = [
+        (e.get("resource"), e.get("_id"))
+        for e, ok in zip(eventos, inserted)
+        if outbox and ok and _uses_preview_outbox(e.get("resource", ""))
+    ]
+    if outbox_rows:
+        execute_values(
+            cur,
+            "INSERT INTO preview_outbox (resource, webhook_id) VALUES %s",
+            outbox_rows,
+            page_size=len(outbox_rows),
+        )
+
+    # Snapshot latest: un solo upsert; ON CONFLICT DO UPDATE no admite la misma
+    # (topic, resource) dos veces en un statement, así que gana el último evento.
+    latest = {}
+    for i, (e, ok) in enumerate(zip(eventos, inserted)):
+        if ok and e.get("resource"):
+            latest[(e.get("topic"), e.get("resource"))] = (e, payloads[i])
+    latest_error = None
+    if latest:
+        # savepoint: si el upsert falla, Postgres aborta sólo hasta acá y el
+        # INSERT en webhooks + outbox sigue commiteando (sin él se pierde todo)
+        cur.execute("SAVEPOINT webhook_latest_upsert")
+        try:
+            execute_values(
+                cur,
+                """
+                INSERT INTO webhook_latest (topic, resource, webhook_id, received_at, payload)
+                VALUES %s
+                ON CONFLICT (topic, resource) DO UPDATE SET
+                    webhook_id = EXCLUDED.webhook_id,
+                    received_at = EXCLUDED.received_at,
+                    payload = EXCLUDED.payload
+                """,
+                [
+                    (topic, resource, e.get("_id"), payload)
+                    for (topic, resource), (e, payload) in latest.items()
+                ],
+                template="(%s, %s, %s, NOW(), %s::jsonb)",
+                page_size=len(latest),
+            )
+            cur.execute("RELEASE SAVEPOINT webhook_latest_upsert")
+        except Exception as err:
+            cur.execute("ROLLBACK TO SAVEPOINT webhook_latest_upsert")
+            latest_error = str(err)
+
+    return inserted, latest_error
+
+
+def _flush_webhook_group(batch):
+    """Escribe un grupo de (evento, slot) en una sola transacción y despierta
+    a cada request que espera su slot (recién después del commit)."""
+    try:
+        with db_cursor() as cur:
+            inserted, latest_error = _insert_webhook_batch(
+                cur, [e for e, _ in batch], [slot["raw"] for _, slot in batch],
+            )
+        for (_, slot), ok in zip(batch, inserted):
+            slot["inserted"] = ok
+            slot["latest_error"] = latest_error
+    except Exception as err:
+        for _, slot in batch:
+            slot["error"] = str(err)
+    finally:
+        for _, slot in batch:
+            slot["done"].set()
+
+
+def _group_commit_loop():
+    while True:
+        with _group_commit_cond:
+            while not _group_commit_queue:
+                _group_commit_cond.wait()
+            # el primer evento abre la ventana: esperamos hasta max_wait o N filas
+            deadline = time.monotonic() + WEBHOOK_GROUP_COMMIT_MAX_WAIT_MS / 1000.0
+            while len(_group_commit_queue) < WEBHOOK_GROUP_COMMIT_MAX_ROWS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _group_commit_cond.wait(remaining)
+            batch = _group_commit_queue[:WEBHOOK_GROUP_COMMIT_MAX_ROWS]
+            del _group_commit_queue[:WEBHOOK_GROUP_COMMIT_MAX_ROWS]
+        _flush_webhook_group(batch)
+
+
+def _group_commit_submit(evento, raw=None):
+    """Encola el evento en el grupo actual y bloquea hasta que su batch quedó
+    commiteado. Devuelve el slot con `inserted` / `latest_error`."""
+    global _group_commit_thread
+    slot = {"done": threading.Event(), "raw": raw, "inserted": False, "latest_error": None, "error": None}
+    with _group_commit_cond:
+        if _group_commit_thread is None or not _group_commit_thread.is_alive():
+            _group_commit_thread = threading.Thread(target=_group_commit_loop, daemon=True)
+            _group_commit_thread.start()
+        _group_commit_queue.append((evento, slot))
+        _group_commit_cond.notify()
+
+    if not slot["done"].wait(WEBHOOK_GROUP_COMMIT_TIMEOUT):
+        raise TimeoutError(f"group commit sin respuesta tras {WEBHOOK_GROUP_COMMIT_TIMEOUT}s")
+    if slot["error"]:
+        raise RuntimeError(slot["error"])
+    return slot
+
+
+# Statements del camino de un evento, compartidos con asgi_ingest.py (que los
+# pasa a placeholders $n de asyncpg): misma semántica en Flask y ASGI.
+_WEBHOOK_INSERT_SQL = """
+    INSERT INTO webhooks (topic, user_id, resource, payload, webhook_id)
+    VALUES (%s, %s, %s, %s::jsonb, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+_WEBHOOK_LATEST_UPSERT_SQL = """
+    INSERT INTO webhook_latest (topic, resource, webhook_id, received_at, payload)
+    VALUES (%s, %s, %s, NOW(), %s::jsonb)
+    ON CONFLICT (topic, resource) DO UPDATE SET
+        webhook_id = EXCLUDED.webhook_id,
+        received_at = EXCLUDED.received_at,
+        payload = EXCLUDED.payload
+"""
+
+_PREVIEW_OUTBOX_INSERT_SQL = "INSERT INTO preview_outbox (resource, webhook_id) VALUES (%s, %s)"
+
+
+def _webhook_row(evento, payload):
+    return (evento.get("topic"), evento.get("user_id"), evento.get("resource", ""), payload, evento.get("_id"))
+
+
+def _webhook_latest_row(evento, payload):
+    return (evento.get("topic"), evento.get("resource", ""), evento.get("_id"), payload)
+
+
+def _store_webhook(evento, results, raw=None):
+    """Camino síncrono: INSERT + snapshot del evento en su propia transacción.
+    Devuelve el rowcount del INSERT (0 = duplicado)."""
+    resource = evento.get("resource", "")
+    # mismo parámetro para ambos statements: se serializa (o se toma crudo) una vez
+    payload = _webhook_payload_param(evento, raw)
+    with db_cursor() as cur:
+        with _stage("insert"):
+            cur.execute(_WEBHOOK_INSERT_SQL, _webhook_row(evento, payload))
+        results["insert_original"] = {
+            "rowcount": cur.rowcount,
+            "webhook_id": evento.get("_id"),
+        }
+        inserted_count = cur.rowcount
+
+        # Job de preview en la misma transacción: commitea junto con el webhook o no existe
+        if inserted_count > 0 and _uses_preview_outbox(resource):
+            cur.execute(_PREVIEW_OUTBOX_INSERT_SQL, (resource, evento.get("_id")))
+
+        # Snapshot latest por (topic, resource), best-effort: bajo savepoint para
+        # que un error no aborte la transacción y se lleve el INSERT original
+        if inserted_count > 0 and resource:
+            cur.execute("SAVEPOINT webhook_latest_upsert")
+            try:
+                with _stage("latest_upsert"):
+                    cur.execute(_WEBHOOK_LATEST_UPSERT_SQL, _webhook_latest_row(evento, payload))
+                cur.execute("RELEASE SAVEPOINT webhook_latest_upsert")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT webhook_latest_upsert")
+                results["errors"].append(f"upsert_webhook_latest: {e}")
+    return inserted_count
 
 def _upsert_seller_shipping_cost(mla_id, item_data, source):
     """Best-effort: fetch /shipping_options/free and UPSERT cost row.
@@ -613,7 +1805,9 @@ def _store_cancelled_order(order_data: dict):
         ))
 
 
-def fetch_and_store_preview(resource: str):
+def fetch_and_store_preview(resource: str, raise_errors: bool = False):
+    # raise_errors=True: el error sube al caller (worker_outbox reintenta y
+    # manda a dead-letter); por defecto se loguea y vuelve un preview "Error"
     try:
         token = get_token()
         headers = {"Authorization": f"Bearer {token}"}
@@ -1028,7 +2222,9 @@ def fetch_and_store_preview(resource: str):
                 preview.get("brand"),
                 Json(extra_data),
             ))
-            
+            page_topics = _topics_for_resource(cur, resource) if WEBHOOKS_PAGE_CACHE else []
+        # después del commit: la próxima lectura ya ve el preview nuevo
+        _invalidate_webhooks_page(*page_topics)
 
         # ── SSE notifications (best-effort, per resource type) ──
         if resource.startswith("/shipments/"):
@@ -1056,6 +2252,8 @@ def fetch_and_store_preview(resource: str):
 
     except Exception as e:
         print(f"❌ Error obteniendo preview de {resource}:", e)
+        if raise_errors:
+            raise
         return {"resource": resource, "title": "Error"}
 
 
@@ -1600,10 +2798,49 @@ def callback():
 
     return jsonify(token_data), 400
 
+def _dispatch_preview(resource, results):
+    """Refresca el preview del resource (promos / outbox / cola async / inline).
+    Best-effort: los errores quedan en results["errors"], nunca se propagan."""
+    try:
+        if resource.startswith("/seller-promotions/"):
+            _process_promotion_webhook(resource)
+        elif _uses_preview_outbox(resource):
+            # el job ya quedó en preview_outbox junto con el INSERT (si era nuevo)
+            results["preview_refreshed"] = True
+        elif resource:
+            if WEBHOOK_PREVIEW_ASYNC:
+                if not _admit_preview(resource):
+                    # backlog saturado: el evento quedó guardado, el preview no
+                    results["preview_shed"] = _admission_state["level"]
+                    return
+                enqueued, enqueue_err = _enqueue_preview_job(resource)
+                if not enqueued:
+                    _run_preview_in_background(resource)
+                    if enqueue_err:
+                        results["errors"].append(f"enqueue_preview_job: {enqueue_err}")
+            else:
+                fetch_and_store_preview(resource)
+            results["preview_refreshed"] = True
+    except Exception as e:
+        results["errors"].append(f"fetch_and_store_preview: {e}")
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
+    timings = _stage_begin()
     try:
-        evento = request.get_json(silent=True, force=True)
+        response = app.make_response(_handle_webhook())
+    finally:
+        _stage_end()
+    if timings is not None and WEBHOOK_SERVER_TIMING:
+        response.headers["Server-Timing"] = _server_timing_header(timings)
+    return response
+
+
+def _handle_webhook():
+    try:
+        with _stage("parse"):
+            evento = request.get_json(silent=True, force=True)
         if not evento:
             return "JSON inválido o vacío", 400
 
@@ -1616,74 +2853,84 @@ def webhook():
         }
         inserted_count = 0
 
-        # Insert + snapshot en una sola conexión (evita presión sobre el pool)
+        # Cuenta también las redeliveries: son parte de la tormenta
+        _hot_track(evento.get("topic"), resource)
+
+        # Redelivery ya persistida: 200 sin pool checkout ni preview.
+        with _stage("dedup"):
+            seen = _dedup_seen(evento.get("_id"))
+        if seen:
+            results["insert_original"] = {
+                "rowcount": 0,
+                "webhook_id": evento.get("_id"),
+                "cached_duplicate": True,
+            }
+            if DEBUG_WEBHOOK:
+                return jsonify(results), 200
+            return "Evento recibido", 200
+
+        raw = _raw_json_text(request.get_data()) if WEBHOOK_RAW_JSONB else None
+
+        # Modo stream: el evento queda durable en Redis y worker_ingest hace el
+        # INSERT + snapshot + preview. Si el XADD falla, seguimos por Postgres.
+        if WEBHOOK_INGEST_STREAM:
+            with _stage("stream_append"):
+                stream_id, stream_err = _append_ingest_stream(request.get_data())
+            if stream_id:
+                _dedup_remember(evento.get("_id"))
+                results["insert_original"] = {
+                    "stream_id": stream_id,
+                    "webhook_id": evento.get("_id"),
+                }
+                if DEBUG_WEBHOOK:
+                    return jsonify(results), 200
+                return "Evento recibido", 200
+            results["errors"].append(f"append_ingest_stream: {stream_err}")
+
+        # Insert + snapshot en una sola conexión (evita presión sobre el pool).
+        # En group commit el evento viaja en un INSERT multi-fila compartido.
+        stored = False
         try:
-            with db_cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO webhooks (topic, user_id, resource, payload, webhook_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (webhook_id) DO NOTHING
-                    """,
-                    (
-                        evento.get("topic"),
-                        evento.get("user_id"),
-                        resource,
-                        Json(evento),
-                        evento.get("_id"),
-                    ),
-                )
+            if WEBHOOK_GROUP_COMMIT:
+                try:
+                    with _stage("group_commit_wait"):
+                        slot = _group_commit_submit(evento, raw)
+                except Exception as e:
+                    # el 200 de group commit promete un batch commiteado: si el flush
+                    # falló o no respondió a tiempo (y quizás commitee después), 503
+                    # para que ML reenvíe; el webhook_id único absorbe el duplicado
+                    print(f"❌ group commit {evento.get('_id')}: {e}")
+                    if DEBUG_WEBHOOK:
+                        return jsonify({**results, "errors": [f"group_commit: {e}"]}), 503
+                    return "Group commit no disponible", 503
+                inserted_count = 1 if slot["inserted"] else 0
                 results["insert_original"] = {
-                    "rowcount": cur.rowcount,
+                    "rowcount": inserted_count,
                     "webhook_id": evento.get("_id"),
+                    "group_commit": True,
                 }
-                inserted_count = cur.rowcount
-
-                if inserted_count > 0:
-                    with _topics_cache_lock:
-                        _topics_cache["value"] = None
-                        _topics_cache["expires_at"] = 0.0
-
-                # Snapshot latest por (topic, resource), best-effort
-                if inserted_count > 0 and resource:
-                    try:
-                        cur.execute(
-                            """
-                            INSERT INTO webhook_latest (topic, resource, webhook_id, received_at, payload)
-                            VALUES (%s, %s, %s, NOW(), %s)
-                            ON CONFLICT (topic, resource) DO UPDATE SET
-                                webhook_id = EXCLUDED.webhook_id,
-                                received_at = EXCLUDED.received_at,
-                                payload = EXCLUDED.payload
-                            """,
-                            (
-                                evento.get("topic"),
-                                resource,
-                                evento.get("_id"),
-                                Json(evento),
-                            ),
-                        )
-                    except Exception as e:
-                        results["errors"].append(f"upsert_webhook_latest: {e}")
+                if slot["latest_error"]:
+                    results["errors"].append(f"upsert_webhook_latest: {slot['latest_error']}")
+            else:
+                inserted_count = _store_webhook(evento, results, raw)
+            # los dos caminos vuelven recién después del commit (o lanzan)
+            stored = True
         except Exception as e:
             results["errors"].append(f"insert_original: {e}")
 
-        # Refrescar preview del MISMO resource (no rompe el webhook si falla)
-        try:
-            if resource.startswith("/seller-promotions/"):
-                _process_promotion_webhook(resource)
-            elif resource:
-                if WEBHOOK_PREVIEW_ASYNC:
-                    enqueued, enqueue_err = _enqueue_preview_job(resource)
-                    if not enqueued:
-                        _run_preview_in_background(resource)
-                        if enqueue_err:
-                            results["errors"].append(f"enqueue_preview_job: {enqueue_err}")
-                else:
-                    fetch_and_store_preview(resource)
-                results["preview_refreshed"] = True
-        except Exception as e:
-            results["errors"].append(f"fetch_and_store_preview: {e}")
+        # Sólo ids que quedaron en la DB: si el commit falló, la redelivery de ML
+        # tiene que volver a intentar el INSERT en vez de recibir un 200 del cache.
+        # Un error del snapshot no cuenta: corre bajo savepoint y no deshace el INSERT.
+        if stored:
+            _dedup_remember(evento.get("_id"))
+
+        # Refrescar preview del MISMO resource (no rompe el webhook si falla).
+        # Encolado/promos/SSE del request salen en un solo pipeline.
+        with redis_batch():
+            if inserted_count > 0 and resource:
+                _invalidate_webhooks_page(evento.get("topic"))
+            with _stage("preview_dispatch"):
+                _dispatch_preview(resource, results)
 
         if DEBUG_WEBHOOK:
             return jsonify(results), 200
@@ -1696,6 +2943,170 @@ def webhook():
         return "Error interno", 500
 
 
+def _ingest_batch_chunk(chunk, summary, dispatch):
+    """Escribe un chunk [(linea, evento, raw)] en una transacción y, si se pidió,
+    despacha el preview de cada resource nuevo una vez."""
+    raws = [raw for _, _, raw in chunk] if WEBHOOK_RAW_JSONB else None
+    eventos = [evento for _, evento, _ in chunk]
+    try:
+        with db_cursor() as cur:
+            inserted, latest_error = _insert_webhook_batch(cur, eventos, raws, outbox=dispatch)
+    except Exception as e:
+        summary["failed"] += len(chunk)
+        summary["errors"].append(f"lineas {chunk[0][0]}-{chunk[-1][0]}: {e}")
+        return
+    summary["batches"] += 1
+    if latest_error:
+        summary["errors"].append(f"upsert_webhook_latest: {latest_error}")
+
+    resources, topics = [], set()
+    for evento, ok in zip(eventos, inserted):
+        summary["accepted" if ok else "duplicates"] += 1
+        _dedup_remember(evento.get("_id"))
+        if ok and evento.get("resource") and evento["resource"] not in resources:
+            resources.append(evento["resource"])
+        if ok and evento.get("resource"):
+            topics.add(evento.get("topic"))
+    _invalidate_webhooks_page(*topics)
+    if dispatch:
+        with redis_batch():
+            for resource in resources:
+                results = {"preview_refreshed": False, "errors": []}
+                _dispatch_preview(resource, results)
+                summary["previews_dispatched"] += 1 if results["preview_refreshed"] else 0
+                summary["errors"].extend(results["errors"])
+
+
+@app.route("/webhook/batch", methods=["POST"])
+def webhook_batch():
+    """Ingesta NDJSON (un evento por línea, `Content-Encoding: gzip` opcional)
+    con la misma escritura que worker_ingest: INSERT multi-fila + snapshot, en
+    chunks de WEBHOOK_BATCH_ROWS. Previews sólo con ?dispatch_previews=1."""
+    # cerrado por defecto: sin token configurado el endpoint no acepta nada
+    if not WEBHOOK_BATCH_TOKEN:
+        return jsonify({"error": "deshabilitado: falta WEBHOOK_BATCH_TOKEN"}), 403
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {WEBHOOK_BATCH_TOKEN}"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    dispatch = request.args.get("dispatch_previews", "0") == "1"
+    stream = request.stream
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+
+    summary = {
+        "lines": 0,
+        "accepted": 0,
+        "duplicates": 0,
+        "invalid": 0,
+        "failed": 0,
+        "batches": 0,
+        "previews_dispatched": 0,
+        "invalid_lines": [],
+        "errors": [],
+    }
+    chunk = []
+    status = 200
+    try:
+        for lineno, line in enumerate(stream, 1):
+            if lineno > WEBHOOK_BATCH_MAX_LINES:
+                summary["errors"].append(f"cortado en {WEBHOOK_BATCH_MAX_LINES} líneas (WEBHOOK_BATCH_MAX_LINES)")
+                status = 413
+                break
+            if not line.strip():
+                continue
+            summary["lines"] += 1
+            try:
+                evento = json.loads(line)
+                if not isinstance(evento, dict) or not evento:
+                    raise ValueError("no es un objeto JSON")
+            except ValueError as e:
+                summary["invalid"] += 1
+                if len(summary["invalid_lines"]) < 100:
+                    summary["invalid_lines"].append({"line": lineno, "error": str(e)[:200]})
+                continue
+            raw = _raw_json_text(line.strip()) if WEBHOOK_RAW_JSONB else None
+            chunk.append((lineno, evento, raw))
+            if len(chunk) >= WEBHOOK_BATCH_ROWS:
+                _ingest_batch_chunk(chunk, summary, dispatch)
+                chunk = []
+    except (OSError, EOFError, zlib.error) as e:
+        # gzip truncado/corrupto: se escribe lo leído hasta ahí, el resto se descarta
+        summary["errors"].append(f"body ilegible: {e}")
+        status = 400
+    if chunk:
+        _ingest_batch_chunk(chunk, summary, dispatch)
+
+    del summary["errors"][50:]
+    return jsonify(summary), status
+
+
+# Columnas de la lectura de /api/webhooks sobre el snapshot: payload, preview
+# (received_at en [8]), resource, topic, webhook_id, user_id (NULL: el snapshot
+# no lo guarda).
+_WEBHOOK_ROW_COLUMNS = """
+    wl.payload,
+    p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, wl.received_at, p.brand, p.extra_data,
+    wl.resource, wl.topic, wl.webhook_id, NULL
+"""
+
+# Mismo evento que _webhook_event_from_row(), armado en Postgres y devuelto como
+# texto JSON en [0]. received_at / resource quedan en [8] / [11] para el cursor.
+# Las claves del payload compacto vuelven sólo si faltan (el payload gana en ||).
+_WEBHOOK_EVENT_JSON_COLUMNS = """
+    (
+        CASE WHEN jsonb_typeof(wl.payload) = 'object'
+             THEN jsonb_strip_nulls(jsonb_build_object(
+                      '_id', NULLIF(wl.webhook_id, ''), 'topic', NULLIF(wl.topic, ''),
+                      'resource', NULLIF(wl.resource, '')
+                  )) || wl.payload
+             ELSE jsonb_build_object('raw', wl.payload)
+        END
+        || jsonb_build_object(
+            'db_preview', jsonb_build_object(
+                'title', p.title, 'price', p.price, 'currency_id', p.currency_id,
+                'thumbnail', p.thumbnail, 'winner', p.winner, 'winner_price', p.winner_price,
+                'status', p.status, 'brand', p.brand,
+                'extra_data', COALESCE(p.extra_data::jsonb, '{}'::jsonb)
+            ),
+            'received_at', to_char(wl.received_at AT TIME ZONE 'America/Argentina/Buenos_Aires', 'YYYY-MM-DD HH24:MI:SS')
+        )
+    )::text,
+    NULL, NULL, NULL, NULL, NULL, NULL, NULL, wl.received_at, NULL, NULL, wl.resource
+"""
+
+
+def _webhook_event_from_row(row):
+    """Fila de /api/webhooks (payload, 10 columnas de preview/received_at,
+    resource, topic, webhook_id, user_id) -> evento JSON con db_preview."""
+    payload = row[0]
+    # payload puede venir como jsonb (dict) o como string
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except Exception:
+            payload = {"raw": payload}
+    # topic, webhook_id, user_id (NULL en el snapshot) completan el payload compacto
+    payload = _webhook_payload_full(payload, row[12], row[14], row[11], row[13])
+
+    preview = {
+        "title": row[1],
+        "price": row[2],
+        "currency_id": row[3],
+        "thumbnail": row[4],
+        "winner": row[5],
+        "winner_price": row[6],
+        "status": row[7],
+        "brand": row[9],
+        "extra_data": row[10] or {},
+    }
+
+    # Adjuntamos preview siempre (si no hay, vendrá con None en sus campos)
+    payload["db_preview"] = preview
+    local_dt = row[8].astimezone(ZoneInfo("America/Argentina/Buenos_Aires"))
+    payload["received_at"] = local_dt.strftime("%Y-%m-%d %H:%M:%S")
+    return payload
+
+
 @app.route("/api/webhooks", methods=["GET"])
 def get_webhooks():
     try:
@@ -1720,38 +3131,89 @@ def get_webhooks():
 
         use_cursor_mode = WEBHOOKS_CURSOR_MODE or bool(cursor_pair)
 
+        count_mode = request.args.get("count") or WEBHOOKS_COUNT_DEFAULT
+        if count_mode not in WEBHOOKS_COUNT_MODES:
+            return jsonify({"error": "Parámetro 'count' inválido (exact|estimate|none)"}), 400
+
+        # Primera página: se sirve del cache si la versión del topic no cambió.
+        # La versión se lee ANTES de la query: una invalidación en el medio deja
+        # la entrada ya vieja.
+        page_key = page_version = None
+        if WEBHOOKS_PAGE_CACHE and not cursor_pair and offset == 0:
+            try:
+                page_version = _webhooks_page_version(topic)
+                page_key = (topic, limit, use_cursor_mode, count_mode)
+            except Exception:
+                with _webhooks_page_lock:
+                    _webhooks_page_state["version_errors"] += 1
+            if page_key is not None:
+                entry = _webhooks_page_get(page_key, page_version)
+                if entry is not None:
+                    return _webhooks_page_response(entry, hit=True)
+
+        # Ventana opcional del fallback legado: acota received_at en ambos lados
+        # del join para que el planner pode particiones.
+        lookback_sql = lookback_join_sql = ""
+        lookback_params = ()
+        if WEBHOOKS_FALLBACK_LOOKBACK_DAYS > 0:
+            lookback_sql = "AND received_at >= NOW() - make_interval(days => %s)"
+            lookback_join_sql = "AND w.received_at >= NOW() - make_interval(days => %s)"
+            lookback_params = (WEBHOOKS_FALLBACK_LOOKBACK_DAYS,)
+
         # Una sola conexión para count + query principal (evita pool exhaustion).
         # Detectamos snapshot table dentro del mismo bloque; si falla, fallback legado.
         with db_cursor() as cur:
             snapshot_available = True
+            total = None
+            if count_mode == "estimate":
+                # contador por triggers (migración 20261016_03); existe sólo si
+                # existe webhook_latest, así que de paso confirma el snapshot
+                try:
+                    cur.execute(
+                        "SELECT COALESCE(SUM(latest_count), 0) FROM webhook_topic_counts WHERE topic = %s",
+                        (topic,),
+                    )
+                    total = int(cur.fetchone()[0])
+                except Exception:
+                    cur.connection.rollback()
+                    count_mode = "exact"
             try:
-                cur.execute("SELECT COUNT(*) FROM webhook_latest WHERE topic = %s", (topic,))
-                total = cur.fetchone()[0]
+                if count_mode == "exact":
+                    cur.execute("SELECT COUNT(*) FROM webhook_latest WHERE topic = %s", (topic,))
+                    total = cur.fetchone()[0]
+                elif count_mode == "none":
+                    cur.execute("SELECT 1 FROM webhook_latest LIMIT 0")
             except Exception:
                 snapshot_available = False
 
             if not snapshot_available:
                 # Rollback implícito por el error anterior; reconectar en el mismo cursor.
                 cur.connection.rollback()
-                cur.execute("""
-                    WITH latest AS (
-                        SELECT resource, MAX(received_at) AS max_received
-                        FROM webhooks
-                        WHERE topic = %s
-                        GROUP BY resource
-                    )
-                    SELECT COUNT(*) FROM latest
-                """, (topic,))
-                total = cur.fetchone()[0]
+                if not WEBHOOKS_LEGACY_FALLBACK:
+                    return jsonify({
+                        "error": "webhook_latest no disponible; correr rebuild_webhook_latest.py "
+                                 "(o WEBHOOKS_LEGACY_FALLBACK=1)",
+                    }), 503
+                if count_mode != "none":
+                    cur.execute(f"""
+                        WITH latest AS (
+                            SELECT resource, MAX(received_at) AS max_received
+                            FROM webhooks
+                            WHERE topic = %s {lookback_sql}
+                            GROUP BY resource
+                        )
+                        SELECT COUNT(*) FROM latest
+                    """, (topic, *lookback_params))
+                    total = cur.fetchone()[0]
+                    count_mode = "exact"
 
+            sql_json = snapshot_available and WEBHOOKS_SQL_JSON
+            snapshot_columns = _WEBHOOK_EVENT_JSON_COLUMNS if sql_json else _WEBHOOK_ROW_COLUMNS
             if snapshot_available:
                 if use_cursor_mode:
                     if cursor_pair:
-                        cur.execute("""
-                            SELECT
-                                wl.payload,
-                                p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, wl.received_at, p.brand, p.extra_data,
-                                wl.resource
+                        cur.execute(f"""
+                            SELECT {snapshot_columns}
                             FROM webhook_latest wl
                             LEFT JOIN ml_previews p ON p.resource = wl.resource
                             WHERE wl.topic = %s
@@ -1760,11 +3222,8 @@ def get_webhooks():
                             LIMIT %s
                         """, (topic, cursor_pair[0], cursor_pair[1], limit))
                     else:
-                        cur.execute("""
-                            SELECT
-                                wl.payload,
-                                p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, wl.received_at, p.brand, p.extra_data,
-                                wl.resource
+                        cur.execute(f"""
+                            SELECT {snapshot_columns}
                             FROM webhook_latest wl
                             LEFT JOIN ml_previews p ON p.resource = wl.resource
                             WHERE wl.topic = %s
@@ -1772,11 +3231,8 @@ def get_webhooks():
                             LIMIT %s
                         """, (topic, limit))
                 else:
-                    cur.execute("""
-                        SELECT
-                            wl.payload,
-                            p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, wl.received_at, p.brand, p.extra_data,
-                            wl.resource
+                    cur.execute(f"""
+                        SELECT {snapshot_columns}
                         FROM webhook_latest wl
                         LEFT JOIN ml_previews p ON p.resource = wl.resource
                         WHERE wl.topic = %s
@@ -1786,115 +3242,102 @@ def get_webhooks():
             else:
                 if use_cursor_mode:
                     if cursor_pair:
-                        cur.execute("""
+                        cur.execute(f"""
                             WITH latest AS (
                                 SELECT resource, MAX(received_at) AS max_received
                                 FROM webhooks
-                                WHERE topic = %s
+                                WHERE topic = %s {lookback_sql}
                                 GROUP BY resource
                             )
                             SELECT
                                 w.payload,
                                 p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, w.received_at, p.brand, p.extra_data,
-                                w.resource
+                                w.resource, w.topic, w.webhook_id, w.user_id
                             FROM latest
                             JOIN webhooks w
                               ON w.resource = latest.resource
                              AND w.received_at = latest.max_received
+                             {lookback_join_sql}
                             LEFT JOIN ml_previews p ON p.resource = w.resource
                             WHERE (w.received_at, w.resource) < (%s, %s)
                             ORDER BY w.received_at DESC, w.resource DESC
                             LIMIT %s
-                        """, (topic, cursor_pair[0], cursor_pair[1], limit))
+                        """, (topic, *lookback_params, *lookback_params, cursor_pair[0], cursor_pair[1], limit))
                     else:
-                        cur.execute("""
+                        cur.execute(f"""
                             WITH latest AS (
                                 SELECT resource, MAX(received_at) AS max_received
                                 FROM webhooks
-                                WHERE topic = %s
+                                WHERE topic = %s {lookback_sql}
                                 GROUP BY resource
                             )
                             SELECT
                                 w.payload,
                                 p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, w.received_at, p.brand, p.extra_data,
-                                w.resource
+                                w.resource, w.topic, w.webhook_id, w.user_id
                             FROM latest
                             JOIN webhooks w
                               ON w.resource = latest.resource
                              AND w.received_at = latest.max_received
+                             {lookback_join_sql}
                             LEFT JOIN ml_previews p ON p.resource = w.resource
                             ORDER BY w.received_at DESC, w.resource DESC
                             LIMIT %s
-                        """, (topic, limit))
+                        """, (topic, *lookback_params, *lookback_params, limit))
                 else:
-                    cur.execute("""
+                    cur.execute(f"""
                         WITH latest AS (
                             SELECT resource, MAX(received_at) AS max_received
                             FROM webhooks
-                            WHERE topic = %s
+                            WHERE topic = %s {lookback_sql}
                             GROUP BY resource
                         )
                         SELECT
                             w.payload,
                             p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, w.received_at, p.brand, p.extra_data,
-                            w.resource
+                            w.resource, w.topic, w.webhook_id, w.user_id
                         FROM latest
                         JOIN webhooks w
                           ON w.resource = latest.resource
                          AND w.received_at = latest.max_received
+                         {lookback_join_sql}
                         LEFT JOIN ml_previews p ON p.resource = w.resource
                         ORDER BY w.received_at DESC, w.resource DESC
                         LIMIT %s OFFSET %s
-                    """, (topic, limit, offset))
+                    """, (topic, *lookback_params, *lookback_params, limit, offset))
 
             rows_db = cur.fetchall()
 
         # 3) Construcción de respuesta (ya fuera del with: el cursor está cerrado)
-        rows = []
-        for row in rows_db:
-            payload = row[0]
-            # payload puede venir como jsonb (dict) o como string
-            if isinstance(payload, str):
-                try:
-                    payload = json.loads(payload)
-                except Exception:
-                    payload = {"raw": payload}
-
-            preview = {
-                "title": row[1],
-                "price": row[2],
-                "currency_id": row[3],
-                "thumbnail": row[4],
-                "winner": row[5],
-                "winner_price": row[6],
-                "status": row[7],
-                "brand": row[9],
-                "extra_data": row[10] or {},
-            }
-
-            # Adjuntamos preview siempre (si no hay, vendrá con None en sus campos)
-            payload["db_preview"] = preview
-            local_dt = row[8].astimezone(ZoneInfo("America/Argentina/Buenos_Aires"))
-            payload["received_at"] = local_dt.strftime("%Y-%m-%d %H:%M:%S")
-            rows.append(payload)
-
         next_cursor = None
         if use_cursor_mode and rows_db:
+            # mismas posiciones en los dos formatos de fila
             last_received_at = rows_db[-1][8]
             last_resource = rows_db[-1][11]
             next_cursor = _encode_webhooks_cursor(last_received_at, last_resource)
 
-        return jsonify({
-            "topic": topic,
-            "events": rows,
-            "pagination": {
-                "limit": limit,
-                "offset": offset,
-                "total": total,
-                "mode": "cursor" if use_cursor_mode else "offset",
-                "next_cursor": next_cursor,
-            }
-        })
+        pagination = {
+            "limit": limit,
+            "offset": offset,
+            "total": total,
+            "count": count_mode,
+            "mode": "cursor" if use_cursor_mode else "offset",
+            "next_cursor": next_cursor,
+        }
+        if sql_json:
+            # cada evento ya viene serializado desde Postgres
+            body = "".join((
+                '{"topic":', app.json.dumps(topic),
+                ',"events":[', ",".join(row[0] for row in rows_db),
+                '],"pagination":', app.json.dumps(pagination), "}",
+            )).encode("utf-8")
+        else:
+            rows = [_webhook_event_from_row(row) for row in rows_db]
+            body = app.json.dumps({"topic": topic, "events": rows, "pagination": pagination}).encode("utf-8")
+
+        if page_key is not None:
+            return _webhooks_page_response(_webhooks_page_put(page_key, page_version, body), hit=False)
+        return app.response_class(body, mimetype="application/json")
 
     except Exception as e:
         import traceback
@@ -1906,6 +3349,232 @@ def get_webhooks():
 
 
 
+@app.route("/api/webhooks/changes", methods=["GET"])
+def get_webhooks_changes():
+    """Delta de /api/webhooks: eventos del topic cuyo snapshot o preview cambió
+    desde `since`. Sin `since` sólo devuelve el token inicial (la página base
+    se pide a /api/webhooks). `reset: true` = demasiados cambios, recargar."""
+    try:
+        topic = request.args.get("topic")
+        if not topic:
+            return jsonify({"error": "Falta parámetro 'topic'"}), 400
+
+        since_raw = request.args.get("since")
+        since = None
+        if since_raw:
+            try:
+                since = _decode_changes_token(since_raw)
+            except Exception:
+                return jsonify({"error": "Parámetro 'since' inválido"}), 400
+
+        with db_cursor() as cur:
+            cur.execute("SELECT NOW()")
+            watermark = cur.fetchone()[0]
+            rows_db = []
+            if since is not None:
+                floor = since - timedelta(seconds=WEBHOOKS_CHANGES_OVERLAP_SECONDS)
+                # dos ramas indexadas (idx_webhook_latest_topic_received_resource y
+                # idx_ml_previews_last_updated, migración 20261016_06); el UNION
+                # deja un resource una sola vez aunque cambien los dos lados
+                cur.execute("""
+                    WITH changed AS (
+                        SELECT resource FROM webhook_latest
+                         WHERE topic = %s AND received_at > %s
+                        UNION
+                        SELECT resource FROM ml_previews
+                         WHERE last_updated > %s
+                    )
+                    SELECT
+                        wl.payload,
+                        p.title, p.price, p.currency_id, p.thumbnail, p.winner, p.winner_price, p.status, wl.received_at, p.brand, p.extra_data,
+                        wl.resource, wl.topic, wl.webhook_id, NULL
+                    FROM changed c
+                    JOIN webhook_latest wl ON wl.topic = %s AND wl.resource = c.resource
+                    LEFT JOIN ml_previews p ON p.resource = wl.resource
+                    ORDER BY wl.received_at DESC, wl.resource DESC
+                    LIMIT %s
+                """, (topic, floor, floor, topic, WEBHOOKS_CHANGES_MAX + 1))
+                rows_db = cur.fetchall()
+
+        reset = len(rows_db) > WEBHOOKS_CHANGES_MAX
+        return jsonify({
+            "topic": topic,
+            "events": [] if reset else [_webhook_event_from_row(row) for row in rows_db],
+            "reset": reset,
+            "next_token": _encode_changes_token(watermark),
+        })
+
+    except Exception as e:
+        print("❌ Error leyendo cambios de webhooks:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+_EXPORT_CSV_COLUMNS = (
+    "received_at", "topic", "resource", "webhook_id", "user_id",
+    "title", "price", "currency_id", "winner", "winner_price", "status", "brand", "payload",
+)
+
+
+def _export_query(filters):
+    """SELECT de eventos (webhooks) + preview para los filtros del export. Orden
+    por received_at: con since/until el planner poda particiones."""
+    where = ["w.topic = %s"]
+    params = [filters["topic"]]
+    if filters.get("since"):
+        where.append("w.received_at >= %s")
+        params.append(filters["since"])
+    if filters.get("until"):
+        where.append("w.received_at < %s")
+        params.append(filters["until"])
+    if filters.get("resource"):
+        where.append("w.resource LIKE %s")
+        params.append(filters["resource"])
+    return f"""
+        SELECT w.received_at, w.topic, w.resource, w.webhook_id, w.user_id, w.payload,
+               p.title, p.price, p.currency_id, p.winner, p.winner_price, p.status, p.brand, p.extra_data
+        FROM webhooks w
+        LEFT JOIN ml_previews p ON p.resource = w.resource
+        WHERE {" AND ".join(where)}
+        ORDER BY w.received_at
+    """, params
+
+
+def _export_connection():
+    # conexión dedicada (el cursor server-side vive lo que dure el stream y no
+    # debe ocupar un slot del pool), pero con las credenciales de la app o de un
+    # rol de sólo lectura: es un endpoint HTTP, nunca DATABASE_ADMIN_URL
+    conn = psycopg2.connect(os.getenv("WEBHOOKS_EXPORT_DATABASE_URL") or os.getenv("DATABASE_URL"))
+    conn.set_session(readonly=True)
+    return conn
+
+
+def _export_record(row):
+    received_at, topic, resource, webhook_id, user_id, payload = row[:6]
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except Exception:
+            payload = {"raw": payload}
+    return {
+        "received_at": received_at.isoformat(),
+        "topic": topic,
+        "resource": resource,
+        "webhook_id": webhook_id,
+        "user_id": user_id,
+        "payload": _webhook_payload_full(payload, topic, user_id, resource, webhook_id),
+        "preview": {
+            "title": row[6],
+            "price": row[7],
+            "currency_id": row[8],
+            "winner": row[9],
+            "winner_price": row[10],
+            "status": row[11],
+            "brand": row[12],
+            "extra_data": row[13] or {},
+        },
+    }
+
+
+def _export_lines(fmt, records):
+    """Texto por batch de registros: NDJSON (una línea por evento) o CSV plano."""
+    if fmt == "ndjson":
+        return "".join(app.json.dumps(record) + "\n" for record in records)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for record in records:
+        preview = record["preview"]
+        writer.writerow((
+            record["received_at"], record["topic"], record["resource"], record["webhook_id"],
+            record["user_id"], preview["title"], preview["price"], preview["currency_id"],
+            preview["winner"], preview["winner_price"], preview["status"], preview["brand"],
+            json.dumps(record["payload"], ensure_ascii=False, default=str),
+        ))
+    return buf.getvalue()
+
+
+def _export_stream(filters, fmt, compress):
+    """Generador del export: un batch de WEBHOOKS_EXPORT_FETCH filas por vez, así
+    la memoria no depende del rango. La conexión se cierra al terminar o si el
+    cliente corta (GeneratorExit)."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    # tope de pared para todo el export (cursor + transacción abiertos); el
+    # statement_timeout sólo acota cada FETCH por separado
+    deadline = time.monotonic() + WEBHOOKS_EXPORT_MAX_SECONDS
+    conn = _export_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL idle_in_transaction_session_timeout = %s", (WEBHOOKS_EXPORT_IDLE_SECONDS * 1000,))
+            cur.execute("SET LOCAL statement_timeout = %s", (WEBHOOKS_EXPORT_MAX_SECONDS * 1000,))
+        rows = 0
+        if fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf).writerow(_EXPORT_CSV_COLUMNS)
+            header = buf.getvalue().encode("utf-8")
+            yield gz.compress(header) if gz else header
+        with conn.cursor(name="webhooks_export") as cur:
+            cur.execute(*_export_query(filters))
+            while True:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(
+                        f"export cortado tras {WEBHOOKS_EXPORT_MAX_SECONDS}s ({rows} filas); "
+                        "acotar con since/until"
+                    )
+                batch = cur.fetchmany(WEBHOOKS_EXPORT_FETCH)
+                if not batch:
+                    break
+                rows += len(batch)
+                chunk = _export_lines(fmt, [_export_record(row) for row in batch]).encode("utf-8")
+                yield gz.compress(chunk) if gz else chunk
+        if gz:
+            yield gz.flush()
+        print(f"📤 export {filters['topic']}: {rows} filas ({fmt}{', gzip' if compress else ''})")
+    except Exception as e:
+        # los headers ya salieron: se corta la conexión (sin chunk final) para
+        # que el cliente vea un transfer incompleto y no un archivo "completo"
+        print(f"❌ export {filters['topic']}: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+@app.route("/api/webhooks/export", methods=["GET"])
+def export_webhooks():
+    """Export completo (sin paginar) de eventos + preview de un topic, filtrable
+    por received_at (since/until, ISO) y resource (patrón LIKE). `format=ndjson`
+    (default) o `csv`; `gzip=1` comprime el stream (Content-Encoding: gzip)."""
+    topic = request.args.get("topic")
+    if not topic:
+        return jsonify({"error": "Falta parámetro 'topic'"}), 400
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "Parámetro 'format' inválido (ndjson|csv)"}), 400
+
+    filters = {"topic": topic, "resource": request.args.get("resource")}
+    for key in ("since", "until"):
+        raw = request.args.get(key)
+        if not raw:
+            continue
+        try:
+            ts = datetime.fromisoformat(raw)
+        except ValueError:
+            return jsonify({"error": f"Parámetro '{key}' inválido (ISO 8601)"}), 400
+        filters[key] = ts if ts.tzinfo else ts.replace(tzinfo=ZoneInfo("UTC"))
+
+    if not _export_slots.acquire(blocking=False):
+        return jsonify({"error": "Demasiados exports en curso, reintentar más tarde"}), 429, {"Retry-After": "30"}
+
+    compress = request.args.get("gzip", "0") == "1"
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    response = app.response_class(_export_stream(filters, fmt, compress), mimetype=mimetype)
+    # el cupo se libera cuando el server cierra la respuesta (terminada, cortada
+    # o nunca iterada), no dentro del generador
+    response.call_on_close(_export_slots.release)
+    response.headers["Content-Disposition"] = f'attachment; filename="webhooks_{topic}.{fmt}"'
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
 @app.route("/api/ml/render")
 def render_meli_resource():
     resource = request.args.get("resource")
@@ -1967,13 +3636,29 @@ def get_topics():
                     return jsonify(_topics_cache["value"])
 
         with db_cursor() as cur:
-            cur.execute("""
-                SELECT topic, COUNT(*)
-                FROM webhooks
-                GROUP BY topic
-                ORDER BY COUNT(*) DESC
-            """)
-            topics = [{"topic": row[0], "count": row[1]} for row in cur.fetchall()]
+            # webhook_topic_counts lo mantienen triggers (O(topics)); sin la
+            # migración, fallback al GROUP BY sobre webhooks.
+            try:
+                cur.execute("""
+                    SELECT topic, SUM(raw_count), SUM(latest_count)
+                    FROM webhook_topic_counts
+                    GROUP BY topic
+                    HAVING SUM(raw_count) > 0
+                    ORDER BY SUM(raw_count) DESC
+                """)
+                topics = [
+                    {"topic": row[0], "count": int(row[1]), "latest_count": int(row[2])}
+                    for row in cur.fetchall()
+                ]
+            except Exception:
+                cur.connection.rollback()
+                cur.execute("""
+                    SELECT topic, COUNT(*)
+                    FROM webhooks
+                    GROUP BY topic
+                    ORDER BY COUNT(*) DESC
+                """)
+                topics = [{"topic": row[0], "count": row[1]} for row in cur.fetchall()]
 
         if WEBHOOK_TOPICS_CACHE_TTL > 0:
             with _topics_cache_lock:
@@ -2179,6 +3864,25 @@ def debug_dbinfo():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/debug/webhook-stats")
+def debug_webhook_stats():
+    """Contadores in-process de la ingesta (por proceso/worker de gunicorn)."""
+    return jsonify({
+        "dedup": _dedup_stats(),
+        "preview_fallback": _preview_fallback_stats(),
+        "preview_queue": _preview_queue_stats(),
+        "preview_admission": _admission_stats(),
+        "stages": _stage_stats(),
+        "webhooks_page_cache": _webhooks_page_stats(),
+    })
+
+@app.route("/debug/hot-resources")
+def debug_hot_resources():
+    """Resources que más notificaciones generan por topic (ventana deslizante,
+    por proceso/worker de gunicorn)."""
+    limit = request.args.get("limit", default=20, type=int)
+    return jsonify(_hot_resources(request.args.get("topic") or None, max(1, min(limit, 500))))
+
 # Headers tipo navegador
 BROWSER_HEADERS = {
     "User-Agent": "Mozilla/5.0",
@@ -3016,7 +4720,7 @@ def _process_promotion_webhook(resource):
         elif "/offers/" in resource:
             mla = _promo_resource_mla(resource)
             if mla and _redis_client is not None:
-                _redis_client.sadd(PROMOS_DIRTY_SET_KEY, mla)
+                _redis_deferred(lambda client: client.sadd(PROMOS_DIRTY_SET_KEY, mla))
     except Exception as e:
         print("⚠️ promo webhook fallo:", e)
 
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+from contextlib import asynccontextmanager
+
+import asyncpg
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from app import (
+    DEBUG_WEBHOOK,
+    WEBHOOK_INGEST_STREAM,
+    WEBHOOK_RAW_JSONB,
+    _PREVIEW_OUTBOX_INSERT_SQL,
+    _WEBHOOK_INSERT_SQL,
+    _WEBHOOK_LATEST_UPSERT_SQL,
+    _append_ingest_stream,
+    _dedup_remember,
+    _dedup_seen,
+    _dispatch_preview,
+    _hot_track,
+    _invalidate_webhooks_page,
+    _raw_json_text,
+    _uses_preview_outbox,
+    _webhook_latest_row,
+    _webhook_row,
+    redis_batch,
+)
+
+# Variante ASGI (Starlette + asyncpg) sólo para POST /webhook: mientras espera a
+# Postgres no ocupa un thread, así miles de notificaciones en vuelo no agotan los
+# workers. Misma validación, mismos statements (los de app.py, con placeholders
+# $n) y mismo despacho de preview; corre al lado de la app Flask:
+#
+#   uvicorn asgi_ingest:app --host 0.0.0.0 --port 3001 --workers 2
+#
+# y el proxy manda /webhook al puerto ASGI. Dedup in-process, stream y outbox
+# usan los mismos flags que app.py. El group commit es propio del camino Flask
+# (acá la concurrencia la absorbe el pool async).
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+POOL_MIN = int(os.getenv("ASGI_DB_POOL_MIN", "2"))
+POOL_MAX = int(os.getenv("ASGI_DB_POOL_MAX", "20"))
+
+
+def _numbered(sql: str) -> str:
+    """%s (psycopg2) -> $1..$n (asyncpg)."""
+    counter = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+
+_INSERT_SQL = _numbered(_WEBHOOK_INSERT_SQL)
+_LATEST_SQL = _numbered(_WEBHOOK_LATEST_UPSERT_SQL)
+_OUTBOX_SQL = _numbered(_PREVIEW_OUTBOX_INSERT_SQL)
+
+
+def _parse_body(body: bytes):
+    """Como request.get_json(silent=True, force=True): None si no es JSON."""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _reply(results):
+    if DEBUG_WEBHOOK:
+        return JSONResponse(results)
+    return PlainTextResponse("Evento recibido")
+
+
+async def _store_webhook_async(pool, evento, results, raw=None):
+    """Equivalente async de app._store_webhook. Devuelve el rowcount del INSERT."""
+    resource = evento.get("resource", "")
+    payload = raw if raw is not None else json.dumps(evento)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            status = await conn.execute(_INSERT_SQL, *_webhook_row(evento, payload))
+            inserted_count = int(status.split()[-1])  # "INSERT 0 <n>"
+            results["insert_original"] = {
+                "rowcount": inserted_count,
+                "webhook_id": evento.get("_id"),
+            }
+
+            if inserted_count > 0 and _uses_preview_outbox(resource):
+                await conn.execute(_OUTBOX_SQL, resource, evento.get("_id"))
+
+            # Snapshot latest best-effort: savepoint para que un error no aborte el INSERT
+            if inserted_count > 0 and resource:
+                try:
+                    async with conn.transaction():
+                        await conn.execute(_LATEST_SQL, *_webhook_latest_row(evento, payload))
+                except Exception as e:
+                    results["errors"].append(f"upsert_webhook_latest: {e}")
+    return inserted_count
+
+
+def _dispatch_in_batch(resource, results, topic=None):
+    # corre en el threadpool: redis_batch es por thread
+    with redis_batch():
+        if topic and resource:
+            _invalidate_webhooks_page(topic)
+        _dispatch_preview(resource, results)
+
+
+async def webhook(request):
+    try:
+        body = await request.body()
+        evento = _parse_body(body)
+        if not evento:
+            return PlainTextResponse("JSON inválido o vacío", status_code=400)
+
+        resource = evento.get("resource", "")
+        results = {
+            "received_resource": resource,
+            "insert_original": None,
+            "preview_refreshed": False,
+            "errors": [],
+        }
+        _hot_track(evento.get("topic"), resource)
+
+        if _dedup_seen(evento.get("_id")):
+            results["insert_original"] = {
+                "rowcount": 0,
+                "webhook_id": evento.get("_id"),
+                "cached_duplicate": True,
+            }
+            return _reply(results)
+
+        raw = _raw_json_text(body) if WEBHOOK_RAW_JSONB else None
+
+        if WEBHOOK_INGEST_STREAM:
+            stream_id, stream_err = await run_in_threadpool(_append_ingest_stream, body)
+            if stream_id:
+                _dedup_remember(evento.get("_id"))
+                results["insert_original"] = {
+                    "stream_id": stream_id,
+                    "webhook_id": evento.get("_id"),
+                }
+                return _reply(results)
+            results["errors"].append(f"append_ingest_stream: {stream_err}")
+
+        inserted_count = 0
+        try:
+            inserted_count = await _store_webhook_async(request.app.state.pool, evento, results, raw)
+            _dedup_remember(evento.get("_id"))
+        except Exception as e:
+            results["errors"].append(f"insert_original: {e}")
+
+        topic = evento.get("topic") if inserted_count > 0 else None
+        await run_in_threadpool(_dispatch_in_batch, resource, results, topic)
+        return _reply(results)
+
+    except Exception as e:
+        if DEBUG_WEBHOOK:
+            return JSONResponse({"ok": False, "fatal": str(e)}, status_code=500)
+        return PlainTextResponse("Error interno", status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = await asyncpg.create_pool(DATABASE_URL, min_size=POOL_MIN, max_size=POOL_MAX)
+    print(f"✅ asgi_ingest: pool asyncpg listo ({POOL_MIN}-{POOL_MAX} conexiones)")
+    try:
+        yield
+    finally:
+        await app.state.pool.close()
+
+
+app = Starlette(routes=[Route("/webhook", webhook, methods=["POST"])], lifespan=lifespan)
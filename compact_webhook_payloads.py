@@ -0,0 +1,162 @@
+import argparse
+import os
+import time
+
+import psycopg2
+
+from app import db_cursor
+
+# Compacta los payloads ya guardados (migración 20261016_04). El UPDATE reescribe
+# `payload = payload` y el trigger webhook_compact_payload saca las claves que
+# ya están en columnas. Recorre cada tabla hoja (particiones de webhooks y
+# webhook_latest) por rangos de bloques (TID Range Scan, PG14+): cada chunk es
+# una transacción corta y no hace falta índice. Las filas ya compactas no se
+# reescriben (filtro ?| sobre las claves).
+#
+#   python compact_webhook_payloads.py report
+#   python compact_webhook_payloads.py run --blocks 2000 --vacuum
+#
+# El espacio liberado lo reutilizan los INSERT nuevos después de VACUUM; para
+# devolverlo al disco hace falta VACUUM FULL / pg_repack (fuera de este script).
+
+BLOCKS = int(os.getenv("COMPACT_BLOCKS", "1000"))
+PAUSE_SECONDS = float(os.getenv("COMPACT_PAUSE_SECONDS", "0.1"))
+SAMPLE_PERCENT = float(os.getenv("COMPACT_SAMPLE_PERCENT", "1"))
+TABLES = ("webhooks", "webhook_latest")
+# claves que el trigger puede sacar (user_id sólo en webhooks)
+_COMPACT_KEYS = {
+    "webhooks": ["_id", "topic", "resource", "user_id"],
+    "webhook_latest": ["_id", "topic", "resource"],
+}
+
+
+def leaf_tables(cur, table):
+    """[(tabla hoja, bloques)]: particiones de webhooks, o la tabla misma."""
+    cur.execute("""
+        SELECT relid::regclass::text, pg_relation_size(relid) / current_setting('block_size')::int
+          FROM pg_partition_tree(%s::regclass)
+         WHERE isleaf
+         ORDER BY 1
+    """, (table,))
+    return cur.fetchall()
+
+
+def size_report(sample_percent=SAMPLE_PERCENT):
+    """Por tabla: tamaño total (heap+toast+índices, sumado sobre particiones),
+    heap+toast sin índices y bytes promedio del payload (muestra TABLESAMPLE)."""
+    report = {}
+    with db_cursor() as cur:
+        for table in TABLES:
+            cur.execute("""
+                SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0),
+                       COALESCE(SUM(pg_table_size(relid)), 0)
+                  FROM pg_partition_tree(%s::regclass)
+                 WHERE isleaf
+            """, (table,))
+            total_bytes, table_bytes = cur.fetchone()
+            cur.execute(
+                f"SELECT AVG(pg_column_size(payload)), COUNT(*) FROM {table} TABLESAMPLE SYSTEM (%s)",
+                (sample_percent,),
+            )
+            avg_payload, sampled = cur.fetchone()
+            report[table] = {
+                "total_bytes": total_bytes,
+                "table_bytes": table_bytes,
+                "avg_payload_bytes": round(float(avg_payload), 1) if avg_payload is not None else None,
+                "sampled_rows": sampled,
+            }
+    return report
+
+
+def print_report(label, report, before=None):
+    print(f"📊 {label}")
+    for table, stats in report.items():
+        line = (
+            f"   {table:<15} total={stats['total_bytes'] / 1024 ** 2:,.1f} MB "
+            f"heap+toast={stats['table_bytes'] / 1024 ** 2:,.1f} MB "
+            f"payload~{stats['avg_payload_bytes']} B/fila (muestra {stats['sampled_rows']})"
+        )
+        prev = (before or {}).get(table)
+        if prev and prev["avg_payload_bytes"] and stats["avg_payload_bytes"] is not None:
+            saved = 1 - stats["avg_payload_bytes"] / prev["avg_payload_bytes"]
+            line += f" → payload {saved:.0%} menos"
+        print(line)
+
+
+def compact_range(leaf, table, start_block, end_block):
+    """Compacta las filas de `leaf` en los bloques [start, end). Devuelve filas reescritas."""
+    keys = _COMPACT_KEYS[table]
+    with db_cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {leaf}
+               SET payload = payload
+             WHERE ctid >= %s::tid AND ctid < %s::tid
+               AND jsonb_typeof(payload) = 'object'
+               AND payload ?| %s
+            """,
+            (f"({start_block},0)", f"({end_block},0)", keys),
+        )
+        return cur.rowcount
+
+
+def _vacuum(leaves):
+    # VACUUM no corre dentro de una transacción: conexión propia en autocommit
+    conn = psycopg2.connect(os.getenv("DATABASE_ADMIN_URL") or os.getenv("DATABASE_URL"))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for leaf in leaves:
+                print(f"🧹 VACUUM (ANALYZE) {leaf}")
+                cur.execute(f"VACUUM (ANALYZE) {leaf}")
+    finally:
+        conn.close()
+
+
+def run(blocks=BLOCKS, vacuum=False):
+    before = size_report()
+    print_report("antes", before)
+
+    touched = []
+    total = 0
+    for table in TABLES:
+        with db_cursor() as cur:
+            leaves = leaf_tables(cur, table)
+        for leaf, nblocks in leaves:
+            # nblocks se fija al arrancar: las versiones nuevas que el UPDATE deja
+            # más allá no se recorren, y las que caen en bloques pendientes ya no
+            # tienen las claves y el filtro ?| las salta
+            rewritten = 0
+            for start in range(0, nblocks, blocks):
+                rewritten += compact_range(leaf, table, start, min(start + blocks, nblocks))
+                if PAUSE_SECONDS:
+                    time.sleep(PAUSE_SECONDS)
+            total += rewritten
+            if rewritten:
+                touched.append(leaf)
+            print(f"✅ {leaf}: {rewritten} filas compactadas ({nblocks} bloques)")
+
+    if vacuum and touched:
+        _vacuum(touched)
+    print_report("después", size_report(), before)
+    print(f"✅ compactación: {total} filas")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compactación de payloads de webhooks / webhook_latest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="tamaños y bytes promedio de payload")
+    run_p = sub.add_parser("run", help="compacta filas existentes")
+    run_p.add_argument("--blocks", type=int, default=BLOCKS, help="bloques de heap por transacción")
+    run_p.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) de las tablas tocadas al final")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        print_report("tamaños actuales", size_report())
+    else:
+        run(args.blocks, args.vacuum)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+-- Outbox transaccional de previews: /webhook (y los caminos batch) escriben la
+-- fila en la MISMA transacción que el INSERT en webhooks, así el job no se pierde
+-- si Redis falla. worker_outbox.py reclama filas en batch con FOR UPDATE SKIP LOCKED
+-- y un lease (claimed_until): si el worker muere, el lease vence y otra instancia
+-- retoma las filas.
+
+CREATE TABLE IF NOT EXISTS preview_outbox (
+    id            BIGSERIAL PRIMARY KEY,
+    resource      TEXT NOT NULL,
+    webhook_id    TEXT,
+    attempts      INT NOT NULL DEFAULT 0,
+    available_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),   -- backoff de reintentos
+    claimed_until TIMESTAMPTZ,                          -- lease del worker que la tomó
+    last_error    TEXT,
+    dead_at       TIMESTAMPTZ,                          -- agotó reintentos (queda para inspección)
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_preview_outbox_available
+    ON preview_outbox (available_at, id)
+    WHERE dead_at IS NULL;
+
+-- mluser es el rol de runtime: el handler de /webhook inserta en la misma
+-- transacción que webhooks; sin el GRANT (tabla + secuencia) se aborta también
+-- el INSERT del webhook original.
+GRANT SELECT, INSERT, UPDATE, DELETE ON preview_outbox TO mluser;
+GRANT USAGE, SELECT ON SEQUENCE preview_outbox_id_seq TO mluser;
@@ -0,0 +1,115 @@
+-- Particionado declarativo de webhooks por RANGE (received_at), requiere PG13+
+-- (trigger BEFORE ROW en tabla particionada).
+--
+-- * La tabla actual pasa a webhooks_legacy y se adjunta como partición
+--   [MINVALUE, corte), con corte = primer día del mes siguiente. No se copian
+--   filas: el CHECK se valida antes del ATTACH para que éste no re-escanee.
+-- * Las particiones nuevas (mensuales o semanales) las crea/retira
+--   webhook_partitions.py; acá se crean las de los próximos 3 meses y una
+--   DEFAULT de resguardo.
+-- * Un UNIQUE sobre la padre tendría que incluir received_at, así que la
+--   unicidad global de webhook_id pasa a webhook_ids + trigger BEFORE INSERT
+--   que devuelve NULL para duplicados (el INSERT no devuelve fila en RETURNING
+--   y rowcount = 0, igual que ON CONFLICT DO NOTHING). Por eso la app usa
+--   ON CONFLICT DO NOTHING sin target.
+--
+-- Correr en una ventana de bajo tráfico: el RENAME/ATTACH toma ACCESS EXCLUSIVE
+-- unos instantes. El backfill de webhook_ids recorre la tabla una vez.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webhook_ids (
+    webhook_id  TEXT PRIMARY KEY,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_ids_received_at
+    ON webhook_ids (received_at);
+
+INSERT INTO webhook_ids (webhook_id, received_at)
+SELECT webhook_id, MAX(received_at)
+  FROM webhooks
+ WHERE webhook_id IS NOT NULL
+ GROUP BY webhook_id
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE webhooks RENAME TO webhooks_legacy;
+ALTER INDEX IF EXISTS idx_webhooks_topic_received_at RENAME TO idx_webhooks_legacy_topic_received_at;
+ALTER INDEX IF EXISTS idx_webhooks_topic_resource_received_at RENAME TO idx_webhooks_legacy_topic_resource_received_at;
+ALTER INDEX IF EXISTS idx_webhooks_topic RENAME TO idx_webhooks_legacy_topic;
+
+CREATE TABLE webhooks (LIKE webhooks_legacy INCLUDING DEFAULTS)
+    PARTITION BY RANGE (received_at);
+
+CREATE INDEX idx_webhooks_topic_received_at
+    ON webhooks (topic, received_at DESC);
+
+CREATE INDEX idx_webhooks_topic_resource_received_at
+    ON webhooks (topic, resource, received_at DESC);
+
+CREATE INDEX idx_webhooks_topic
+    ON webhooks (topic);
+
+DO $$
+DECLARE
+    cutover TIMESTAMPTZ := date_trunc('month', NOW()) + INTERVAL '1 month';
+    col     TEXT;
+    seq     TEXT;
+    m       INT;
+    lo      TIMESTAMPTZ;
+BEGIN
+    -- las secuencias (serial) pasan a la padre: si no, retirar la partición
+    -- legacy las arrastraría.
+    FOR col IN
+        SELECT attname FROM pg_attribute
+         WHERE attrelid = 'webhooks_legacy'::regclass AND attnum > 0 AND NOT attisdropped
+    LOOP
+        seq := pg_get_serial_sequence('webhooks_legacy', col);
+        IF seq IS NOT NULL THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY webhooks.%I', seq, col);
+        END IF;
+    END LOOP;
+
+    EXECUTE format(
+        'ALTER TABLE webhooks_legacy ADD CONSTRAINT webhooks_legacy_received_at_range '
+        'CHECK (received_at IS NOT NULL AND received_at < %L) NOT VALID', cutover);
+    ALTER TABLE webhooks_legacy VALIDATE CONSTRAINT webhooks_legacy_received_at_range;
+    EXECUTE format(
+        'ALTER TABLE webhooks ATTACH PARTITION webhooks_legacy FOR VALUES FROM (MINVALUE) TO (%L)', cutover);
+    ALTER TABLE webhooks_legacy DROP CONSTRAINT webhooks_legacy_received_at_range;
+
+    FOR m IN 0..2 LOOP
+        lo := cutover + make_interval(months => m);
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF webhooks FOR VALUES FROM (%L) TO (%L)',
+            'webhooks_p' || to_char(lo, 'YYYY_MM'), lo, lo + INTERVAL '1 month');
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS webhooks_default PARTITION OF webhooks DEFAULT;
+
+CREATE OR REPLACE FUNCTION webhooks_claim_webhook_id() RETURNS trigger AS $$
+BEGIN
+    IF NEW.webhook_id IS NULL THEN
+        RETURN NEW;
+    END IF;
+    INSERT INTO webhook_ids (webhook_id, received_at)
+    VALUES (NEW.webhook_id, COALESCE(NEW.received_at, NOW()))
+    ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN NULL;  -- redelivery: se descarta la fila
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_webhooks_claim_webhook_id
+    BEFORE INSERT ON webhooks
+    FOR EACH ROW EXECUTE FUNCTION webhooks_claim_webhook_id();
+
+-- mluser es el rol de runtime: el trigger corre con sus permisos, así que sin
+-- el GRANT sobre webhook_ids falla (y aborta) cada INSERT de /webhook.
+GRANT SELECT, INSERT, UPDATE, DELETE ON webhooks TO mluser;
+GRANT SELECT, INSERT, DELETE ON webhook_ids TO mluser;
+
+COMMIT;
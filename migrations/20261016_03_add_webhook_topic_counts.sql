@@ -0,0 +1,96 @@
+-- Contadores por topic mantenidos por triggers, para que /api/webhooks/topics no
+-- haga GROUP BY sobre todo `webhooks`.
+--
+-- * raw_count: filas en webhooks; latest_count: filas en webhook_latest.
+-- * Triggers FOR EACH STATEMENT con transition tables: un INSERT batch (group
+--   commit / worker_ingest) actualiza una vez por topic, no una vez por fila.
+--   Los UPDATE de webhook_latest (ON CONFLICT DO UPDATE) no cambian el topic,
+--   así que no tocan contadores.
+-- * Cada topic está partido en 8 shards (pg_backend_pid() % 8) para que las
+--   transacciones concurrentes de un topic caliente no se serialicen sobre la
+--   misma fila. Leer = SUM por topic, O(topics * 8).
+-- * DETACH/DROP de particiones no dispara DELETE: webhook_partitions.py descuenta
+--   la partición antes de retirarla. refresh_webhook_topic_counts() resincroniza.
+
+CREATE TABLE IF NOT EXISTS webhook_topic_counts (
+    topic        TEXT NOT NULL,
+    shard        SMALLINT NOT NULL,
+    raw_count    BIGINT NOT NULL DEFAULT 0,
+    latest_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (topic, shard)
+);
+
+-- mluser es el rol de runtime: los triggers corren con sus permisos, sin el GRANT
+-- falla (y aborta) cada INSERT en webhooks/webhook_latest.
+GRANT SELECT, INSERT, UPDATE, DELETE ON webhook_topic_counts TO mluser;
+
+CREATE OR REPLACE FUNCTION webhook_topic_counts_apply() RETURNS trigger AS $$
+DECLARE
+    v_shard SMALLINT := pg_backend_pid() % 8;
+BEGIN
+    IF TG_ARGV[0] = 'raw' THEN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO webhook_topic_counts (topic, shard, raw_count)
+            SELECT topic, v_shard, COUNT(*) FROM new_rows WHERE topic IS NOT NULL GROUP BY topic
+            ON CONFLICT (topic, shard) DO UPDATE SET raw_count = webhook_topic_counts.raw_count + EXCLUDED.raw_count;
+        ELSE
+            INSERT INTO webhook_topic_counts (topic, shard, raw_count)
+            SELECT topic, v_shard, -COUNT(*) FROM old_rows WHERE topic IS NOT NULL GROUP BY topic
+            ON CONFLICT (topic, shard) DO UPDATE SET raw_count = webhook_topic_counts.raw_count + EXCLUDED.raw_count;
+        END IF;
+    ELSE
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO webhook_topic_counts (topic, shard, latest_count)
+            SELECT topic, v_shard, COUNT(*) FROM new_rows GROUP BY topic
+            ON CONFLICT (topic, shard) DO UPDATE SET latest_count = webhook_topic_counts.latest_count + EXCLUDED.latest_count;
+        ELSE
+            INSERT INTO webhook_topic_counts (topic, shard, latest_count)
+            SELECT topic, v_shard, -COUNT(*) FROM old_rows GROUP BY topic
+            ON CONFLICT (topic, shard) DO UPDATE SET latest_count = webhook_topic_counts.latest_count + EXCLUDED.latest_count;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_webhook_topic_counts() RETURNS void AS $$
+BEGIN
+    LOCK TABLE webhooks, webhook_latest IN SHARE MODE;  -- frena escrituras mientras cuenta
+    DELETE FROM webhook_topic_counts;
+    INSERT INTO webhook_topic_counts (topic, shard, raw_count, latest_count)
+    SELECT topic, 0, SUM(raw_count), SUM(latest_count)
+      FROM (
+        SELECT topic, COUNT(*) AS raw_count, 0 AS latest_count
+          FROM webhooks WHERE topic IS NOT NULL GROUP BY topic
+        UNION ALL
+        SELECT topic, 0, COUNT(*) FROM webhook_latest GROUP BY topic
+      ) c
+     GROUP BY topic;
+END;
+$$ LANGUAGE plpgsql;
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS trg_webhooks_topic_counts_ins ON webhooks;
+DROP TRIGGER IF EXISTS trg_webhooks_topic_counts_del ON webhooks;
+DROP TRIGGER IF EXISTS trg_webhook_latest_topic_counts_ins ON webhook_latest;
+DROP TRIGGER IF EXISTS trg_webhook_latest_topic_counts_del ON webhook_latest;
+
+CREATE TRIGGER trg_webhooks_topic_counts_ins
+    AFTER INSERT ON webhooks REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION webhook_topic_counts_apply('raw');
+CREATE TRIGGER trg_webhooks_topic_counts_del
+    AFTER DELETE ON webhooks REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION webhook_topic_counts_apply('raw');
+CREATE TRIGGER trg_webhook_latest_topic_counts_ins
+    AFTER INSERT ON webhook_latest REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION webhook_topic_counts_apply('latest');
+CREATE TRIGGER trg_webhook_latest_topic_counts_del
+    AFTER DELETE ON webhook_latest REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION webhook_topic_counts_apply('latest');
+
+-- backfill consistente con los triggers ya activos (toma SHARE lock: ventana
+-- de bajo tráfico; la tabla se escanea una vez)
+SELECT refresh_webhook_topic_counts();
+
+COMMIT;
@@ -0,0 +1,78 @@
+-- Payload compacto en webhooks y webhook_latest: las claves del body de ML que
+-- ya están en columnas (`_id` -> webhook_id, `topic`, `resource`, y `user_id`
+-- en webhooks) no se repiten en el jsonb. Queda lo demás (application_id,
+-- attempts, sent, received, ...).
+--
+-- * La compactación la hace un trigger BEFORE INSERT/UPDATE, así cubre todos los
+--   caminos de escritura (/webhook, group commit, /webhook/batch, worker_ingest,
+--   asgi_ingest) sin cambiar los INSERT. Sólo se saca una clave si su valor es
+--   idéntico (jsonb) a la columna y no es NULL/'': la reconstrucción es exacta.
+-- * Lectura: _webhook_payload_full() en app.py (o las vistas webhooks_full /
+--   webhook_latest_full para SQL ad-hoc) agrega de vuelta las claves faltantes.
+-- * Las filas existentes se compactan con `python compact_webhook_payloads.py run`
+--   (UPDATE por rangos de bloques, transacciones cortas) y
+--   `python compact_webhook_payloads.py report` muestra tamaños antes/después.
+-- * El trigger de webhooks va después de trg_webhooks_claim_webhook_id (orden
+--   alfabético), así los duplicados descartados no se compactan de gusto.
+
+CREATE OR REPLACE FUNCTION webhook_compact_payload() RETURNS trigger AS $$
+DECLARE
+    drop_keys TEXT[] := '{}';
+BEGIN
+    IF NEW.payload IS NULL OR jsonb_typeof(NEW.payload) <> 'object' THEN
+        RETURN NEW;
+    END IF;
+    IF NEW.webhook_id IS NOT NULL AND NEW.payload -> '_id' = to_jsonb(NEW.webhook_id) THEN
+        drop_keys := drop_keys || '_id'::text;
+    END IF;
+    IF NEW.topic IS NOT NULL AND NEW.payload -> 'topic' = to_jsonb(NEW.topic) THEN
+        drop_keys := drop_keys || 'topic'::text;
+    END IF;
+    IF NEW.resource <> '' AND NEW.payload -> 'resource' = to_jsonb(NEW.resource) THEN
+        drop_keys := drop_keys || 'resource'::text;
+    END IF;
+    IF TG_ARGV[0] = 'webhooks' THEN
+        -- webhook_latest no tiene user_id: ahí queda en el payload
+        IF NEW.user_id IS NOT NULL AND NEW.payload -> 'user_id' = to_jsonb(NEW.user_id) THEN
+            drop_keys := drop_keys || 'user_id'::text;
+        END IF;
+    END IF;
+    IF cardinality(drop_keys) > 0 THEN
+        NEW.payload := NEW.payload - drop_keys;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS trg_webhooks_compact_payload ON webhooks;
+DROP TRIGGER IF EXISTS trg_webhook_latest_compact_payload ON webhook_latest;
+
+CREATE TRIGGER trg_webhooks_compact_payload
+    BEFORE INSERT OR UPDATE OF payload ON webhooks
+    FOR EACH ROW EXECUTE FUNCTION webhook_compact_payload('webhooks');
+CREATE TRIGGER trg_webhook_latest_compact_payload
+    BEFORE INSERT OR UPDATE OF payload ON webhook_latest
+    FOR EACH ROW EXECUTE FUNCTION webhook_compact_payload('webhook_latest');
+
+-- Payload original reconstruido (las columnas sólo completan claves ausentes)
+CREATE OR REPLACE VIEW webhooks_full AS
+SELECT w.*,
+       jsonb_strip_nulls(jsonb_build_object(
+           '_id', w.webhook_id, 'topic', w.topic, 'user_id', w.user_id, 'resource', NULLIF(w.resource, '')
+       )) || w.payload AS full_payload
+  FROM webhooks w;
+
+CREATE OR REPLACE VIEW webhook_latest_full AS
+SELECT l.*,
+       jsonb_strip_nulls(jsonb_build_object(
+           '_id', l.webhook_id, 'topic', l.topic, 'resource', NULLIF(l.resource, '')
+       )) || l.payload AS full_payload
+  FROM webhook_latest l;
+
+-- mluser lee las vistas (retención / replays ad-hoc); el trigger no necesita GRANT
+-- extra porque sólo toca NEW.
+GRANT SELECT ON webhooks_full, webhook_latest_full TO mluser;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Lookup de topics por resource: fetch_and_store_preview() lo usa para invalidar
+-- la primera página cacheada de /api/webhooks (WEBHOOKS_PAGE_CACHE) de cada topic
+-- que muestra ese resource. La PK (topic, resource) no sirve sin el topic.
+--
+-- CONCURRENTLY: no bloquea los upserts de /webhook mientras se arma; por eso
+-- este archivo no va en una transacción (correrlo suelto con psql).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_webhook_latest_resource
+    ON webhook_latest (resource);
@@ -0,0 +1,9 @@
+-- GET /api/webhooks/changes busca los previews actualizados desde el token del
+-- cliente (last_updated > token - overlap): sin índice es un seq scan de
+-- ml_previews en cada poll. El lado webhook_latest ya usa
+-- idx_webhook_latest_topic_received_resource.
+--
+-- CONCURRENTLY: no bloquea los upserts de fetch_and_store_preview; correr suelto
+-- con psql (no va en una transacción).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ml_previews_last_updated
+    ON ml_previews (last_updated);
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from app import db_cursor
+from retention_webhooks import list_topics
+
+# Arma / repara webhook_latest desde webhooks para que /api/webhooks nunca
+# necesite el GROUP BY legado (WEBHOOKS_LEGACY_FALLBACK).
+#
+#   rebuild: por topic, chunks de CHUNK resources con DISTINCT ON (resource)
+#            sobre idx_webhooks_topic_resource_received_at, keyset por resource.
+#            Cada chunk es un upsert en su propia transacción; nunca pisa un
+#            snapshot más nuevo (el de /webhook en paralelo gana). Checkpoint
+#            por topic: cortado, retoma con la misma línea de comando.
+#   check:   recorre igual y cuenta drift (resources sin snapshot o con un
+#            snapshot más viejo que el último evento). Sale con 1 si hay drift.
+#
+#   python rebuild_webhook_latest.py rebuild [--topic items]
+#   python rebuild_webhook_latest.py check --topic orders_v2
+
+CHUNK = int(os.getenv("REBUILD_CHUNK", "2000"))
+PAUSE_SECONDS = float(os.getenv("REBUILD_PAUSE_SECONDS", "0.05"))
+CHECKPOINT = os.getenv("REBUILD_CHECKPOINT", ".replay/rebuild_webhook_latest.json")
+
+# último evento por resource del chunk; user_id vuelve al payload porque
+# webhook_latest no tiene la columna (y el payload de webhooks puede venir compacto)
+_CHUNK_CTE = """
+    chunk AS (
+        SELECT DISTINCT ON (resource)
+               topic, resource, webhook_id, received_at,
+               jsonb_strip_nulls(jsonb_build_object('user_id', user_id)) || payload AS payload
+          FROM webhooks
+         WHERE topic = %s AND resource > %s AND resource <> ''
+         ORDER BY resource, received_at DESC
+         LIMIT %s
+    )
+"""
+
+
+def rebuild_chunk(topic, after, limit=CHUNK):
+    """Upsert de los próximos `limit` resources del topic después de `after`.
+    Devuelve (último resource, resources leídos, filas escritas)."""
+    with db_cursor() as cur:
+        cur.execute(f"""
+            WITH {_CHUNK_CTE},
+            upserted AS (
+                INSERT INTO webhook_latest (topic, resource, webhook_id, received_at, payload)
+                SELECT topic, resource, webhook_id, received_at, payload FROM chunk
+                ON CONFLICT (topic, resource) DO UPDATE SET
+                    webhook_id = EXCLUDED.webhook_id,
+                    received_at = EXCLUDED.received_at,
+                    payload = EXCLUDED.payload
+                 WHERE webhook_latest.received_at < EXCLUDED.received_at
+                RETURNING 1
+            )
+            SELECT (SELECT MAX(resource) FROM chunk),
+                   (SELECT COUNT(*) FROM chunk),
+                   (SELECT COUNT(*) FROM upserted)
+        """, (topic, after, limit))
+        return cur.fetchone()
+
+
+def check_chunk(topic, after, limit=CHUNK):
+    """Compara el último evento de cada resource del chunk con su snapshot.
+    Devuelve (último resource, leídos, [(resource, motivo)])."""
+    with db_cursor() as cur:
+        cur.execute(f"""
+            WITH {_CHUNK_CTE}
+            SELECT c.resource, c.received_at, l.received_at
+              FROM chunk c
+              LEFT JOIN webhook_latest l ON l.topic = c.topic AND l.resource = c.resource
+             ORDER BY c.resource
+        """, (topic, after, limit))
+        rows = cur.fetchall()
+    drift = []
+    for resource, event_at, snapshot_at in rows:
+        if snapshot_at is None:
+            drift.append((resource, "missing"))
+        elif snapshot_at < event_at:
+            drift.append((resource, "stale"))
+    return (rows[-1][0] if rows else None), len(rows), drift
+
+
+def _load_checkpoint(path):
+    if not os.path.exists(path):
+        return {"topics": {}}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _save_checkpoint(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    state["updated_at"] = datetime.now(ZoneInfo("UTC")).isoformat()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def rebuild(topics, chunk=CHUNK, checkpoint=CHECKPOINT):
+    state = _load_checkpoint(checkpoint)
+    total_written = 0
+    for topic in topics:
+        progress = state["topics"].setdefault(topic, {"after": "", "done": False, "read": 0, "written": 0})
+        if progress["done"]:
+            print(f"⏭️ {topic}: ya reconstruido ({progress['read']} resources)")
+            continue
+        if progress["after"]:
+            print(f"↪️ {topic}: retomando después de {progress['after']}")
+        while True:
+            last, read, written = rebuild_chunk(topic, progress["after"], chunk)
+            if not read:
+                progress["done"] = True
+                _save_checkpoint(checkpoint, state)
+                break
+            progress.update(after=last, read=progress["read"] + read, written=progress["written"] + written)
+            total_written += written
+            _save_checkpoint(checkpoint, state)
+            if PAUSE_SECONDS:
+                time.sleep(PAUSE_SECONDS)
+        print(f"✅ {topic}: {progress['read']} resources, {progress['written']} snapshots escritos")
+    print(f"✅ rebuild: {total_written} snapshots escritos en esta corrida")
+    return state
+
+
+def check(topics, chunk=CHUNK, examples=10):
+    report = {}
+    for topic in topics:
+        after, read_total, counts, sample = "", 0, {"missing": 0, "stale": 0}, []
+        while True:
+            last, read, drift = check_chunk(topic, after, chunk)
+            if not read:
+                break
+            read_total += read
+            for resource, reason in drift:
+                counts[reason] += 1
+                if len(sample) < examples:
+                    sample.append({"resource": resource, "reason": reason})
+            after = last
+        report[topic] = {"resources": read_total, **counts, "examples": sample}
+        status = "✅" if not (counts["missing"] or counts["stale"]) else "⚠️"
+        print(f"{status} {topic}: {read_total} resources, {counts['missing']} sin snapshot, {counts['stale']} atrasados")
+        for item in sample:
+            print(f"   {item['reason']}: {item['resource']}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild / chequeo de webhook_latest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("rebuild", "check"):
+        p = sub.add_parser(name)
+        p.add_argument("--topic", action="append", help="repetible; default: todos los topics")
+        p.add_argument("--chunk", type=int, default=CHUNK)
+    sub.choices["rebuild"].add_argument("--checkpoint", default=CHECKPOINT)
+    sub.choices["rebuild"].add_argument("--reset", action="store_true", help="ignorar el checkpoint")
+    args = parser.parse_args(argv)
+
+    topics = args.topic or list_topics()
+    if args.command == "rebuild":
+        if args.reset and os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+        rebuild(topics, args.chunk, args.checkpoint)
+        return 0
+    report = check(topics, args.chunk)
+    return 1 if any(t["missing"] or t["stale"] for t in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import (
+    WEBHOOK_PREVIEW_ASYNC,
+    _PREVIEW_OUTBOX_INSERT_SQL,
+    _enqueue_preview_job,
+    _process_promotion_webhook,
+    _redis_client,
+    _uses_preview_outbox,
+    db_cursor,
+    fetch_and_store_preview,
+    redis_batch,
+)
+
+# Re-inyecta en el pipeline de previews los resources de `webhooks` que matchean
+# topic / rango de received_at / patrón LIKE (p.ej. después de una caída de ML o
+# del worker). Cada resource se despacha una sola vez, por el mismo camino que
+# /webhook: promos -> _process_promotion_webhook, outbox -> preview_outbox, cola
+# Redis si hay (lanes/coalesce incluidos) y, si no, inline.
+#
+# Lee con un cursor server-side ordenado por resource: la memoria no depende del
+# rango, el dedup sale del GROUP BY y el checkpoint es el último resource
+# despachado. Si se corta, la misma línea de comando retoma desde ahí.
+#
+#   python replay_webhooks.py --topic items --since 2026-10-01T00:00 --until 2026-10-02T00:00 \
+#       --pattern '/items/MLA%/price_to_win' --rate 20
+
+CHECKPOINT_DIR = os.getenv("REPLAY_CHECKPOINT_DIR", ".replay")
+FETCH_SIZE = int(os.getenv("REPLAY_FETCH_SIZE", "2000"))
+CHECKPOINT_EVERY = int(os.getenv("REPLAY_CHECKPOINT_EVERY", "100"))
+PROGRESS_SECONDS = float(os.getenv("REPLAY_PROGRESS_SECONDS", "5"))
+
+
+def _parse_ts(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=ZoneInfo("UTC"))
+
+
+def build_query(filters: dict, after: str = None, count: bool = False):
+    """SELECT de resources distintos (o su COUNT) para los filtros, desde `after`."""
+    where = ["resource IS NOT NULL", "resource <> ''"]
+    params = []
+    if filters.get("topic"):
+        where.append("topic = %s")
+        params.append(filters["topic"])
+    if filters.get("since"):
+        where.append("received_at >= %s")
+        params.append(_parse_ts(filters["since"]))
+    if filters.get("until"):
+        where.append("received_at < %s")
+        params.append(_parse_ts(filters["until"]))
+    if filters.get("pattern"):
+        where.append("resource LIKE %s")
+        params.append(filters["pattern"])
+    if after is not None:
+        where.append("resource > %s")
+        params.append(after)
+    where_sql = " AND ".join(where)
+    if count:
+        return f"SELECT COUNT(DISTINCT resource) FROM webhooks WHERE {where_sql}", params
+    return f"SELECT resource FROM webhooks WHERE {where_sql} GROUP BY resource ORDER BY resource", params
+
+
+def checkpoint_path(filters: dict, directory: str = CHECKPOINT_DIR) -> str:
+    key = "_".join(
+        str(filters.get(k) or "all") for k in ("topic", "since", "until", "pattern")
+    )
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+    return os.path.join(directory, f"replay_{safe}.json")
+
+
+def load_checkpoint(path: str, filters: dict):
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        state = json.load(fh)
+    if state.get("filters") != filters:
+        raise SystemExit(f"❌ {path} es de otros filtros ({state.get('filters')}); usar --reset o --checkpoint")
+    return state
+
+
+def save_checkpoint(path: str, state: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    state["updated_at"] = datetime.now(ZoneInfo("UTC")).isoformat()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)  # atómico: un corte no deja el checkpoint a medias
+
+
+def push_resource(resource: str) -> str:
+    """Despacha el preview del resource. Devuelve por dónde salió."""
+    if resource.startswith("/seller-promotions/"):
+        _process_promotion_webhook(resource)
+        return "promos"
+    if _uses_preview_outbox(resource):
+        with db_cursor() as cur:
+            cur.execute(_PREVIEW_OUTBOX_INSERT_SQL, (resource, None))
+        return "outbox"
+    if WEBHOOK_PREVIEW_ASYNC and _redis_client is not None:
+        enqueued, err = _enqueue_preview_job(resource)
+        if enqueued:
+            return "queue"
+        print(f"⚠️ replay: no se pudo encolar {resource} ({err}), corre inline")
+    fetch_and_store_preview(resource)
+    return "inline"
+
+
+def _connect():
+    # conexión propia: el cursor server-side vive en una transacción larga
+    return psycopg2.connect(os.getenv("DATABASE_ADMIN_URL") or os.getenv("DATABASE_URL"))
+
+
+def _fmt_eta(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def run(filters: dict, rate: float, checkpoint: str, count_first: bool = True, limit: int = None):
+    state = load_checkpoint(checkpoint, filters) or {
+        "filters": filters, "last_resource": None, "done": 0, "by_route": {}, "errors": 0,
+    }
+    if state["last_resource"] is not None:
+        print(f"↪️ retomando después de {state['last_resource']} ({state['done']} ya despachados)")
+
+    conn = _connect()
+    try:
+        remaining = None
+        if count_first:
+            with conn.cursor() as cur:
+                cur.execute(*build_query(filters, state["last_resource"], count=True))
+                remaining = cur.fetchone()[0]
+            print(f"🔄 replay: {remaining} resources por despachar a {rate:g}/s")
+
+        interval = 1.0 / rate if rate > 0 else 0
+        started = last_progress = time.monotonic()
+        next_slot = started
+        sent = 0
+        with conn.cursor(name="replay_webhooks") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute(*build_query(filters, state["last_resource"]))
+            for (resource,) in cur:
+                if limit is not None and sent >= limit:
+                    break
+                if interval:
+                    wait = next_slot - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    next_slot = max(next_slot, time.monotonic() - interval) + interval
+                try:
+                    with redis_batch():
+                        route = push_resource(resource)
+                    state["by_route"][route] = state["by_route"].get(route, 0) + 1
+                except Exception as err:
+                    state["errors"] += 1
+                    print(f"❌ replay {resource}: {err}")
+                state["last_resource"] = resource
+                state["done"] += 1
+                sent += 1
+                if sent % CHECKPOINT_EVERY == 0:
+                    save_checkpoint(checkpoint, state)
+
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_SECONDS:
+                    last_progress = now
+                    speed = sent / (now - started)
+                    progress = f"{sent}"
+                    if remaining:
+                        eta = (remaining - sent) / speed if speed else 0
+                        progress += f"/{remaining} ({sent * 100 / remaining:.1f}%) ETA {_fmt_eta(eta)}"
+                    print(f"⏳ {progress} · {speed:.1f}/s · último {resource}")
+        conn.commit()
+    finally:
+        save_checkpoint(checkpoint, state)
+        conn.close()
+
+    print(f"✅ replay: {sent} resources en esta corrida ({state['done']} total), "
+          f"rutas={state['by_route']}, errores={state['errors']}")
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-despacha previews de webhooks guardados")
+    parser.add_argument("--topic")
+    parser.add_argument("--since", help="received_at >= (ISO, UTC si no trae zona)")
+    parser.add_argument("--until", help="received_at < (ISO)")
+    parser.add_argument("--pattern", help="LIKE sobre resource, p.ej. '/items/MLA%%/price_to_win'")
+    parser.add_argument("--rate", type=float, default=10, help="resources/seg (0 = sin límite)")
+    parser.add_argument("--limit", type=int, help="cortar después de N resources (se puede retomar)")
+    parser.add_argument("--checkpoint", help="archivo de checkpoint (default: derivado de los filtros)")
+    parser.add_argument("--reset", action="store_true", help="ignorar el checkpoint y empezar de cero")
+    parser.add_argument("--no-count", action="store_true", help="no contar antes (sin %% ni ETA)")
+    args = parser.parse_args(argv)
+
+    filters = {"topic": args.topic, "since": args.since, "until": args.until, "pattern": args.pattern}
+    checkpoint = args.checkpoint or checkpoint_path(filters)
+    if args.reset and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    run(filters, args.rate, checkpoint, count_first=not args.no_count, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
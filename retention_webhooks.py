@@ -0,0 +1,140 @@
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from app import _webhook_payload_full, db_cursor
+from webhook_archive import ARCHIVE_DIR, append_records, archive_path
+
+# Retención de `webhooks`: borra filas con received_at anterior a RETENTION_DAYS
+# en chunks chicos (cada chunk es su propia transacción, así no hay locks largos
+# ni un WAL enorme). Antes del COMMIT de cada chunk las filas borradas se
+# archivan en NDJSON+zstd por topic/día (webhook_archive.py las lee). Si el
+# archivo falla, el chunk hace rollback y no se borra nada.
+#
+# Recorre topic por topic con keyset sobre idx_webhooks_topic_received_at: cada
+# chunk arranca en el received_at donde terminó el anterior, así no re-escanea
+# las entradas de índice muertas que dejan los DELETE hasta el próximo VACUUM.
+# Con la tabla particionada, para rangos completos conviene
+# `webhook_partitions.py retire` (DETACH/DROP es instantáneo); este job cubre el
+# resto y la tabla sin particionar.
+#
+#   python retention_webhooks.py            (cron diario)
+#   RETENTION_DRY_RUN=1 python retention_webhooks.py
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+BATCH = int(os.getenv("RETENTION_BATCH", "5000"))
+PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.2"))  # respiro entre chunks
+DRY_RUN = os.getenv("RETENTION_DRY_RUN", "0") == "1"
+
+
+def list_topics():
+    """Topics distintos vía skip-scan sobre el índice de topic (no recorre la tabla)."""
+    with db_cursor() as cur:
+        cur.execute("""
+            WITH RECURSIVE t AS (
+                (SELECT topic FROM webhooks WHERE topic IS NOT NULL ORDER BY topic LIMIT 1)
+                UNION ALL
+                SELECT (SELECT topic FROM webhooks WHERE topic > t.topic ORDER BY topic LIMIT 1)
+                  FROM t
+                 WHERE t.topic IS NOT NULL
+            )
+            SELECT topic FROM t WHERE topic IS NOT NULL
+        """)
+        return [row[0] for row in cur.fetchall()]
+
+
+def _archive_rows(rows, archive_dir):
+    """Agrupa por (topic, día de received_at) y agrega un frame por archivo."""
+    groups = {}
+    for topic, user_id, resource, payload, webhook_id, received_at in rows:
+        day = received_at.astimezone(ZoneInfo("UTC")).date()
+        groups.setdefault((topic, day), []).append({
+            "topic": topic,
+            "user_id": user_id,
+            "resource": resource,
+            "webhook_id": webhook_id,
+            "received_at": received_at.isoformat(),
+            # el archivo guarda el body original, no el compacto (webhook_archive replay lo re-postea)
+            "payload": _webhook_payload_full(payload, topic, user_id, resource, webhook_id),
+        })
+    for (topic, day), records in groups.items():
+        append_records(archive_path(archive_dir, topic, day), records)
+
+
+def purge_chunk(topic, cutoff, after, limit=BATCH, archive_dir=ARCHIVE_DIR):
+    """Borra (y archiva) hasta `limit` filas del topic con after <= received_at < cutoff.
+    Devuelve (filas, último received_at) o (0, None) si no quedan."""
+    with db_cursor() as cur:
+        cur.execute("""
+            WITH doomed AS (
+                SELECT tableoid, ctid
+                  FROM webhooks
+                 WHERE topic = %s
+                   AND received_at >= %s
+                   AND received_at < %s
+                 ORDER BY received_at
+                 LIMIT %s
+                 FOR UPDATE SKIP LOCKED
+            )
+            DELETE FROM webhooks w
+             USING doomed d
+             WHERE w.tableoid = d.tableoid AND w.ctid = d.ctid
+            RETURNING w.topic, w.user_id, w.resource, w.payload, w.webhook_id, w.received_at
+        """, (topic, after, cutoff, limit))
+        rows = cur.fetchall()
+        if not rows:
+            return 0, None
+        # dentro de la transacción: si el archivo falla, db_cursor hace rollback
+        _archive_rows(rows, archive_dir)
+        return len(rows), max(row[5] for row in rows)
+
+
+def purge_topic(topic, cutoff):
+    after = datetime(1970, 1, 1, tzinfo=ZoneInfo("UTC"))
+    total = 0
+    while True:
+        deleted, last = purge_chunk(topic, cutoff, after)
+        if not deleted:
+            return total
+        total += deleted
+        after = last
+        if PAUSE_SECONDS:
+            time.sleep(PAUSE_SECONDS)
+
+
+def _prune_webhook_ids(cutoff):
+    """webhook_ids (dedup de la tabla particionada, migración 20261016_02) se
+    acota con el mismo corte."""
+    with db_cursor() as cur:
+        cur.execute("SELECT to_regclass('webhook_ids') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return 0
+        cur.execute("DELETE FROM webhook_ids WHERE received_at < %s", (cutoff,))
+        return cur.rowcount
+
+
+def run(days=RETENTION_DAYS):
+    cutoff = datetime.now(ZoneInfo("UTC")) - timedelta(days=days)
+    topics = list_topics()
+    print(f"🔄 retención webhooks: < {cutoff.isoformat()} ({days} días), {len(topics)} topics, batch={BATCH}")
+    if DRY_RUN:
+        with db_cursor() as cur:
+            cur.execute("SELECT topic, COUNT(*) FROM webhooks WHERE received_at < %s GROUP BY topic", (cutoff,))
+            for topic, count in cur.fetchall():
+                print(f"🔍 {topic}: {count} filas a borrar")
+        return 0
+
+    total = 0
+    for topic in topics:
+        deleted = purge_topic(topic, cutoff)
+        total += deleted
+        if deleted:
+            print(f"✅ {topic}: {deleted} filas archivadas y borradas")
+    pruned = _prune_webhook_ids(cutoff)
+    print(f"✅ retención: {total} filas, {pruned} webhook_ids")
+    return total
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,115 @@
+"""POST /webhook con N emisores concurrentes: app Flask vs asgi_ingest.py.
+
+Cada emisor mantiene una conexión HTTP/1.1 keep-alive y manda webhooks con
+`_id` únicos (todos llegan a Postgres: el dedup no ayuda). Levantar los dos
+servidores contra la misma base antes de correrlo, por ejemplo:
+
+    gunicorn -w 4 --threads 8 -b :3000 app:app
+    uvicorn asgi_ingest:app --port 3001 --workers 4
+
+    FLASK_URL=http://localhost:3000/webhook ASGI_URL=http://localhost:3001/webhook \
+        BENCH_SENDERS=500 BENCH_SECONDS=30 python scripts/bench_ingest_concurrency.py
+
+Los eventos usan topic `bench_ingest`; borrarlos después con
+`DELETE FROM webhooks WHERE topic = 'bench_ingest'` (y de webhook_latest).
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+TARGETS = [
+    ("flask", os.getenv("FLASK_URL", "http://localhost:3000/webhook")),
+    ("asgi", os.getenv("ASGI_URL", "http://localhost:3001/webhook")),
+]
+SENDERS = int(os.getenv("BENCH_SENDERS", "500"))
+SECONDS = float(os.getenv("BENCH_SECONDS", "30"))
+RESOURCES = int(os.getenv("BENCH_RESOURCES", "5000"))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _request(host, path, seq):
+    body = json.dumps({
+        "_id": f"bench-{uuid.uuid4()}",
+        "topic": "bench_ingest",
+        "user_id": 1,
+        "resource": f"/bench/MLA{seq % RESOURCES}",
+        "attempts": 1,
+        "sent": "2026-10-16T12:00:00.000Z",
+    }).encode("utf-8")
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("conexión cerrada")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def _sender(url, deadline, samples, errors, seq):
+    parts = urlsplit(url)
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            start = time.perf_counter()
+            writer.write(_request(parts.netloc, parts.path or "/", next(seq)))
+            status = await _read_response(reader)
+            if status == 200:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                errors.append(status)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as err:
+            errors.append(type(err).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(url):
+    samples, errors = [], []
+    seq = iter(range(10**12))
+    deadline = time.perf_counter() + SECONDS
+    started = time.perf_counter()
+    await asyncio.gather(*(_sender(url, deadline, samples, errors, seq) for _ in range(SENDERS)))
+    return samples, errors, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    print(f"senders={SENDERS} seconds={SECONDS:g} (ms por request)")
+    print(f"{'app':<8}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errores':>10}")
+    for name, url in TARGETS:
+        samples, errors, elapsed = asyncio.run(run(url))
+        if not samples:
+            print(f"{name:<8}{'-':>10}  sin respuestas OK ({len(errors)} errores, ej. {errors[:3]})")
+            continue
+        print(
+            f"{name:<8}{len(samples) / elapsed:>10.0f}{percentile(samples, 50):>10.1f}"
+            f"{percentile(samples, 95):>10.1f}{percentile(samples, 99):>10.1f}{len(errors):>10}"
+        )
@@ -0,0 +1,104 @@
+"""Latencia de POST /webhook con redis_batch() activo vs desactivado.
+
+Manda eventos al handler real (`app.test_client()`: parseo, dedup, INSERT +
+snapshot en Postgres, encolado del preview, SSE) y mide el request completo:
+
+  pipelined:  como en producción, los comandos Redis del request salen en un
+              solo pipeline al cerrar `with redis_batch():`
+  sequential: redis_batch() reemplazado por un no-op, así _redis_deferred()
+              manda cada comando en su propio round trip (camino previo)
+
+Apuntar REDIS_URL a un Redis remoto para ver el efecto del RTT (con Redis local
+la diferencia es chica) y DATABASE_URL a una base de staging: cada request
+inserta un evento con topic BENCH_TOPIC; esas filas se borran al final. El
+preview va por la cola async (WEBHOOK_PREVIEW_ASYNC=1 si no está seteado), así
+que conviene correrlo sin worker_preview consumiendo esa cola.
+
+    REDIS_URL=redis://redis-remoto:6379/0 DATABASE_URL=postgresql://... \\
+        BENCH_RUNS=1000 python scripts/bench_redis_pipeline.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("WEBHOOK_PREVIEW_ASYNC", "1")
+
+import app as app_module  # noqa: E402
+
+
+RUNS = int(os.getenv("BENCH_RUNS", "1000"))
+TOPIC = os.getenv("BENCH_TOPIC", "bench_pipeline")
+RESOURCE = os.getenv("BENCH_RESOURCE", "/items/MLA1432567890/price_to_win")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def measure(client, mode):
+    samples, failed = [], 0
+    run_id = int(time.time())
+    for i in range(RUNS + 1):
+        body = json.dumps({
+            "_id": f"bench-{mode}-{run_id}-{i}",  # id nuevo: sin atajo del dedup
+            "topic": TOPIC,
+            "resource": RESOURCE,
+            "user_id": 1,
+            "attempts": 1,
+        })
+        start = time.perf_counter()
+        res = client.post("/webhook", data=body, content_type="application/json")
+        elapsed = (time.perf_counter() - start) * 1000
+        if i == 0:
+            continue  # calienta pool de Postgres y conexión Redis
+        if res.status_code != 200:
+            failed += 1
+        samples.append(elapsed)
+    return samples, failed
+
+
+def redis_rtt():
+    start = time.perf_counter()
+    app_module._redis_client.ping()
+    return (time.perf_counter() - start) * 1000
+
+
+def cleanup():
+    with app_module.db_cursor() as cur:
+        cur.execute("DELETE FROM webhook_latest WHERE topic = %s", (TOPIC,))
+        cur.execute("DELETE FROM webhooks WHERE topic = %s", (TOPIC,))
+
+
+if __name__ == "__main__":
+    if app_module._redis_client is None:
+        sys.exit("❌ Redis no disponible: revisar REDIS_URL")
+    rtt = statistics.median(redis_rtt() for _ in range(50))
+    print(f"runs={RUNS} topic={TOPIC} redis rtt~{rtt:.3f} ms (ms por request a /webhook)")
+    print(f"{'modo':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'no 200':>8}")
+    batch = app_module.redis_batch
+    results = {}
+    try:
+        with app_module.app.test_client() as client:
+            for name, ctx in (("sequential", nullcontext), ("pipelined", batch)):
+                app_module.redis_batch = ctx  # _handle_webhook lo resuelve en cada request
+                samples, failed = measure(client, name)
+                results[name] = samples
+                print(
+                    f"{name:<12}{percentile(samples, 50):>10.3f}{percentile(samples, 95):>10.3f}"
+                    f"{percentile(samples, 99):>10.3f}{max(samples):>10.3f}{failed:>8}"
+                )
+    finally:
+        app_module.redis_batch = batch
+        cleanup()
+    base, fast = results.get("sequential"), results.get("pipelined")
+    if base and fast:
+        print(
+            f"ahorro: p50 {percentile(base, 50) - percentile(fast, 50):.3f} ms · "
+            f"p99 {percentile(base, 99) - percentile(fast, 99):.3f} ms"
+        )
@@ -0,0 +1,92 @@
+"""Microbenchmark del costo de CPU por request al preparar el payload de /webhook.
+
+Compara, sobre payloads típicos de ML, lo que hace el handler antes de mandar
+los dos statements (INSERT webhooks + upsert webhook_latest):
+
+  json_adapt: get_json() + Json(evento) adaptado dos veces (camino por defecto)
+  raw_jsonb:  get_json() + body crudo decodificado y adaptado como texto ::jsonb
+              (WEBHOOK_RAW_JSONB=1)
+
+No necesita DB: mide la adaptación client-side que hace psycopg2 en execute().
+"""
+import json
+import os
+import statistics
+import time
+
+from psycopg2.extensions import adapt
+from psycopg2.extras import Json
+
+
+RUNS = int(os.getenv("BENCH_RUNS", "20000"))
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+
+SAMPLE_PAYLOADS = {
+    "price_to_win": {
+        "_id": "7c9d7a1e-4f0b-4c0e-9a57-1f3b8d2c6e11",
+        "topic": "price_suggestion",
+        "resource": "/items/MLA1432567890/price_to_win",
+        "user_id": 123456789,
+        "application_id": 5503910054141466,
+        "sent": "2026-10-16T12:00:00.123Z",
+        "attempts": 1,
+        "received": "2026-10-16T12:00:00.101Z",
+    },
+    "public_offers": {
+        "_id": "0b1c2d3e-4f50-6172-8394-a5b6c7d8e9f0",
+        "topic": "public_offers",
+        "resource": "/seller-promotions/offers/OFFER-MLA1632687413-111",
+        "user_id": 123456789,
+        "application_id": 5503910054141466,
+        "sent": "2026-10-16T12:00:01.456Z",
+        "attempts": 2,
+        "received": "2026-10-16T12:00:01.400Z",
+        "actions": ["update"],
+    },
+    "orders": {
+        "_id": "a1b2c3d4-e5f6-4789-90ab-cdef01234567",
+        "topic": "orders_v2",
+        "resource": "/orders/2000003508897476",
+        "user_id": 123456789,
+        "application_id": 5503910054141466,
+        "sent": "2026-10-16T12:00:02.789Z",
+        "attempts": 1,
+        "received": "2026-10-16T12:00:02.700Z",
+    },
+}
+
+
+def json_adapt(raw: bytes):
+    evento = json.loads(raw)
+    payload_webhooks = Json(evento)
+    payload_latest = Json(evento)
+    return adapt(payload_webhooks).getquoted(), adapt(payload_latest).getquoted()
+
+
+def raw_jsonb(raw: bytes):
+    evento = json.loads(raw)  # validación + topic/resource/user_id/_id
+    payload = raw.decode("utf-8")
+    quoted = adapt(payload).getquoted()
+    # mismo objeto para los dos statements; psycopg2 lo cotiza por statement
+    return evento.get("_id"), quoted, adapt(payload).getquoted()
+
+
+def measure(fn, raw):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.process_time()
+        for _ in range(RUNS):
+            fn(raw)
+        samples.append((time.process_time() - start) / RUNS * 1e6)
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    print(f"runs={RUNS} repeats={REPEATS} (µs de CPU por request, mediana)")
+    print(f"{'payload':<16}{'json_adapt':>12}{'raw_jsonb':>12}{'ahorro':>10}")
+    for name, payload in SAMPLE_PAYLOADS.items():
+        raw = json.dumps(payload).encode("utf-8")
+        base = measure(json_adapt, raw)
+        fast = measure(raw_jsonb, raw)
+        saved = (1 - fast / base) * 100 if base else 0.0
+        print(f"{name:<16}{base:>12.2f}{fast:>12.2f}{saved:>9.1f}%")
@@ -0,0 +1,84 @@
+"""Armado de la página de /api/webhooks: loop en Python vs JSON armado en SQL.
+
+Corre contra la base de DATABASE_URL la misma lectura de webhook_latest que
+get_webhooks() (primera página, limit=500 por defecto) de las dos formas:
+
+  python: columnas sueltas -> _webhook_event_from_row() por fila -> app.json.dumps
+  sql:    jsonb_build_object/to_char en Postgres (WEBHOOKS_SQL_JSON=1) -> join de textos
+
+y reporta, del lado de la app: CPU (process_time, incluye decodificar las filas
+en psycopg2), tiempo de pared (incluye el trabajo que se movió a Postgres) y
+pico de memoria Python (tracemalloc) por request. La CPU de Postgres no entra
+en `cpu`: compararla en `wall` o con pg_stat_statements.
+
+    BENCH_TOPIC=items BENCH_LIMIT=500 BENCH_RUNS=50 python scripts/bench_webhooks_json.py
+"""
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import (  # noqa: E402
+    _WEBHOOK_EVENT_JSON_COLUMNS,
+    _WEBHOOK_ROW_COLUMNS,
+    _webhook_event_from_row,
+    app,
+    db_cursor,
+)
+
+
+TOPIC = os.getenv("BENCH_TOPIC", "items")
+LIMIT = int(os.getenv("BENCH_LIMIT", "500"))
+RUNS = int(os.getenv("BENCH_RUNS", "50"))
+
+_PAGE_SQL = """
+    SELECT {columns}
+    FROM webhook_latest wl
+    LEFT JOIN ml_previews p ON p.resource = wl.resource
+    WHERE wl.topic = %s
+    ORDER BY wl.received_at DESC, wl.resource DESC
+    LIMIT %s
+"""
+
+
+def python_page(cur):
+    cur.execute(_PAGE_SQL.format(columns=_WEBHOOK_ROW_COLUMNS), (TOPIC, LIMIT))
+    rows = [_webhook_event_from_row(row) for row in cur.fetchall()]
+    return app.json.dumps({"topic": TOPIC, "events": rows}).encode("utf-8")
+
+
+def sql_page(cur):
+    cur.execute(_PAGE_SQL.format(columns=_WEBHOOK_EVENT_JSON_COLUMNS), (TOPIC, LIMIT))
+    events = ",".join(row[0] for row in cur.fetchall())
+    return "".join(('{"topic":', app.json.dumps(TOPIC), ',"events":[', events, "]}")).encode("utf-8")
+
+
+def measure(build):
+    cpu, wall, peak, size = [], [], [], 0
+    with db_cursor() as cur:
+        build(cur)  # calienta caché de Postgres y planes
+        for _ in range(RUNS):
+            tracemalloc.start()
+            start_cpu, start_wall = time.process_time(), time.perf_counter()
+            size = len(build(cur))
+            cpu.append((time.process_time() - start_cpu) * 1000)
+            wall.append((time.perf_counter() - start_wall) * 1000)
+            peak.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+    return statistics.median(cpu), statistics.median(wall), statistics.median(peak), size
+
+
+if __name__ == "__main__":
+    print(f"topic={TOPIC} limit={LIMIT} runs={RUNS} (mediana por request)")
+    print(f"{'camino':<8}{'cpu ms':>10}{'wall ms':>10}{'pico KiB':>11}{'body KiB':>11}")
+    results = {}
+    for name, build in (("python", python_page), ("sql", sql_page)):
+        results[name] = measure(build)
+        cpu, wall, peak, size = results[name]
+        print(f"{name:<8}{cpu:>10.2f}{wall:>10.2f}{peak:>11.0f}{size / 1024:>11.0f}")
+    base, fast = results["python"], results["sql"]
+    if base[0] and base[2]:
+        print(f"ahorro: cpu {(1 - fast[0] / base[0]) * 100:.1f}% · memoria {(1 - fast[2] / base[2]) * 100:.1f}%")
@@ -0,0 +1,171 @@
+"""Planes de consulta: webhooks sin particionar vs particionado mensual por received_at.
+
+Arma en un schema descartable (`bench_partitioning`) dos tablas con las mismas
+columnas e índices que `webhooks`, las llena con BENCH_ROWS filas (default 50M)
+repartidas en BENCH_MONTHS meses, y corre EXPLAIN (ANALYZE, BUFFERS) de las
+consultas calientes con y sin ventana de received_at. Muestra tiempo de
+ejecución, buffers tocados y cuántas particiones quedaron en el plan.
+
+Correr SOLO contra una base de pruebas (tarda y ocupa varios GB con 50M filas):
+
+    BENCH_DATABASE_URL=postgresql://.../bench python scripts/bench_webhooks_partitioning.py
+
+BENCH_KEEP=1 conserva el schema para inspeccionar planes a mano.
+"""
+import json
+import os
+import time
+
+import psycopg2
+
+
+DSN = os.getenv("BENCH_DATABASE_URL")
+ROWS = int(os.getenv("BENCH_ROWS", "50000000"))
+MONTHS = int(os.getenv("BENCH_MONTHS", "24"))
+CHUNK = int(os.getenv("BENCH_CHUNK", "2000000"))
+LOOKBACK_DAYS = int(os.getenv("BENCH_LOOKBACK_DAYS", "30"))
+KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+SCHEMA = "bench_partitioning"
+
+TOPICS = ["items", "price_suggestion", "orders_v2", "shipments", "claims", "public_offers"]
+
+QUERIES = {
+    "latest_per_resource (fallback /api/webhooks)": """
+        WITH latest AS (
+            SELECT resource, MAX(received_at) AS max_received
+            FROM {table}
+            WHERE topic = 'items' {window}
+            GROUP BY resource
+        )
+        SELECT w.resource, w.received_at
+        FROM latest
+        JOIN {table} w ON w.resource = latest.resource AND w.received_at = latest.max_received {join_window}
+        ORDER BY w.received_at DESC, w.resource DESC
+        LIMIT 100
+    """,
+    "recent_by_topic": """
+        SELECT resource, received_at
+        FROM {table}
+        WHERE topic = 'orders_v2' {window}
+        ORDER BY received_at DESC
+        LIMIT 100
+    """,
+    "topic_counts (get_topics)": """
+        SELECT topic, COUNT(*) FROM {table} WHERE TRUE {window} GROUP BY topic
+    """,
+}
+
+
+def setup(cur):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    columns = """
+        id BIGSERIAL,
+        topic TEXT,
+        user_id BIGINT,
+        resource TEXT,
+        payload JSONB,
+        webhook_id TEXT,
+        received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    """
+    cur.execute(f"CREATE TABLE {SCHEMA}.plain ({columns})")
+    cur.execute(f"CREATE TABLE {SCHEMA}.part ({columns}) PARTITION BY RANGE (received_at)")
+    cur.execute(f"""
+        DO $$
+        DECLARE lo TIMESTAMPTZ;
+        BEGIN
+            FOR m IN 0..{MONTHS} LOOP
+                lo := date_trunc('month', NOW()) - make_interval(months => {MONTHS} - m);
+                EXECUTE format('CREATE TABLE {SCHEMA}.%I PARTITION OF {SCHEMA}.part FOR VALUES FROM (%L) TO (%L)',
+                               'part_' || to_char(lo, 'YYYY_MM'), lo, lo + INTERVAL '1 month');
+            END LOOP;
+        END $$
+    """)
+
+
+def fill(cur, table):
+    topics = "ARRAY[" + ",".join(f"'{t}'" for t in TOPICS) + "]"
+    span_seconds = MONTHS * 30 * 86400
+    for offset in range(0, ROWS, CHUNK):
+        n = min(CHUNK, ROWS - offset)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.{table} (topic, user_id, resource, payload, webhook_id, received_at)
+            SELECT t, 1,
+                   '/items/MLA' || (g % 2000000),
+                   jsonb_build_object('topic', t, 'attempts', 1),
+                   'bench-' || g,
+                   NOW() - make_interval(secs => (g::bigint * 7919) % {span_seconds})
+              FROM generate_series({offset}, {offset + n - 1}) g,
+                   LATERAL (SELECT ({topics})[1 + g % {len(TOPICS)}] AS t) x
+        """)
+        cur.connection.commit()
+        print(f"  {table}: {offset + n:,}/{ROWS:,}")
+
+
+def index(cur, table):
+    cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} (topic, received_at DESC)")
+    cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} (topic, resource, received_at DESC)")
+    cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} (resource, received_at DESC)")
+    cur.execute(f"ANALYZE {SCHEMA}.{table}")
+    cur.connection.commit()
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(cur, sql):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+    plan = cur.fetchone()[0][0]
+    nodes = list(_walk(plan["Plan"]))
+    relations = {n["Relation Name"] for n in nodes if "Relation Name" in n}
+    top = plan["Plan"]
+    return {
+        "ms": plan["Execution Time"],
+        "buffers": top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0),
+        "relations": len(relations),
+    }
+
+
+def main():
+    if not DSN:
+        raise SystemExit("Definí BENCH_DATABASE_URL (base de pruebas, NO producción)")
+    conn = psycopg2.connect(DSN)
+    cur = conn.cursor()
+    try:
+        start = time.perf_counter()
+        setup(cur)
+        conn.commit()
+        for table in ("plain", "part"):
+            fill(cur, table)
+            index(cur, table)
+        print(f"setup {ROWS:,} filas x2 en {time.perf_counter() - start:.0f}s\n")
+
+        window = f"AND received_at >= NOW() - make_interval(days => {LOOKBACK_DAYS})"
+        join_window = f"AND w.received_at >= NOW() - make_interval(days => {LOOKBACK_DAYS})"
+        print(f"{'consulta':<48}{'tabla':<7}{'ventana':<9}{'ms':>10}{'buffers':>12}{'rels':>6}")
+        results = []
+        for name, template in QUERIES.items():
+            for table in ("plain", "part"):
+                for label, w, jw in (("no", "", ""), (f"{LOOKBACK_DAYS}d", window, join_window)):
+                    sql = template.format(table=f"{SCHEMA}.{table}", window=w, join_window=jw)
+                    stats = explain(cur, sql)
+                    conn.rollback()
+                    results.append({"query": name, "table": table, "window": label, **stats})
+                    print(f"{name:<48}{table:<7}{label:<9}{stats['ms']:>10.1f}"
+                          f"{stats['buffers']:>12,}{stats['relations']:>6}")
+        if os.getenv("BENCH_JSON"):
+            with open(os.getenv("BENCH_JSON"), "w") as fh:
+                json.dump(results, fh, indent=2)
+    finally:
+        if not KEEP:
+            conn.rollback()
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,8 +22,21 @@ def measure_get_webhooks():
     return durations
 
 
+def parse_server_timing(header):
+    """`parse;dur=0.12, insert;dur=1.80` -> {"parse": 0.12, "insert": 1.8}."""
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                stages[name] = float(value)
+    return stages
+
+
 def measure_post_webhook():
     durations = []
+    stage_durations = {}
     for i in range(WRITE_RUNS):
         payload = json.dumps({
             "_id": f"perf-{i:04d}",
@@ -40,8 +53,12 @@ def measure_post_webhook():
         start = time.perf_counter()
         with request.urlopen(req) as response:
             response.read()
+            server_timing = response.headers.get("Server-Timing")
         durations.append((time.perf_counter() - start) * 1000)
-    return durations
+        # con WEBHOOK_SERVER_TIMING=1 el server desglosa cada request por etapa
+        for stage, ms in parse_server_timing(server_timing).items():
+            stage_durations.setdefault(stage, []).append(ms)
+    return durations, stage_durations
 
 
 def summarize(label, values):
@@ -55,4 +72,7 @@ def summarize(label, values):
 
 if __name__ == "__main__":
     summarize("GET /api/webhooks", measure_get_webhooks())
-    summarize("POST /webhook", measure_post_webhook())
+    post_durations, post_stages = measure_post_webhook()
+    summarize("POST /webhook", post_durations)
+    for stage, values in post_stages.items():
+        summarize(f"POST /webhook · {stage}", values)
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("asyncpg")
+pytest.importorskip("httpx")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import asgi_ingest  # noqa: E402
+
+
+class _Transaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self, db):
+        self.db = db
+
+    def transaction(self):
+        return _Transaction()
+
+    async def execute(self, sql, *args):
+        q = " ".join(sql.split())
+        self.db["statements"].append((q, args))
+        if q.startswith("INSERT INTO webhooks"):
+            webhook_id = args[4]
+            if webhook_id in self.db["ids"]:
+                return "INSERT 0 0"
+            self.db["ids"].add(webhook_id)
+            return "INSERT 0 1"
+        return "INSERT 0 1"
+
+
+class _Acquire:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return _Conn(self.db)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Pool:
+    def __init__(self):
+        self.db = {"ids": set(), "statements": []}
+
+    def acquire(self):
+        return _Acquire(self.db)
+
+
+@pytest.fixture
+def asgi_client(monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(asgi_ingest, "_dispatch_preview", lambda resource, results: dispatched.append(resource))
+    monkeypatch.setattr(asgi_ingest, "_dedup_seen", lambda webhook_id: False)
+    monkeypatch.setattr(asgi_ingest, "DEBUG_WEBHOOK", True)
+    pool = _Pool()
+    asgi_ingest.app.state.pool = pool
+    # sin `with`: no corre el lifespan (no abre el pool real)
+    return TestClient(asgi_ingest.app), pool, dispatched
+
+
+def test_asgi_webhook_stores_event_and_snapshot_with_shared_statements(asgi_client):
+    client, pool, dispatched = asgi_client
+    payload = {"_id": "asgi-1", "topic": "items", "user_id": 7, "resource": "/items/MLA1"}
+
+    res = client.post("/webhook", content=json.dumps(payload))
+    dup = client.post("/webhook", content=json.dumps(payload))
+
+    assert res.status_code == 200
+    assert res.json()["insert_original"] == {"rowcount": 1, "webhook_id": "asgi-1"}
+    assert dup.json()["insert_original"]["rowcount"] == 0
+    statements = [q for q, _ in pool.db["statements"]]
+    assert statements[0].startswith("INSERT INTO webhooks")
+    assert "VALUES ($1, $2, $3, $4::jsonb, $5)" in statements[0]
+    assert statements[1].startswith("INSERT INTO webhook_latest")
+    assert len(statements) == 3  # el duplicado no toca webhook_latest
+    assert json.loads(pool.db["statements"][0][1][3]) == payload
+    assert dispatched == ["/items/MLA1", "/items/MLA1"]
+
+
+def test_asgi_webhook_rejects_invalid_json(asgi_client):
+    client, _, _ = asgi_client
+
+    res = client.post("/webhook", content=b"{no es json")
+
+    assert res.status_code == 400
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+    import compact_webhook_payloads
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar compact_webhook_payloads.py: {exc}")
+
+
+def test_full_payload_restores_only_missing_keys():
+    compact = {"application_id": 1, "attempts": 1, "sent": "2026-10-16T12:00:00Z"}
+
+    full = app_module._webhook_payload_full(compact, "items", 123, "/items/MLA1", "wh-1")
+
+    assert full == {
+        "application_id": 1,
+        "attempts": 1,
+        "sent": "2026-10-16T12:00:00Z",
+        "_id": "wh-1",
+        "topic": "items",
+        "user_id": 123,
+        "resource": "/items/MLA1",
+    }
+    # payload sin compactar (o con valores distintos a la columna): no se pisa
+    legacy = {"_id": "wh-1", "topic": "items", "user_id": "123", "resource": "/items/MLA1"}
+    assert app_module._webhook_payload_full(dict(legacy), "items", 123, "/items/MLA1", "wh-1") == legacy
+    # columnas vacías no inventan claves
+    assert app_module._webhook_payload_full({"a": 1}, None, None, "", None) == {"a": 1}
+
+
+class _Cursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.db["queries"].append((q, params))
+        if "FROM pg_partition_tree" in q and "isleaf ORDER BY 1" in q:
+            self._result = self.db["leaves"][params[0]]
+        elif "SUM(pg_total_relation_size" in q:
+            self._result = [(1024 ** 2, 512 * 1024)]
+        elif "TABLESAMPLE" in q:
+            self._result = [(self.db["avg"], 100)]
+        elif q.startswith("UPDATE"):
+            self.rowcount = 10
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+def test_run_walks_each_leaf_by_block_ranges(monkeypatch, capsys):
+    db = {
+        "queries": [],
+        "avg": 180.0,
+        "leaves": {
+            "webhooks": [("webhooks_legacy", 2500), ("webhooks_p2026_11", 0)],
+            "webhook_latest": [("webhook_latest", 900)],
+        },
+    }
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(db)
+
+    monkeypatch.setattr(compact_webhook_payloads, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(compact_webhook_payloads, "PAUSE_SECONDS", 0)
+
+    total = compact_webhook_payloads.run(blocks=1000)
+
+    updates = [(q, p) for q, p in db["queries"] if q.startswith("UPDATE")]
+    assert [(q.split()[1], p[0], p[1]) for q, p in updates] == [
+        ("webhooks_legacy", "(0,0)", "(1000,0)"),
+        ("webhooks_legacy", "(1000,0)", "(2000,0)"),
+        ("webhooks_legacy", "(2000,0)", "(2500,0)"),
+        ("webhook_latest", "(0,0)", "(900,0)"),
+    ]
+    assert updates[0][1][2] == ["_id", "topic", "resource", "user_id"]
+    assert updates[-1][1][2] == ["_id", "topic", "resource"]
+    assert total == 40
+    out = capsys.readouterr().out
+    assert "antes" in out and "después" in out
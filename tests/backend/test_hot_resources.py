@@ -0,0 +1,106 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+@pytest.fixture
+def hot(monkeypatch):
+    monkeypatch.setattr(app_module, "_hot_state", {"topics": {}})
+    monkeypatch.setattr(app_module, "HOT_RESOURCES_ENABLED", True)
+    monkeypatch.setattr(app_module, "HOT_RESOURCES_WINDOW_SECONDS", 300)
+    monkeypatch.setattr(app_module, "HOT_RESOURCES_SLOTS", 5)
+    monkeypatch.setattr(app_module, "HOT_RESOURCES_TOP_K", 3)
+
+
+def test_top_k_ranks_heavy_hitters_per_topic(hot):
+    now = 1_000_000.0
+    for _ in range(40):
+        app_module._hot_track("price_to_win", "/items/MLA1/price_to_win", now)
+    for _ in range(25):
+        app_module._hot_track("price_to_win", "/items/MLA2/price_to_win", now)
+    # cola larga: muchos resources con una sola notificación no desplazan a los pesados
+    for i in range(200):
+        app_module._hot_track("price_to_win", f"/items/MLA{1000 + i}/price_to_win", now)
+    for _ in range(5):
+        app_module._hot_track("orders_v2", "/orders/1", now)
+
+    stats = app_module._hot_resources(limit=2, now=now)
+
+    ptw = stats["topics"]["price_to_win"]
+    assert ptw["total"] == 265
+    assert [r["resource"] for r in ptw["top"]] == ["/items/MLA1/price_to_win", "/items/MLA2/price_to_win"]
+    assert ptw["top"][0]["count"] >= 40  # count-min: cota superior
+    assert stats["topics"]["orders_v2"]["top"][0] == {
+        "resource": "/orders/1",
+        "count": 5,
+        "per_minute": stats["topics"]["orders_v2"]["top"][0]["per_minute"],
+        "share": 1.0,
+    }
+    assert list(stats["topics"]) == ["price_to_win", "orders_v2"]
+
+
+def test_window_slides_and_expires_old_slots(hot):
+    start = 1_000_000.0 - (1_000_000.0 % 60)
+    for _ in range(10):
+        app_module._hot_track("items", "/items/MLA1", start)
+    for _ in range(3):
+        app_module._hot_track("items", "/items/MLA2", start + 120)
+
+    in_window = app_module._hot_resources("items", now=start + 130)["topics"]["items"]
+    assert in_window["total"] == 13
+    assert in_window["top"][0]["resource"] == "/items/MLA1"
+
+    # 5 slots de 60s: a los 300s el primer slot ya salió de la ventana
+    later = app_module._hot_resources("items", now=start + 301)["topics"]["items"]
+    assert later["total"] == 3
+    assert [r["resource"] for r in later["top"]] == ["/items/MLA2"]
+
+    assert app_module._hot_resources("items", now=start + 1000)["topics"] == {}
+
+
+def test_webhook_feeds_tracker_and_debug_endpoint(hot, monkeypatch):
+    @contextmanager
+    def fake_db_cursor():
+        class _Cursor:
+            rowcount = 1
+
+            def execute(self, query, params=None):
+                return None
+
+        yield _Cursor()
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_OUTBOX", False)
+    monkeypatch.setattr(app_module, "_admit_preview", lambda resource: True)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: (True, None))
+
+    with app_module.app.test_client() as client:
+        for i in range(3):
+            payload = {"_id": f"hot-{i}", "topic": "public_offers", "resource": "/items/MLA9"}
+            client.post("/webhook", data=json.dumps(payload), content_type="application/json")
+        res = client.get("/debug/hot-resources?topic=public_offers&limit=5")
+
+    body = res.get_json()
+    assert res.status_code == 200
+    assert body["topics"]["public_offers"]["top"][0]["resource"] == "/items/MLA9"
+    assert body["topics"]["public_offers"]["top"][0]["count"] == 3
+
+
+def test_tracking_failure_never_rejects_webhook(hot, monkeypatch):
+    monkeypatch.setattr(app_module, "_hot_cells", lambda resource: 1 / 0)
+    monkeypatch.setattr(app_module, "WEBHOOK_INGEST_STREAM", True)
+    monkeypatch.setattr(app_module, "_append_ingest_stream", lambda body: ("1-0", None))
+
+    with app_module.app.test_client() as c:
+        res = c.post("/webhook", data=json.dumps({"_id": "hot-err", "topic": "items", "resource": "/items/MLA1"}),
+                     content_type="application/json")
+
+    assert res.status_code == 200
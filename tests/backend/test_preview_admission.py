@@ -0,0 +1,66 @@
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    depth = {"value": 0}
+    state = {"depth": None, "level": "ok", "refreshed_at": 0.0, "refresh_errors": 0, "shed": {}}
+    enqueued = []
+
+    monkeypatch.setattr(app_module, "_admission_state", state)
+    monkeypatch.setattr(app_module, "_redis_client", object())
+    monkeypatch.setattr(app_module, "_preview_backlog_depth", lambda: depth["value"])
+    monkeypatch.setattr(app_module, "PREVIEW_SHED_SOFT_DEPTH", 100)
+    monkeypatch.setattr(app_module, "PREVIEW_SHED_HARD_DEPTH", 1000)
+    monkeypatch.setattr(app_module, "PREVIEW_ADMISSION_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_OUTBOX", False)
+    monkeypatch.setattr(
+        app_module, "_enqueue_preview_job", lambda resource: enqueued.append(resource) or (True, None)
+    )
+    return depth, enqueued
+
+
+def _dispatch(resource):
+    results = {"preview_refreshed": False, "errors": []}
+    app_module._dispatch_preview(resource, results)
+    return results
+
+
+def test_soft_and_hard_levels_shed_by_lane_and_recover(admission):
+    depth, enqueued = admission
+
+    depth["value"] = 150
+    assert _dispatch("/items/MLA1/price_to_win")["preview_shed"] == "soft"
+    assert _dispatch("/items/MLA1")["preview_refreshed"] is True
+
+    depth["value"] = 5000
+    assert _dispatch("/items/MLA2")["preview_shed"] == "hard"
+    assert _dispatch("/orders/1")["preview_refreshed"] is True
+
+    depth["value"] = 10
+    assert _dispatch("/items/MLA1/price_to_win")["preview_refreshed"] is True
+
+    assert enqueued == ["/items/MLA1", "/orders/1", "/items/MLA1/price_to_win"]
+    stats = app_module._admission_stats()
+    assert stats["level"] == "ok"
+    assert stats["shed"] == {"price_to_win": 1, "items": 1}
+    assert stats["shed_total"] == 2
+
+
+def test_depth_is_cached_between_refreshes(admission, monkeypatch):
+    depth, _ = admission
+    reads = []
+    monkeypatch.setattr(app_module, "_preview_backlog_depth", lambda: reads.append(1) or depth["value"])
+    monkeypatch.setattr(app_module, "PREVIEW_ADMISSION_REFRESH_SECONDS", 60)
+
+    for _ in range(20):
+        _dispatch("/items/MLA1")
+
+    assert len(reads) == 1
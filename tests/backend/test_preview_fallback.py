@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+@pytest.fixture
+def fallback(monkeypatch):
+    state = {
+        "active_workers": 0, "accepted": 0, "coalesced": 0,
+        "dropped": 0, "processed": 0, "errors": 0,
+    }
+    monkeypatch.setattr(app_module, "_preview_fallback_state", state)
+    monkeypatch.setattr(app_module, "_preview_fallback_pending", OrderedDict())
+    monkeypatch.setattr(app_module, "PREVIEW_FALLBACK_WORKERS", 1)
+    monkeypatch.setattr(app_module, "PREVIEW_FALLBACK_MAX_PENDING", 2)
+
+    release = threading.Event()
+    started = threading.Event()
+    processed = []
+
+    def fake_preview(resource):
+        started.set()
+        release.wait(timeout=5)
+        processed.append(resource)
+
+    monkeypatch.setattr(app_module, "fetch_and_store_preview", fake_preview)
+    yield {"release": release, "started": started, "processed": processed}
+    release.set()
+
+
+def test_backlog_is_bounded_coalesced_and_drops_oldest(fallback):
+    app_module._run_preview_in_background("/items/MLA0")
+    assert fallback["started"].wait(timeout=5)  # MLA0 en vuelo, único worker ocupado
+
+    app_module._run_preview_in_background("/items/MLA1")
+    app_module._run_preview_in_background("/items/MLA1")  # coalesce
+    app_module._run_preview_in_background("/items/MLA2")
+    app_module._run_preview_in_background("/items/MLA3")  # backlog lleno: descarta MLA1
+
+    stats = app_module._preview_fallback_stats()
+    assert stats["pending"] == 2
+    assert stats["active_workers"] == 1
+    assert stats["coalesced"] == 1
+    assert stats["dropped"] == 1
+
+    fallback["release"].set()
+    for _ in range(100):
+        if app_module._preview_fallback_stats()["active_workers"] == 0:
+            break
+        threading.Event().wait(0.02)
+
+    assert fallback["processed"] == ["/items/MLA0", "/items/MLA2", "/items/MLA3"]
+    assert app_module._preview_fallback_stats()["processed"] == 3
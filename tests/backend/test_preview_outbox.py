@@ -0,0 +1,91 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+    import worker_outbox
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+class _Cursor:
+    def __init__(self, log):
+        self.log = log
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.log.append((q, params))
+        if "INSERT INTO webhooks" in q:
+            self.rowcount = 1
+
+
+def test_outbox_row_is_written_in_the_webhook_transaction(monkeypatch):
+    transactions = []
+
+    @contextmanager
+    def fake_db_cursor():
+        log = []
+        transactions.append(log)
+        yield _Cursor(log)
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_OUTBOX", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(
+        app_module,
+        "_enqueue_preview_job",
+        lambda resource: (_ for _ in ()).throw(AssertionError("Con outbox no se encola en Redis")),
+    )
+
+    payload = {"_id": "outbox-1", "topic": "items", "user_id": 1, "resource": "/items/MLA1"}
+    with app_module.app.test_client() as c:
+        res = c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+
+    assert res.status_code == 200
+    assert len(transactions) == 1
+    outbox = [params for q, params in transactions[0] if "INSERT INTO preview_outbox" in q]
+    assert outbox == [("/items/MLA1", "outbox-1")]
+
+
+def test_process_batch_coalesces_resources_and_reschedules_failures(monkeypatch):
+    statements = []
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(statements)
+
+    processed = []
+
+    def fake_preview(resource, raise_errors=False):
+        assert raise_errors
+        processed.append(resource)
+        if resource == "/items/MLA2":
+            raise RuntimeError("ML 500")
+
+    monkeypatch.setattr(worker_outbox, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(worker_outbox, "fetch_and_store_preview", fake_preview)
+
+    rows = [(1, "/items/MLA1", 1), (2, "/items/MLA1", 1), (3, "/items/MLA2", 1)]
+    ok, failed = worker_outbox.process_batch(rows)
+
+    assert (ok, failed) == (1, 1)
+    assert processed == ["/items/MLA1", "/items/MLA2"]
+    reschedule = [p for q, p in statements if "SET available_at" in q]
+    assert reschedule and reschedule[0][2] == [3]
+    delete = [p for q, p in statements if q.startswith("DELETE FROM preview_outbox")]
+    assert delete == [([1, 2],)]
+
+
+def test_preview_errors_propagate_to_outbox_worker(monkeypatch):
+    def broken_token():
+        raise RuntimeError("token vencido")
+
+    monkeypatch.setattr(app_module, "get_token", broken_token)
+
+    assert app_module.fetch_and_store_preview("/items/MLA1")["title"] == "Error"
+    with pytest.raises(RuntimeError, match="token vencido"):
+        app_module.fetch_and_store_preview("/items/MLA1", raise_errors=True)
@@ -28,7 +28,7 @@ def test_retry_or_dead_requeues_preview_job_before_max_attempts(fake_redis):
 
     assert len(fake_redis.calls) == 1
     queue_key, payload = fake_redis.calls[0]
-    assert queue_key == worker_preview.PREVIEW_QUEUE_KEY
+    assert queue_key == f"{worker_preview.PREVIEW_QUEUE_KEY}:items"
     assert payload["resource"] == "/items/MLA123"
     assert payload["attempt"] == 2
     assert payload["last_error"] == "temporary failure"
@@ -44,3 +44,165 @@ def test_retry_or_dead_sends_message_to_dead_letter_after_max_attempts(fake_redi
     assert queue_key == worker_preview.PREVIEW_DEAD_QUEUE_KEY
     assert payload["resource"] == "/items/MLA123"
     assert payload["error"] == "permanent failure"
+
+
+class FakeAttemptsRedis(FakeRedis):
+    def __init__(self):
+        super().__init__()
+        self.attempts = {}
+
+    def hincrby(self, key, field, amount):
+        self.attempts[field] = self.attempts.get(field, 0) + amount
+        return self.attempts[field]
+
+    def hdel(self, key, field):
+        self.attempts.pop(field, None)
+
+
+def test_coalesced_retry_reschedules_then_dead_letters(monkeypatch):
+    redis_client = FakeAttemptsRedis()
+    scheduled = []
+    monkeypatch.setattr(worker_preview, "_redis_client", redis_client)
+    monkeypatch.setattr(worker_preview, "_schedule_preview", lambda resource, delay=None: scheduled.append((resource, delay)))
+
+    for _ in range(worker_preview.MAX_ATTEMPTS):
+        worker_preview._retry_or_dead_coalesced("/items/MLA123", "ML 500")
+
+    assert scheduled == [("/items/MLA123", 4), ("/items/MLA123", 6)]
+    assert len(redis_client.calls) == 1
+    queue_key, payload = redis_client.calls[0]
+    assert queue_key == worker_preview.PREVIEW_DEAD_QUEUE_KEY
+    assert payload["attempt"] == worker_preview.MAX_ATTEMPTS
+    assert "/items/MLA123" not in redis_client.attempts
+
+
+class FakeListRedis:
+    def __init__(self, lists):
+        self.lists = lists
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.ops = []
+
+    def lrange(self, key, start, end):
+        self.ops.append(lambda: list(self.redis.lists.get(key, [])[start:end + 1]))
+
+    def ltrim(self, key, start, end):
+        def trim():
+            self.redis.lists[key] = self.redis.lists.get(key, [])[start:]
+            return True
+        self.ops.append(trim)
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+def test_pop_weighted_takes_up_to_weight_per_lane_in_priority_order(monkeypatch):
+    base = worker_preview.PREVIEW_QUEUE_KEY
+    lists = {
+        f"{base}:price_to_win": [f"ptw{i}" for i in range(50)],
+        f"{base}:claims": ["claim1", "claim2"],
+        f"{base}:orders": [f"order{i}" for i in range(5)],
+    }
+    monkeypatch.setattr(worker_preview, "_redis_client", FakeListRedis(lists))
+    monkeypatch.setattr(
+        worker_preview,
+        "PREVIEW_LANE_WEIGHTS",
+        {"claims": 8, "orders": 3, "shipments": 4, "items": 2, "price_to_win": 1, "other": 1},
+    )
+
+    batch = worker_preview._pop_weighted(rounds=1)
+
+    assert batch == ["claim1", "claim2", "order0", "order1", "order2", "ptw0"]
+    assert len(lists[f"{base}:price_to_win"]) == 49
+    assert lists[f"{base}:orders"] == ["order3", "order4"]
+
+
+def test_preview_lane_classifies_resources():
+    lane = worker_preview._preview_lane
+    assert lane("/post-purchase/v1/claims/5123") == "claims"
+    assert lane("/orders/2000003508897476") == "orders"
+    assert lane("/shipments/4400") == "shipments"
+    assert lane("/items/MLA1/price_to_win") == "price_to_win"
+    assert lane("/items/MLA1") == "items"
+    assert lane("/seller-promotions/offers/X") == "other"
+
+
+def test_blocking_queue_keys_skip_paused_lanes(monkeypatch):
+    base = worker_preview.PREVIEW_QUEUE_KEY
+    monkeypatch.setattr(
+        worker_preview,
+        "PREVIEW_LANE_WEIGHTS",
+        {"claims": 8, "orders": 0, "shipments": 4, "items": 2, "price_to_win": 0, "other": 0},
+    )
+
+    keys = worker_preview._blocking_queue_keys()
+
+    assert f"{base}:orders" not in keys
+    assert f"{base}:price_to_win" not in keys
+    assert base not in keys
+    assert keys[0] == f"{base}:claims"
+
+
+def test_blocking_queue_keys_include_legacy_list_when_other_is_active(monkeypatch):
+    monkeypatch.setattr(worker_preview, "PREVIEW_LANE_WEIGHTS", {"other": 1})
+
+    assert worker_preview._blocking_queue_keys()[-1] == worker_preview.PREVIEW_QUEUE_KEY
+
+
+class _StopWorker(Exception):
+    pass
+
+
+def test_coalesced_worker_retries_when_preview_fetch_fails(monkeypatch):
+    import app as app_module
+
+    calls, retries, cleared = [], [], []
+    claims = iter([["/items/MLA123"]])
+
+    def fake_fetch(resource, raise_errors=False):
+        calls.append(raise_errors)
+        if raise_errors:
+            raise RuntimeError("ML 500")
+
+    def fake_claim(rounds):
+        try:
+            return next(claims)
+        except StopIteration:
+            raise _StopWorker
+
+    monkeypatch.setattr(app_module, "_redis_client", None)
+    monkeypatch.setattr(worker_preview, "fetch_and_store_preview", fake_fetch)
+    monkeypatch.setattr(worker_preview, "_claim_due_previews", fake_claim)
+    monkeypatch.setattr(worker_preview, "_redis_deferred", lambda build, on_error=None: cleared.append(build))
+    monkeypatch.setattr(worker_preview, "_retry_or_dead_coalesced", lambda resource, error: retries.append((resource, error)))
+
+    with pytest.raises(_StopWorker):
+        worker_preview.run_coalesced_worker()
+
+    assert calls == [True]
+    assert retries == [("/items/MLA123", "ML 500")]
+    assert cleared == []
+
+
+def test_process_message_retries_when_preview_fetch_fails(monkeypatch):
+    import app as app_module
+
+    retries = []
+
+    def fake_fetch(resource, raise_errors=False):
+        if raise_errors:
+            raise RuntimeError("ML 500")
+
+    monkeypatch.setattr(app_module, "_redis_client", None)
+    monkeypatch.setattr(worker_preview, "fetch_and_store_preview", fake_fetch)
+    monkeypatch.setattr(worker_preview, "_retry_or_dead", lambda message, error: retries.append((message, error)))
+
+    worker_preview._process_message(json.dumps({"resource": "/items/MLA123", "attempt": 1}))
+
+    assert retries == [({"resource": "/items/MLA123", "attempt": 1}, "ML 500")]
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    import rebuild_webhook_latest
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    rebuild_webhook_latest = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar rebuild_webhook_latest.py: {exc}")
+
+
+T0 = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+class _Cursor:
+    """Simula el DISTINCT ON + upsert sobre dicts: webhooks [(topic, resource, received_at)]
+    y latest {(topic, resource): received_at}."""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def _chunk(self, topic, after, limit):
+        newest = {}
+        for t, resource, received_at in self.db["webhooks"]:
+            if t == topic and resource > after and resource:
+                newest[resource] = max(received_at, newest.get(resource, received_at))
+        return sorted(newest.items())[:limit]
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        assert "DISTINCT ON (resource)" in q and "ORDER BY resource, received_at DESC" in q
+        topic, after, limit = params
+        chunk = self._chunk(topic, after, limit)
+        self.db["calls"].append((topic, after))
+        if "INSERT INTO webhook_latest" in q:
+            written = 0
+            for resource, received_at in chunk:
+                current = self.db["latest"].get((topic, resource))
+                if current is None or current < received_at:
+                    self.db["latest"][(topic, resource)] = received_at
+                    written += 1
+            self._result = [(chunk[-1][0] if chunk else None, len(chunk), written)]
+        else:
+            self._result = [(r, at, self.db["latest"].get((topic, r))) for r, at in chunk]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    state = {
+        "webhooks": [
+            ("items", "/items/MLA1", T0),
+            ("items", "/items/MLA1", T0 + timedelta(minutes=5)),
+            ("items", "/items/MLA2", T0),
+            ("items", "/items/MLA3", T0),
+            ("items", "", T0),
+        ],
+        "latest": {("items", "/items/MLA1"): T0, ("items", "/items/MLA3"): T0 + timedelta(hours=1)},
+        "calls": [],
+    }
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(state)
+
+    monkeypatch.setattr(rebuild_webhook_latest, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(rebuild_webhook_latest, "PAUSE_SECONDS", 0)
+    return state
+
+
+def test_check_reports_missing_and_stale_snapshots(db):
+    report = rebuild_webhook_latest.check(["items"], chunk=2)
+
+    assert report["items"]["resources"] == 3
+    assert report["items"]["missing"] == 1
+    assert report["items"]["stale"] == 1
+    assert {e["resource"] for e in report["items"]["examples"]} == {"/items/MLA1", "/items/MLA2"}
+
+
+def test_rebuild_upserts_newer_snapshots_in_keyset_chunks_and_resumes(db, tmp_path):
+    checkpoint = str(tmp_path / "rebuild.json")
+
+    state = rebuild_webhook_latest.rebuild(["items"], chunk=2, checkpoint=checkpoint)
+
+    assert [after for _, after in db["calls"]] == ["", "/items/MLA2", "/items/MLA3"]
+    assert state["topics"]["items"] == {"after": "/items/MLA3", "done": True, "read": 3, "written": 2}
+    assert db["latest"][("items", "/items/MLA1")] == T0 + timedelta(minutes=5)
+    # el snapshot más nuevo que el último evento no se pisa
+    assert db["latest"][("items", "/items/MLA3")] == T0 + timedelta(hours=1)
+    assert rebuild_webhook_latest.check(["items"])["items"]["missing"] == 0
+
+    db["calls"].clear()
+    rebuild_webhook_latest.rebuild(["items"], chunk=2, checkpoint=checkpoint)
+    assert db["calls"] == []  # topic ya marcado done en el checkpoint
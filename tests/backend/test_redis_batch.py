@@ -0,0 +1,76 @@
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.commands = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def rpush(self, key, payload):
+        self.commands.append(("rpush", key))
+
+    def sadd(self, key, member):
+        self.commands.append(("sadd", key))
+
+    def publish(self, channel, payload):
+        self.commands.append(("publish", channel))
+
+    def execute(self, raise_on_error=True):
+        self.redis.executed.append(list(self.commands))
+        return [self.redis.replies.get(cmd[0], 1) for cmd in self.commands]
+
+
+class FakeRedis:
+    def __init__(self, replies=None):
+        self.executed = []
+        self.replies = replies or {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def rpush(self, key, payload):  # pragma: no cover - en batch no se usa directo
+        raise AssertionError("rpush debería ir por el pipeline")
+
+
+@pytest.fixture
+def fallbacks(monkeypatch):
+    ran = []
+    monkeypatch.setattr(app_module, "_run_preview_in_background", ran.append)
+    monkeypatch.setattr(app_module, "PREVIEW_COALESCE", False)
+    monkeypatch.setattr(app_module, "PROMOS_WEBHOOK_ENABLED", True)
+    return ran
+
+
+def test_commands_of_one_request_go_out_in_a_single_pipeline(monkeypatch, fallbacks):
+    redis_client = FakeRedis()
+    monkeypatch.setattr(app_module, "_redis_client", redis_client)
+
+    with app_module.redis_batch():
+        assert app_module._enqueue_preview_job("/items/MLA1") == (True, None)
+        app_module._process_promotion_webhook("/seller-promotions/offers/OFFER-MLA1632687413-111")
+        app_module.sse_notify("claims:updated", {"id": 1})
+        assert redis_client.executed == []
+
+    assert len(redis_client.executed) == 1
+    assert [cmd for cmd, _ in redis_client.executed[0]] == ["rpush", "sadd", "publish"]
+    assert fallbacks == []
+
+
+def test_failed_enqueue_in_batch_falls_back_to_bounded_pool(monkeypatch, fallbacks):
+    redis_client = FakeRedis(replies={"rpush": ConnectionError("OOM command not allowed")})
+    monkeypatch.setattr(app_module, "_redis_client", redis_client)
+
+    with app_module.redis_batch():
+        app_module._enqueue_preview_job("/orders/1")
+        app_module.sse_notify("claims:updated")
+
+    assert fallbacks == ["/orders/1"]
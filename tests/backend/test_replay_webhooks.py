@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+try:
+    import replay_webhooks
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    replay_webhooks = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar replay_webhooks.py: {exc}")
+
+
+RESOURCES = ["/items/MLA1/price_to_win", "/items/MLA2/price_to_win", "/items/MLA3/price_to_win", "/items/MLA4/price_to_win"]
+
+
+class _Cursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((self.name, " ".join(query.split()), list(params or [])))
+        after = params[-1] if "resource >" in query else None
+        rows = [r for r in RESOURCES if after is None or r > after]
+        self._rows = [(len(rows),)] if "COUNT(DISTINCT" in query else [(r,) for r in rows]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _Conn:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self, name=None):
+        return _Cursor(self, name)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def replay(monkeypatch, tmp_path):
+    conn = _Conn()
+    pushed = []
+    monkeypatch.setattr(replay_webhooks, "_connect", lambda: conn)
+    monkeypatch.setattr(replay_webhooks, "push_resource", lambda r: pushed.append(r) or "queue")
+    return conn, pushed, str(tmp_path / "cp.json")
+
+
+def test_build_query_filters_and_dedups_by_resource():
+    sql, params = replay_webhooks.build_query(
+        {"topic": "items", "since": "2026-10-01T00:00", "until": None, "pattern": "/items/MLA%"},
+        after="/items/MLA1",
+    )
+
+    assert "topic = %s" in sql and "received_at >= %s" in sql and "received_at <" not in sql
+    assert sql.endswith("resource LIKE %s AND resource > %s GROUP BY resource ORDER BY resource")
+    assert params[0] == "items" and params[1].tzinfo is not None
+    assert params[2:] == ["/items/MLA%", "/items/MLA1"]
+
+
+def test_run_streams_with_named_cursor_and_resumes_from_checkpoint(replay):
+    conn, pushed, checkpoint = replay
+    filters = {"topic": "price_to_win", "since": None, "until": None, "pattern": None}
+
+    first = replay_webhooks.run(filters, rate=0, checkpoint=checkpoint, limit=2)
+    assert pushed == RESOURCES[:2]
+    assert first["last_resource"] == RESOURCES[1]
+    with open(checkpoint) as fh:
+        assert json.load(fh)["done"] == 2
+
+    second = replay_webhooks.run(filters, rate=0, checkpoint=checkpoint)
+    assert pushed == RESOURCES
+    assert second["done"] == 4
+    assert second["by_route"] == {"queue": 4}
+
+    streamed = [q for q in conn.queries if q[0] == "replay_webhooks"]
+    assert streamed[1][2][-1] == RESOURCES[1]  # la segunda corrida arranca después del checkpoint
+
+
+def test_checkpoint_with_other_filters_is_rejected(replay):
+    _, _, checkpoint = replay
+    replay_webhooks.run({"topic": "items", "since": None, "until": None, "pattern": None}, 0, checkpoint, limit=1)
+
+    with pytest.raises(SystemExit):
+        replay_webhooks.run({"topic": "orders_v2", "since": None, "until": None, "pattern": None}, 0, checkpoint)
+
+
+def test_failed_push_is_counted_and_replay_continues(replay, monkeypatch):
+    _, _, checkpoint = replay
+
+    def flaky(resource):
+        if resource == RESOURCES[0]:
+            raise RuntimeError("ML 500")
+        return "inline"
+
+    monkeypatch.setattr(replay_webhooks, "push_resource", flaky)
+    state = replay_webhooks.run({"topic": None, "since": None, "until": None, "pattern": None}, 0, checkpoint)
+
+    assert state["errors"] == 1
+    assert state["by_route"] == {"inline": 3}
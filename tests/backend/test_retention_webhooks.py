@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+import retention_webhooks
+import webhook_archive
+
+
+def _row(webhook_id, topic, day, hour=12):
+    return (
+        topic, 1, f"/items/{webhook_id}", {"_id": webhook_id, "topic": topic},
+        webhook_id, datetime(2026, 1, day, hour, tzinfo=timezone.utc),
+    )
+
+
+def test_chunks_are_archived_per_topic_and_day_before_commit(monkeypatch, tmp_path):
+    chunks = [
+        [_row("a", "items", 1), _row("b", "items", 1, 23), _row("c", "items", 2)],
+        [],
+    ]
+    calls = []
+
+    class _Cursor:
+        def execute(self, query, params=None):
+            calls.append(params)
+            self._rows = chunks.pop(0)
+
+        def fetchall(self):
+            return self._rows
+
+    commits = []
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor()
+        commits.append(sorted(p.name for p in tmp_path.rglob("*.zst")))
+
+    monkeypatch.setattr(retention_webhooks, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(retention_webhooks, "PAUSE_SECONDS", 0)
+    monkeypatch.setattr(retention_webhooks, "ARCHIVE_DIR", str(tmp_path))
+
+    cutoff = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    deleted, last = retention_webhooks.purge_chunk("items", cutoff, datetime(1970, 1, 1, tzinfo=timezone.utc),
+                                                   archive_dir=str(tmp_path))
+
+    assert deleted == 3
+    assert last == datetime(2026, 1, 2, 12, tzinfo=timezone.utc)
+    # el archivo ya existía cuando db_cursor commiteó
+    assert commits == [["2026-01-01.ndjson.zst", "2026-01-02.ndjson.zst"]]
+
+    # el mismo chunk re-archivado (commit fallido) no duplica en la lectura
+    webhook_archive.append_records(
+        webhook_archive.archive_path(str(tmp_path), "items", datetime(2026, 1, 1).date()),
+        [{"webhook_id": "a", "topic": "items", "payload": {"_id": "a"}}],
+    )
+    records = list(webhook_archive.iter_records(str(tmp_path), topic="items"))
+    assert [r["webhook_id"] for r in records] == ["a", "b", "c"]
+    assert [r["webhook_id"] for r in webhook_archive.iter_records(str(tmp_path), pattern="items/c")] == ["c"]
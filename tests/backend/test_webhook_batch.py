@@ -0,0 +1,117 @@
+import gzip
+import json
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+@pytest.fixture
+def batch_env(monkeypatch):
+    db = {"seen_ids": set(), "chunks": [], "outbox": []}
+    dispatched = []
+
+    @contextmanager
+    def fake_db_cursor():
+        yield object()
+
+    def fake_insert_batch(cur, eventos, raws=None, outbox=True):
+        db["chunks"].append(len(eventos))
+        inserted = []
+        for e in eventos:
+            inserted.append(e["_id"] not in db["seen_ids"])
+            db["seen_ids"].add(e["_id"])
+        db["outbox"].append(outbox)
+        return inserted, None
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "_insert_webhook_batch", fake_insert_batch)
+    monkeypatch.setattr(app_module, "WEBHOOK_BATCH_ROWS", 2)
+    monkeypatch.setattr(app_module, "WEBHOOK_BATCH_TOKEN", "test-token")
+    monkeypatch.setattr(
+        app_module, "_dispatch_preview",
+        lambda resource, results: dispatched.append(resource) or results.update(preview_refreshed=True),
+    )
+
+    with app_module.app.test_client() as client:
+        client.environ_base["HTTP_AUTHORIZATION"] = "Bearer test-token"
+        yield client, db, dispatched
+
+
+def _ndjson(events):
+    return "\n".join(json.dumps(e) for e in events).encode("utf-8") + b"\n"
+
+
+EVENTS = [
+    {"_id": "b-1", "topic": "items", "resource": "/items/MLA1"},
+    {"_id": "b-2", "topic": "items", "resource": "/items/MLA1"},
+    {"_id": "b-1", "topic": "items", "resource": "/items/MLA1"},
+    {"_id": "b-3", "topic": "orders_v2", "resource": "/orders/9"},
+]
+
+
+def test_batch_counts_accepted_duplicates_and_invalid_lines(batch_env):
+    client, db, dispatched = batch_env
+    body = _ndjson(EVENTS[:2]) + b"{roto\n\n" + _ndjson(EVENTS[2:])
+
+    res = client.post("/webhook/batch", data=body, content_type="application/x-ndjson")
+
+    summary = res.get_json()
+    assert res.status_code == 200
+    assert (summary["lines"], summary["accepted"], summary["duplicates"], summary["invalid"]) == (5, 3, 1, 1)
+    assert summary["invalid_lines"][0]["line"] == 3
+    assert db["chunks"] == [2, 2]
+    assert db["outbox"] == [False, False]
+    assert dispatched == []  # sin dispatch_previews no se toca ML
+
+
+def test_batch_accepts_gzip_and_dispatches_each_new_resource_once(batch_env):
+    client, db, dispatched = batch_env
+
+    res = client.post(
+        "/webhook/batch?dispatch_previews=1",
+        data=gzip.compress(_ndjson(EVENTS)),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"},
+    )
+
+    summary = res.get_json()
+    assert res.status_code == 200
+    assert summary["accepted"] == 3
+    assert dispatched == ["/items/MLA1", "/orders/9"]
+    assert summary["previews_dispatched"] == 2
+    assert db["outbox"] == [True, True]
+
+
+def test_batch_truncated_gzip_keeps_lines_read_so_far(batch_env):
+    client, db, _ = batch_env
+    body = gzip.compress(_ndjson(EVENTS[:2]) + b'{"_id": "b-9", "topic": "items"}\n' * 200)
+
+    res = client.post("/webhook/batch", data=body[:-20], headers={"Content-Encoding": "gzip"})
+
+    assert res.status_code == 400
+    assert res.get_json()["accepted"] >= 2
+    assert "body ilegible" in res.get_json()["errors"][0]
+
+
+def test_batch_requires_token_when_configured(batch_env, monkeypatch):
+    client, _, _ = batch_env
+    monkeypatch.setattr(app_module, "WEBHOOK_BATCH_TOKEN", "s3cret")
+
+    assert client.post("/webhook/batch", data=_ndjson(EVENTS)).status_code == 401
+    ok = client.post("/webhook/batch", data=_ndjson(EVENTS), headers={"Authorization": "Bearer s3cret"})
+    assert ok.status_code == 200
+
+
+def test_batch_is_disabled_without_token(batch_env, monkeypatch):
+    client, db, _ = batch_env
+    monkeypatch.setattr(app_module, "WEBHOOK_BATCH_TOKEN", "")
+
+    res = client.post("/webhook/batch", data=_ndjson(EVENTS), headers={"Authorization": "Bearer "})
+
+    assert res.status_code == 403
+    assert db["chunks"] == []
@@ -0,0 +1,133 @@
+import json
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+class _Cursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append(" ".join(query.split()))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Fake de execute_values: registra cada statement y simula el unique de webhook_id."""
+    state = {"seen_ids": set(), "batches": [], "latest": [], "commits": 0}
+
+    def fake_execute_values(cur, sql, argslist, template=None, page_size=100, fetch=False):
+        q = " ".join(sql.split())
+        if "INSERT INTO webhooks" in q:
+            state["batches"].append(list(argslist))
+            returned = []
+            for row in argslist:
+                webhook_id = row[4]
+                if webhook_id in state["seen_ids"]:
+                    continue
+                state["seen_ids"].add(webhook_id)
+                returned.append((webhook_id,))
+            return returned if fetch else None
+        if "INSERT INTO webhook_latest" in q:
+            state["latest"].append(list(argslist))
+        return [] if fetch else None
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor()
+        state["commits"] += 1
+
+    monkeypatch.setattr(app_module, "execute_values", fake_execute_values)
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    return state
+
+
+def test_insert_webhook_batch_marks_duplicates_within_batch(db):
+    eventos = [
+        {"_id": "a", "topic": "items", "resource": "/items/MLA1"},
+        {"_id": "a", "topic": "items", "resource": "/items/MLA1"},
+        {"_id": "b", "topic": "items", "resource": "/items/MLA1"},
+    ]
+
+    inserted, latest_error = app_module._insert_webhook_batch(_Cursor(), eventos)
+
+    assert inserted == [True, False, True]
+    assert latest_error is None
+    # un solo upsert de snapshot y sin (topic, resource) repetidos: gana el último
+    assert len(db["latest"]) == 1
+    assert [row[2] for row in db["latest"][0]] == ["b"]
+
+
+def test_failed_latest_upsert_rolls_back_to_savepoint_only(db, monkeypatch):
+    original = app_module.execute_values
+
+    def failing_latest(cur, sql, argslist, **kwargs):
+        if "INSERT INTO webhook_latest" in sql:
+            raise RuntimeError("permission denied for table webhook_latest")
+        return original(cur, sql, argslist, **kwargs)
+
+    monkeypatch.setattr(app_module, "execute_values", failing_latest)
+    cur = _Cursor()
+
+    inserted, latest_error = app_module._insert_webhook_batch(
+        cur, [{"_id": "sp-1", "topic": "items", "resource": "/items/MLA1"}]
+    )
+
+    # el INSERT en webhooks sigue en pie: la transacción no queda abortada
+    assert inserted == [True]
+    assert "permission denied" in latest_error
+    assert cur.statements == ["SAVEPOINT webhook_latest_upsert", "ROLLBACK TO SAVEPOINT webhook_latest_upsert"]
+
+
+def test_group_commit_flushes_concurrent_requests_in_one_transaction(db, monkeypatch):
+    monkeypatch.setattr(app_module, "WEBHOOK_GROUP_COMMIT", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_GROUP_COMMIT_MAX_ROWS", 3)
+    monkeypatch.setattr(app_module, "WEBHOOK_GROUP_COMMIT_MAX_WAIT_MS", 2000)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: (True, None))
+
+    statuses = []
+
+    def _post(i):
+        payload = {"_id": f"gc-{i}", "topic": "items", "user_id": 1, "resource": f"/items/MLA{i}"}
+        with app_module.app.test_client() as c:
+            res = c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+        statuses.append(res.status_code)
+
+    threads = [threading.Thread(target=_post, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert statuses == [200, 200, 200]
+    assert len(db["batches"]) == 1
+    assert sorted(row[4] for row in db["batches"][0]) == ["gc-0", "gc-1", "gc-2"]
+    assert db["commits"] == 1
+
+
+def test_group_commit_failure_returns_503_so_ml_redelivers(monkeypatch):
+    def failing_submit(evento, raw=None):
+        raise TimeoutError("group commit sin respuesta tras 10s")
+
+    monkeypatch.setattr(app_module, "WEBHOOK_GROUP_COMMIT", True)
+    monkeypatch.setattr(app_module, "_group_commit_submit", failing_submit)
+    monkeypatch.setattr(
+        app_module, "_dispatch_preview",
+        lambda resource, results: pytest.fail("sin commit no se despacha preview"),
+    )
+
+    payload = {"_id": "gc-timeout", "topic": "items", "user_id": 1, "resource": "/items/MLA1"}
+    with app_module.app.test_client() as c:
+        res = c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+
+    assert res.status_code == 503
+    assert not app_module._dedup_seen("gc-timeout")
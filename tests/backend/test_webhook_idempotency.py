@@ -57,3 +57,71 @@ def test_duplicate_webhook_id_is_ignored(client):
 
     assert first.status_code == 200
     assert second.status_code == 200
+
+
+def test_cached_redelivery_skips_db_and_preview(monkeypatch):
+    db = {"seen_ids": set()}
+    checkouts = []
+    enqueued = []
+
+    @contextmanager
+    def counting_db_cursor():
+        checkouts.append(1)
+        yield _Cursor(db)
+
+    monkeypatch.setattr(app_module, "db_cursor", counting_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_DEDUP_CACHE_SIZE", 100)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: enqueued.append(resource) or (True, None))
+    monkeypatch.setattr(app_module, "_dedup_state", {
+        "current": set(), "previous": set(), "rotated_at": app_module.time.monotonic(),
+        "rotations": 0, "hits": 0, "misses": 0,
+    })
+
+    payload = {
+        "_id": "00000000-0000-0000-0000-000000000333",
+        "topic": "items",
+        "user_id": 321,
+        "resource": "/items/MLA998/price_to_win",
+    }
+    with app_module.app.test_client() as c:
+        first = c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+        second = c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+        stats = c.get("/debug/webhook-stats").get_json()["dedup"]
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert len(checkouts) == 1
+    assert enqueued == ["/items/MLA998/price_to_win"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_failed_commit_is_not_remembered_so_redelivery_retries(monkeypatch):
+    db = {"seen_ids": set()}
+    attempts = []
+
+    @contextmanager
+    def failing_commit_cursor():
+        attempts.append(1)
+        yield _Cursor(db)
+        if len(attempts) == 1:
+            raise RuntimeError("could not serialize access")
+
+    monkeypatch.setattr(app_module, "db_cursor", failing_commit_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_DEDUP_CACHE_SIZE", 100)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: (True, None))
+    monkeypatch.setattr(app_module, "_dedup_state", {
+        "current": set(), "previous": set(), "rotated_at": app_module.time.monotonic(),
+        "rotations": 0, "hits": 0, "misses": 0,
+    })
+
+    payload = {"_id": "commit-fail-1", "topic": "items", "user_id": 1, "resource": "/items/MLA1"}
+    with app_module.app.test_client() as c:
+        c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+        c.post("/webhook", data=json.dumps(payload), content_type="application/json")
+
+    # la redelivery volvió a la DB: el primer intento no quedó en el cache
+    assert len(attempts) == 2
+    assert app_module._dedup_seen("commit-fail-1")
@@ -98,3 +98,60 @@ def test_webhook_returns_200_and_records_enqueue_failure_for_diagnostics(monkeyp
     assert res.status_code == 200
     assert background_calls == ["/items/MLA124/price_to_win"]
     assert "enqueue_preview_job: redis_down" in body["errors"]
+
+
+def test_stream_mode_acks_without_touching_postgres(monkeypatch):
+    appended = []
+
+    @contextmanager
+    def fail_db_cursor():
+        raise AssertionError("En modo stream /webhook no debe tocar Postgres")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(app_module, "db_cursor", fail_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_INGEST_STREAM", True)
+    monkeypatch.setattr(app_module, "DEBUG_WEBHOOK", True)
+    monkeypatch.setattr(app_module, "_append_ingest_stream", lambda body: appended.append(body) or ("1-0", None))
+    monkeypatch.setattr(
+        app_module,
+        "_dispatch_preview",
+        lambda resource, results: (_ for _ in ()).throw(AssertionError("El preview lo despacha worker_ingest")),
+    )
+
+    raw = json.dumps({"_id": "stream-1", "topic": "items", "user_id": 1, "resource": "/items/MLA1"})
+    with app_module.app.test_client() as test_client:
+        res = test_client.post("/webhook", data=raw, content_type="application/json")
+
+    assert res.status_code == 200
+    assert res.get_json()["insert_original"]["stream_id"] == "1-0"
+    assert appended == [raw.encode("utf-8")]
+
+
+def test_raw_jsonb_mode_sends_original_body_to_both_statements(monkeypatch):
+    statements = []
+
+    class RecordingCursor(_Cursor):
+        def execute(self, query, params=None):
+            super().execute(query, params)
+            if "SAVEPOINT" not in query:
+                statements.append((" ".join(query.split()), params))
+
+    @contextmanager
+    def fake_db_cursor():
+        yield RecordingCursor({"seen_ids": set()})
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_RAW_JSONB", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: (True, None))
+
+    raw = '{"_id": "raw-1", "topic": "items", "user_id": 1, "resource": "/items/MLA1", "attempts": 1}'
+    with app_module.app.test_client() as test_client:
+        res = test_client.post("/webhook", data=raw, content_type="application/json")
+
+    assert res.status_code == 200
+    webhooks_sql, webhooks_params = statements[0]
+    latest_sql, latest_params = statements[1]
+    assert "%s::jsonb" in webhooks_sql and "%s::jsonb" in latest_sql
+    assert webhooks_params[3] == raw
+    assert latest_params[3] is webhooks_params[3]
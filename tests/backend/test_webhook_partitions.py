@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+try:
+    import webhook_partitions
+except Exception as exc:  # pragma: no cover
+    webhook_partitions = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar webhook_partitions.py: {exc}")
+
+
+class _Cursor:
+    def __init__(self, partitions, log):
+        self.partitions = partitions
+        self.log = log
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.log.append((q, params))
+        if "FROM pg_inherits" in q:
+            self._result = self.partitions
+        elif "to_regclass" in q:
+            self._result = [(True,)]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    state = {"partitions": [], "log": []}
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(state["partitions"], state["log"])
+
+    monkeypatch.setattr(webhook_partitions, "db_cursor", fake_db_cursor)
+    return state
+
+
+NOW = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+def test_ensure_starts_after_the_legacy_range_and_creates_months_ahead(db):
+    db["partitions"] = [
+        ("webhooks_legacy", "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')", 1),
+        ("webhooks_default", "DEFAULT", 1),
+    ]
+
+    created = webhook_partitions.ensure(ahead=2, interval="month", now=NOW)
+
+    assert created == ["webhooks_p2026_11", "webhooks_p2026_12"]
+    ranges = [params for q, params in db["log"] if q.startswith("CREATE TABLE")]
+    assert ranges[0] == (datetime(2026, 11, 1, tzinfo=timezone.utc), datetime(2026, 12, 1, tzinfo=timezone.utc))
+
+
+def test_retire_detaches_only_ranges_older_than_cutoff_and_never_default(db):
+    db["partitions"] = [
+        ("webhooks_default", "DEFAULT", 1),
+        ("webhooks_p2026_07", "FOR VALUES FROM ('2026-07-01 00:00:00+00') TO ('2026-08-01 00:00:00+00')", 1),
+        ("webhooks_p2026_09", "FOR VALUES FROM ('2026-09-01 00:00:00+00') TO ('2026-10-01 00:00:00+00')", 1),
+    ]
+
+    retired = webhook_partitions.retire(older_than_days=60, drop=True, now=NOW)
+
+    assert retired == ["webhooks_p2026_07"]
+    statements = [q for q, _ in db["log"]]
+    assert 'ALTER TABLE webhooks DETACH PARTITION "webhooks_p2026_07"' in statements
+    assert 'DROP TABLE "webhooks_p2026_07"' in statements
+    assert any(q.startswith("DELETE FROM webhook_ids") for q in statements)
+    # la partición se descuenta de webhook_topic_counts antes del DETACH
+    discount = next(i for i, q in enumerate(statements) if q.startswith("INSERT INTO webhook_topic_counts"))
+    assert 'FROM "webhooks_p2026_07"' in statements[discount]
+    assert discount < statements.index('ALTER TABLE webhooks DETACH PARTITION "webhooks_p2026_07"')
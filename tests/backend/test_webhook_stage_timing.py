@@ -0,0 +1,90 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover - entorno sin DB/Redis
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+class _Cursor:
+    rowcount = 1
+
+    def execute(self, query, params=None):
+        return None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    @contextmanager
+    def fake_db_cursor():
+        with app_module._stage("db_checkout"):
+            cur = _Cursor()
+        yield cur
+        with app_module._stage("db_commit"):
+            pass
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "_stage_histograms", {})
+    monkeypatch.setattr(app_module, "WEBHOOK_STAGE_TIMING", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_SERVER_TIMING", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_ASYNC", True)
+    monkeypatch.setattr(app_module, "WEBHOOK_PREVIEW_OUTBOX", False)
+    monkeypatch.setattr(app_module, "_admit_preview", lambda resource: True)
+    monkeypatch.setattr(app_module, "_enqueue_preview_job", lambda resource: (True, None))
+
+    with app_module.app.test_client() as c:
+        yield c
+
+
+def _post(client, webhook_id):
+    payload = {"_id": webhook_id, "topic": "items", "user_id": 1, "resource": "/items/MLA1"}
+    return client.post("/webhook", data=json.dumps(payload), content_type="application/json")
+
+
+def test_server_timing_header_lists_each_stage(client):
+    res = _post(client, "timing-1")
+
+    assert res.status_code == 200
+    header = res.headers["Server-Timing"]
+    stages = [part.split(";")[0] for part in header.split(", ")]
+    for stage in ("parse", "dedup", "db_checkout", "insert", "latest_upsert", "db_commit", "preview_dispatch", "total"):
+        assert stage in stages
+    assert all(";dur=" in part for part in header.split(", "))
+
+
+def test_stage_histograms_accumulate_per_request(client):
+    _post(client, "timing-1")
+    _post(client, "timing-2")
+    client.post("/webhook", data="no es json", content_type="application/json")
+
+    stats = client.get("/debug/webhook-stats").get_json()["stages"]
+
+    assert stats["enabled"] is True
+    assert stats["stages"]["total"]["count"] == 3
+    assert stats["stages"]["parse"]["count"] == 3
+    assert stats["stages"]["insert"]["count"] == 2
+    assert sum(stats["stages"]["insert"]["buckets"].values()) == 2
+    assert stats["stages"]["total"]["p50_ms_le"] is not None
+
+
+def test_stage_is_noop_outside_instrumented_request(monkeypatch):
+    monkeypatch.setattr(app_module, "_stage_histograms", {})
+
+    with app_module._stage("insert"):
+        pass
+
+    assert app_module._stage_histograms == {}
+
+
+def test_disabled_timing_skips_header_and_histograms(client, monkeypatch):
+    monkeypatch.setattr(app_module, "WEBHOOK_STAGE_TIMING", False)
+
+    res = _post(client, "timing-3")
+
+    assert res.status_code == 200
+    assert "Server-Timing" not in res.headers
+    assert app_module._stage_histograms == {}
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+class _Connection:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _Cursor:
+    def __init__(self, has_counts, log):
+        self.has_counts = has_counts
+        self.log = log
+        self.connection = _Connection()
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.log.append(q)
+        if "FROM webhook_topic_counts" in q:
+            if not self.has_counts:
+                raise RuntimeError('relation "webhook_topic_counts" does not exist')
+            self._result = [("items", 120, 40), ("orders_v2", 7, 5)]
+        elif "FROM webhooks GROUP BY topic" in q:
+            self._result = [("items", 3)]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def topics_client(monkeypatch):
+    state = {"has_counts": True, "log": []}
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(state["has_counts"], state["log"])
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOK_TOPICS_CACHE_TTL", 0)
+    with app_module.app.test_client() as c:
+        yield c, state
+
+
+def test_topics_are_served_from_trigger_maintained_counts(topics_client):
+    client, state = topics_client
+
+    res = client.get("/api/webhooks/topics")
+
+    assert res.status_code == 200
+    assert res.get_json() == [
+        {"topic": "items", "count": 120, "latest_count": 40},
+        {"topic": "orders_v2", "count": 7, "latest_count": 5},
+    ]
+    assert not any("FROM webhooks GROUP BY" in q for q in state["log"])
+
+
+def test_topics_fall_back_to_group_by_without_counts_table(topics_client):
+    client, state = topics_client
+    state["has_counts"] = False
+
+    res = client.get("/api/webhooks/topics")
+
+    assert res.status_code == 200
+    assert res.get_json() == [{"topic": "items", "count": 3}]
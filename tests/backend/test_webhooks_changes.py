@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+NOW = datetime(2026, 10, 16, 12, 0, 0, tzinfo=timezone.utc)
+
+
+class _Cursor:
+    """webhook_latest / ml_previews en memoria: [(resource, received_at, preview_updated)]."""
+
+    def __init__(self, db, queries):
+        self.db = db
+        self.queries = queries
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.queries.append((q, params))
+        if q == "SELECT NOW()":
+            self._result = [(NOW,)]
+            return
+        assert "WITH changed AS" in q
+        topic, latest_floor, preview_floor, _, limit = params
+        rows = [
+            (
+                {"resource": resource}, f"title {resource}", 1, "ARS", None, None, None, "winning",
+                received_at, None, {}, resource, topic, None, None,
+            )
+            for resource, received_at, updated in self.db
+            if received_at > latest_floor or (updated is not None and updated > preview_floor)
+        ]
+        rows.sort(key=lambda row: (row[8], row[11]), reverse=True)
+        self._result = rows[:limit]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def changes(monkeypatch):
+    db = [
+        ("/items/MLA1", NOW - timedelta(hours=2), NOW - timedelta(hours=2)),
+        ("/items/MLA2", NOW - timedelta(hours=2), NOW - timedelta(minutes=1)),
+        ("/items/MLA3", NOW - timedelta(minutes=2), None),
+    ]
+    queries = []
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(db, queries)
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOKS_CHANGES_OVERLAP_SECONDS", 5)
+    with app_module.app.test_client() as client:
+        yield client, queries
+
+
+def test_without_since_only_returns_initial_token(changes):
+    client, queries = changes
+
+    body = client.get("/api/webhooks/changes?topic=items").get_json()
+
+    assert body["events"] == []
+    assert body["reset"] is False
+    assert app_module._decode_changes_token(body["next_token"]) == NOW
+    assert [q for q, _ in queries] == ["SELECT NOW()"]
+
+
+def test_returns_snapshot_and_preview_changes_since_token_with_overlap(changes):
+    client, queries = changes
+    token = app_module._encode_changes_token(NOW - timedelta(minutes=10))
+
+    body = client.get(f"/api/webhooks/changes?topic=items&since={token}").get_json()
+
+    assert [e["resource"] for e in body["events"]] == ["/items/MLA3", "/items/MLA2"]
+    assert body["events"][0]["db_preview"]["title"] == "title /items/MLA3"
+    _, params = queries[-1]
+    assert params[1] == params[2] == NOW - timedelta(minutes=10, seconds=5)
+
+
+def test_too_many_changes_asks_for_reset(changes, monkeypatch):
+    client, _ = changes
+    monkeypatch.setattr(app_module, "WEBHOOKS_CHANGES_MAX", 1)
+    token = app_module._encode_changes_token(NOW - timedelta(days=1))
+
+    body = client.get(f"/api/webhooks/changes?topic=items&since={token}").get_json()
+
+    assert body["reset"] is True
+    assert body["events"] == []
+
+
+def test_invalid_token_returns_400(changes):
+    client, _ = changes
+
+    assert client.get("/api/webhooks/changes?topic=items&since=nope").status_code == 400
+    assert client.get("/api/webhooks/changes").status_code == 400
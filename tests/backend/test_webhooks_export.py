@@ -0,0 +1,139 @@
+import csv
+import gzip
+import io
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+def _event(i):
+    return (
+        datetime(2026, 10, 16, 12, 0, i, tzinfo=timezone.utc), "items", f"/items/MLA{i}", f"wh-{i}", 7,
+        {"attempts": 1}, f"Item {i}", 10 + i, "ARS", None, None, "winning", "Brand", None,
+    )
+
+
+class _Cursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((" ".join(query.split()), params, self.name))
+        if self.name:
+            self._rows = list(self.conn.rows)
+
+    def fetchmany(self, size):
+        self.conn.fetches.append(size)
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+
+class _Conn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.fetches = []
+        self.closed = False
+
+    def cursor(self, name=None):
+        return _Cursor(self, name)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def export(monkeypatch):
+    conn = _Conn([_event(i) for i in range(5)])
+    monkeypatch.setattr(app_module, "_export_connection", lambda: conn)
+    monkeypatch.setattr(app_module, "WEBHOOKS_EXPORT_FETCH", 2)
+    monkeypatch.setattr(app_module, "_export_slots", threading.BoundedSemaphore(1))
+    with app_module.app.test_client() as client:
+        yield client, conn
+
+
+def test_ndjson_export_streams_in_batches_over_named_cursor(export):
+    client, conn = export
+
+    res = client.get("/api/webhooks/export?topic=items&since=2026-10-16T00:00&resource=/items/MLA%25")
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    assert [line["resource"] for line in lines] == [f"/items/MLA{i}" for i in range(5)]
+    assert lines[0]["payload"] == {"attempts": 1, "_id": "wh-0", "topic": "items", "user_id": 7, "resource": "/items/MLA0"}
+    assert lines[0]["preview"]["title"] == "Item 0"
+    assert conn.fetches == [2, 2, 2, 2]
+    assert conn.closed
+    query, params, name = conn.queries[-1]
+    assert name == "webhooks_export"
+    assert "w.received_at >= %s" in query and "w.resource LIKE %s" in query
+    assert params == ["items", datetime(2026, 10, 16, tzinfo=timezone.utc), "/items/MLA%"]
+
+
+def test_csv_export_with_gzip(export):
+    client, _ = export
+
+    res = client.get("/api/webhooks/export?topic=items&format=csv&gzip=1")
+    rows = list(csv.reader(io.StringIO(gzip.decompress(res.get_data()).decode("utf-8"))))
+
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert rows[0] == list(app_module._EXPORT_CSV_COLUMNS)
+    assert len(rows) == 6
+    assert rows[1][2] == "/items/MLA0"
+    assert json.loads(rows[1][-1])["_id"] == "wh-0"
+
+
+def test_concurrent_exports_are_capped_and_slot_is_released(export):
+    client, _ = export
+    app_module._export_slots.acquire()
+    try:
+        busy = client.get("/api/webhooks/export?topic=items")
+    finally:
+        app_module._export_slots.release()
+
+    assert busy.status_code == 429
+    # el server WSGI cierra la respuesta al terminar (call_on_close libera el cupo)
+    for _ in range(2):
+        res = client.get("/api/webhooks/export?topic=items")
+        assert res.status_code == 200
+        res.close()
+
+
+def test_invalid_params_return_400(export):
+    client, _ = export
+
+    assert client.get("/api/webhooks/export").status_code == 400
+    assert client.get("/api/webhooks/export?topic=items&format=xml").status_code == 400
+    assert client.get("/api/webhooks/export?topic=items&since=ayer").status_code == 400
+
+
+def test_export_stops_at_wall_clock_deadline(export, monkeypatch):
+    client, conn = export
+    clock = iter([0.0, 0.0, 0.0, 100.0])
+    monkeypatch.setattr(app_module, "WEBHOOKS_EXPORT_MAX_SECONDS", 10)
+    monkeypatch.setattr(app_module.time, "monotonic", lambda: next(clock, 100.0))
+
+    res = client.get("/api/webhooks/export?topic=items")
+    with pytest.raises(TimeoutError):
+        res.get_data()
+
+    # cortó antes de traer todo (2 de 3 batches) y cerró la conexión
+    assert conn.fetches == [2, 2]
+    assert conn.closed
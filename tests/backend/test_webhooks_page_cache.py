@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+try:
+    import app as app_module
+except Exception as exc:  # pragma: no cover
+    app_module = None
+    pytestmark = pytest.mark.skip(reason=f"No se pudo importar app.py: {exc}")
+
+
+def _row(resource, title):
+    return (
+        {"resource": resource, "topic": "items"},
+        title, 10, "ARS", None, None, None, "winning",
+        datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc),
+        "Brand", {}, resource, "items", None, None,
+    )
+
+
+class _Cursor:
+    def __init__(self, db, queries):
+        self.db = db
+        self.queries = queries
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.queries.append(q)
+        if "FROM webhook_topic_counts" in q:
+            self._result = [(len(self.db),)]
+        elif "FROM webhook_latest wl" in q:
+            self._result = list(self.db)
+        elif q == "SELECT topic FROM webhook_latest WHERE resource = %s":
+            self._result = [("items",)] if params[0] == "/items/MLA1" else []
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def page_cache(monkeypatch):
+    db = [_row("/items/MLA1", "Item 1")]
+    queries = []
+
+    @contextmanager
+    def fake_db_cursor():
+        yield _Cursor(db, queries)
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "_redis_client", None)
+    monkeypatch.setattr(app_module, "WEBHOOKS_PAGE_CACHE", True)
+    monkeypatch.setattr(app_module, "WEBHOOKS_CURSOR_MODE", True)
+    monkeypatch.setattr(app_module, "_webhooks_page_cache", app_module.OrderedDict())
+    monkeypatch.setattr(app_module, "_webhooks_page_versions", {})
+    with app_module.app.test_client() as client:
+        yield client, db, queries
+
+
+def _page_reads(queries):
+    return sum(1 for q in queries if "FROM webhook_latest wl" in q)
+
+
+def test_first_page_is_served_from_cache_and_revalidates_with_304(page_cache):
+    client, _, queries = page_cache
+
+    first = client.get("/api/webhooks?topic=items")
+    second = client.get("/api/webhooks?topic=items")
+    conditional = client.get("/api/webhooks?topic=items", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.headers["X-Cache"] == "miss"
+    assert second.headers["X-Cache"] == "hit"
+    assert second.get_data() == first.get_data()
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert conditional.status_code == 304
+    assert conditional.get_data() == b""
+    assert _page_reads(queries) == 1
+
+
+def test_cursor_pages_bypass_cache(page_cache):
+    client, _, queries = page_cache
+
+    first = client.get("/api/webhooks?topic=items&limit=1")
+    cursor = first.get_json()["pagination"]["next_cursor"]
+    res = client.get(f"/api/webhooks?topic=items&limit=1&cursor={cursor}")
+
+    assert "ETag" not in res.headers
+    assert _page_reads(queries) == 2
+
+
+def test_new_snapshot_invalidates_topic(page_cache):
+    client, db, queries = page_cache
+    first = client.get("/api/webhooks?topic=items")
+
+    db.insert(0, _row("/items/MLA2", "Item 2"))
+    app_module._invalidate_webhooks_page("items")
+    res = client.get("/api/webhooks?topic=items", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert res.status_code == 200
+    assert res.headers["X-Cache"] == "miss"
+    assert res.headers["ETag"] != first.headers["ETag"]
+    assert [e["resource"] for e in res.get_json()["events"]] == ["/items/MLA2", "/items/MLA1"]
+    assert _page_reads(queries) == 2
+
+
+def test_preview_write_invalidates_topics_showing_resource(page_cache):
+    client, _, queries = page_cache
+    cur = _Cursor([], queries)
+
+    topics = app_module._topics_for_resource(cur, "/items/MLA1")
+    app_module._invalidate_webhooks_page(*topics)
+
+    assert topics == ["items"]
+    assert queries[0] == "SAVEPOINT topics_for_resource"
+    assert app_module._webhooks_page_version("items") == "1"
+    assert app_module._webhooks_page_version("orders_v2") == "0"
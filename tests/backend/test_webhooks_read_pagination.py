@@ -17,7 +17,7 @@ class _Cursor:
 
     def execute(self, query, params=None):
         q = " ".join(query.split())
-        if "SELECT COUNT(*) FROM webhook_latest" in q:
+        if "SELECT COUNT(*) FROM webhook_latest" in q or "FROM webhook_topic_counts" in q:
             topic = params[0]
             self._result = [(sum(1 for row in self.db if row[12] == topic),)]
             return
@@ -51,13 +51,13 @@ def client(monkeypatch):
         {"resource": "/items/MLA1", "topic": "items"},
         "Item 1", 10, "ARS", None, None, None, "winning",
         datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc),
-        "Brand 1", {}, "/items/MLA1", "items",
+        "Brand 1", {}, "/items/MLA1", "items", None, None,
     )
     row2 = (
         {"resource": "/items/MLA2", "topic": "items"},
         "Item 2", 20, "ARS", None, None, None, "competing",
         datetime(2026, 4, 10, 17, 59, 0, tzinfo=timezone.utc),
-        "Brand 2", {}, "/items/MLA2", "items",
+        "Brand 2", {}, "/items/MLA2", "items", None, None,
     )
     db = [row1, row2]
 
@@ -114,20 +114,20 @@ def test_latest_event_per_resource_uses_most_recent_snapshot_row(client, monkeyp
             {"resource": "/items/MLA1", "topic": "items", "marker": "new"},
             "Item 1 newest", 11, "ARS", None, None, None, "winning",
             datetime(2026, 4, 10, 18, 1, 0, tzinfo=timezone.utc),
-            "Brand 1", {}, "/items/MLA1", "items",
+            "Brand 1", {}, "/items/MLA1", "items", None, None,
         ),
         (
             {"resource": "/items/MLA1", "topic": "items", "marker": "old"},
             "Item 1 old", 9, "ARS", None, None, None, "competing",
             datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc),
-            "Brand 1", {}, "/items/MLA1", "items",
+            "Brand 1", {}, "/items/MLA1", "items", None, None,
         ),
     ]
 
     class LatestOnlyCursor(_Cursor):
         def execute(self, query, params=None):
             q = " ".join(query.split())
-            if "SELECT COUNT(*) FROM webhook_latest" in q:
+            if "SELECT COUNT(*) FROM webhook_latest" in q or "FROM webhook_topic_counts" in q:
                 self._result = [(1,)]
                 return
             if "FROM webhook_latest wl" in q:
@@ -153,3 +153,177 @@ def test_latest_event_per_resource_uses_most_recent_snapshot_row(client, monkeyp
     assert res.status_code == 200
     assert len(body["events"]) == 1
     assert body["events"][0]["marker"] == "new"
+
+
+def test_legacy_fallback_bounds_received_at_when_lookback_is_set(monkeypatch):
+    queries = []
+
+    class _Connection:
+        def rollback(self):
+            pass
+
+    class FallbackCursor:
+        connection = _Connection()
+
+        def execute(self, query, params=None):
+            q = " ".join(query.split())
+            if "FROM webhook_latest" in q or "FROM webhook_topic_counts" in q:
+                raise RuntimeError('relation "webhook_latest" does not exist')
+            queries.append((q, params))
+            self._result = [(0,)] if "SELECT COUNT(*) FROM latest" in q else []
+
+        def fetchone(self):
+            return self._result[0]
+
+        def fetchall(self):
+            return self._result
+
+    @contextmanager
+    def fake_db_cursor():
+        yield FallbackCursor()
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOKS_CURSOR_MODE", True)
+    monkeypatch.setattr(app_module, "WEBHOOKS_FALLBACK_LOOKBACK_DAYS", 30)
+    monkeypatch.setattr(app_module, "WEBHOOKS_LEGACY_FALLBACK", True)
+
+    with app_module.app.test_client() as c:
+        res = c.get("/api/webhooks?topic=items&limit=10")
+
+    assert res.status_code == 200
+    (count_q, count_params), (page_q, page_params) = queries
+    assert "received_at >= NOW() - make_interval(days => %s)" in count_q
+    assert count_params == ("items", 30)
+    assert "w.received_at >= NOW() - make_interval(days => %s)" in page_q
+    assert page_params == ("items", 30, 30, 10)
+
+
+def test_missing_snapshot_returns_503_when_legacy_fallback_is_off(monkeypatch):
+    class _Connection:
+        def rollback(self):
+            pass
+
+    class NoSnapshotCursor:
+        connection = _Connection()
+
+        def execute(self, query, params=None):
+            if "FROM webhook_latest" in query:
+                raise RuntimeError('relation "webhook_latest" does not exist')
+            raise AssertionError("no debe caer al GROUP BY sobre webhooks")
+
+    @contextmanager
+    def fake_db_cursor():
+        yield NoSnapshotCursor()
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOKS_LEGACY_FALLBACK", False)
+
+    with app_module.app.test_client() as c:
+        res = c.get("/api/webhooks?topic=items")
+
+    assert res.status_code == 503
+    assert "rebuild_webhook_latest.py" in res.get_json()["error"]
+
+
+def _count_client(monkeypatch, queries, counts_table=True):
+    class CountingCursor(_Cursor):
+        def execute(self, query, params=None):
+            q = " ".join(query.split())
+            queries.append(q)
+            if "FROM webhook_topic_counts" in q:
+                if not counts_table:
+                    raise RuntimeError('relation "webhook_topic_counts" does not exist')
+                self._result = [(42,)]
+                return
+            if q == "SELECT 1 FROM webhook_latest LIMIT 0":
+                self._result = []
+                return
+            super().execute(query, params)
+
+    class _Connection:
+        def rollback(self):
+            pass
+
+    CountingCursor.connection = _Connection()
+    row = (
+        {"resource": "/items/MLA1", "topic": "items"},
+        "Item 1", 10, "ARS", None, None, None, "winning",
+        datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc),
+        "Brand 1", {}, "/items/MLA1", "items", None, None,
+    )
+
+    @contextmanager
+    def fake_db_cursor():
+        yield CountingCursor([row])
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOKS_COUNT_DEFAULT", "estimate")
+    return app_module.app.test_client()
+
+
+def test_count_modes_choose_counter_exact_scan_or_nothing(monkeypatch):
+    queries = []
+    client = _count_client(monkeypatch, queries)
+
+    estimate = client.get("/api/webhooks?topic=items").get_json()["pagination"]
+    assert (estimate["total"], estimate["count"]) == (42, "estimate")
+    assert not any("COUNT(*) FROM webhook_latest" in q for q in queries)
+
+    queries.clear()
+    exact = client.get("/api/webhooks?topic=items&count=exact").get_json()["pagination"]
+    assert (exact["total"], exact["count"]) == (1, "exact")
+    assert not any("webhook_topic_counts" in q for q in queries)
+
+    queries.clear()
+    res = client.get("/api/webhooks?topic=items&count=none")
+    none = res.get_json()["pagination"]
+    assert (none["total"], none["count"]) == (None, "none")
+    assert not any("COUNT" in q for q in queries)
+    assert len(res.get_json()["events"]) == 1
+
+    assert client.get("/api/webhooks?topic=items&count=maybe").status_code == 400
+
+
+def test_estimate_falls_back_to_exact_without_counts_table(monkeypatch):
+    queries = []
+    client = _count_client(monkeypatch, queries, counts_table=False)
+
+    pagination = client.get("/api/webhooks?topic=items").get_json()["pagination"]
+
+    assert (pagination["total"], pagination["count"]) == (1, "exact")
+
+
+def test_sql_json_mode_concatenates_events_built_in_postgres(monkeypatch):
+    queries = []
+    received_at = datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc)
+
+    class SqlJsonCursor(_Cursor):
+        def execute(self, query, params=None):
+            q = " ".join(query.split())
+            queries.append(q)
+            if "FROM webhook_latest wl" in q:
+                event = '{"resource": "/items/MLA1", "db_preview": {"title": "Item 1"}, "received_at": "2026-04-10 15:00:00"}'
+                self._result = [(event, *([None] * 7), received_at, None, None, "/items/MLA1")]
+                return
+            super().execute(query, params)
+
+    @contextmanager
+    def fake_db_cursor():
+        yield SqlJsonCursor([])
+
+    monkeypatch.setattr(app_module, "db_cursor", fake_db_cursor)
+    monkeypatch.setattr(app_module, "WEBHOOKS_SQL_JSON", True)
+    monkeypatch.setattr(app_module, "WEBHOOKS_CURSOR_MODE", True)
+
+    with app_module.app.test_client() as c:
+        res = c.get("/api/webhooks?topic=items&limit=1&count=none")
+
+    body = res.get_json()
+    assert res.status_code == 200
+    assert body["events"] == [{
+        "resource": "/items/MLA1",
+        "db_preview": {"title": "Item 1"},
+        "received_at": "2026-04-10 15:00:00",
+    }]
+    assert app_module._decode_webhooks_cursor(body["pagination"]["next_cursor"]) == (received_at, "/items/MLA1")
+    assert any("jsonb_build_object" in q and "to_char" in q for q in queries)
@@ -16,14 +16,14 @@ class _Cursor:
 
     def execute(self, query, params=None):
         q = " ".join(query.split())
-        if "SELECT COUNT(*) FROM webhook_latest" in q:
+        if "SELECT COUNT(*) FROM webhook_latest" in q or "FROM webhook_topic_counts" in q:
             self._result = [(1,)]
         elif "FROM webhook_latest wl" in q:
             self._result = [(
                 {"resource": "/items/MLA999", "topic": "items"},
                 None, None, None, None, None, None, None,
                 datetime(2026, 4, 10, 18, 0, 0, tzinfo=timezone.utc),
-                None, None, "/items/MLA999"
+                None, None, "/items/MLA999", "items", "wh-999", None,
             )]
 
     def fetchone(self):
@@ -0,0 +1,111 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import worker_ingest
+
+
+class FakeRedis:
+    def __init__(self):
+        self.acked = []
+        self.dead = []
+
+    def xack(self, key, group, *ids):
+        self.acked.extend(ids)
+
+    def rpush(self, key, payload):
+        self.dead.append((key, json.loads(payload)))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis_client = FakeRedis()
+    monkeypatch.setattr(worker_ingest, "_redis_client", redis_client)
+
+    @contextmanager
+    def fake_db_cursor():
+        yield object()
+
+    monkeypatch.setattr(worker_ingest, "db_cursor", fake_db_cursor)
+    return redis_client
+
+
+def _entry(entry_id, payload):
+    return (entry_id, {"body": payload if isinstance(payload, str) else json.dumps(payload)})
+
+
+def test_process_entries_acks_after_commit_and_dispatches_only_new_events(fake_redis, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(
+        worker_ingest, "_insert_webhook_batch", lambda cur, eventos, raws=None: ([True, False], None)
+    )
+    monkeypatch.setattr(
+        worker_ingest, "_dispatch_preview", lambda resource, results: dispatched.append(resource)
+    )
+
+    entries = [
+        _entry("1-0", {"_id": "a", "topic": "items", "resource": "/items/MLA1"}),
+        _entry("2-0", {"_id": "a", "topic": "items", "resource": "/items/MLA1"}),
+        _entry("3-0", "{no es json"),
+    ]
+    new, dup, bad = worker_ingest.process_entries(entries)
+
+    assert (new, dup, bad) == (1, 1, 1)
+    assert sorted(fake_redis.acked) == ["1-0", "2-0", "3-0"]
+    assert dispatched == ["/items/MLA1"]
+    assert fake_redis.dead[0][0] == worker_ingest.INGEST_DEAD_QUEUE_KEY
+    assert fake_redis.dead[0][1]["stream_id"] == "3-0"
+
+
+def test_failed_entry_stays_pending_while_the_rest_of_the_batch_is_acked(fake_redis, monkeypatch):
+    def fake_insert(cur, eventos, raws=None):
+        if any(e["_id"] == "poison" for e in eventos):
+            raise RuntimeError("invalid input syntax for type json")
+        return [True] * len(eventos), None
+
+    monkeypatch.setattr(worker_ingest, "_insert_webhook_batch", fake_insert)
+    monkeypatch.setattr(worker_ingest, "_dispatch_preview", lambda resource, results: None)
+
+    entries = [
+        _entry("1-0", {"_id": "ok", "topic": "items", "resource": "/items/MLA1"}),
+        _entry("2-0", {"_id": "poison", "topic": "items", "resource": "/items/MLA2"}),
+    ]
+    new, dup, bad = worker_ingest.process_entries(entries)
+
+    assert (new, dup, bad) == (1, 0, 0)
+    assert fake_redis.acked == ["1-0"]
+
+
+def test_trim_only_drops_entries_every_group_finished(fake_redis):
+    trims = []
+    fake_redis.xinfo_groups = lambda key: [
+        {"name": "ingest", "last-delivered-id": "1700-5"},
+        {"name": "audit", "last-delivered-id": "1900-0"},
+    ]
+    fake_redis.xpending = lambda key, group: (
+        {"pending": 0, "min": None} if group == "ingest" else {"pending": 2, "min": "1500-3"}
+    )
+    fake_redis.xtrim = lambda key, minid, approximate: trims.append(minid) or 7
+
+    assert worker_ingest._trim_consumed() == 7
+    # el pendiente más viejo de cualquier group fija el piso
+    assert trims == ["1500-3"]
+
+
+def test_trim_skips_group_that_never_read(fake_redis):
+    fake_redis.xinfo_groups = lambda key: [{"name": "ingest", "last-delivered-id": "0-0"}]
+    fake_redis.xpending = lambda key, group: {"pending": 0, "min": None}
+    fake_redis.xtrim = lambda *a, **k: pytest.fail("no debe recortar")
+
+    assert worker_ingest._trim_consumed() == 0
+
+
+def test_reclaimed_entry_missing_from_stream_is_dead_lettered(fake_redis, monkeypatch):
+    fake_redis.xpending_range = lambda *a, **k: [{"message_id": "1-0", "times_delivered": 2}]
+    fake_redis.xclaim = lambda *a, **k: [("1-0", None)]
+
+    assert worker_ingest._reclaim_pending() == 0
+    assert fake_redis.dead[0][1]["stream_id"] == "1-0"
+    assert fake_redis.dead[0][1]["error"] == "trimmed_before_write"
+    assert fake_redis.acked == ["1-0"]
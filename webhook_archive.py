@@ -0,0 +1,200 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from urllib import request as urlrequest
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - retention/lectura lo exigen al usarse
+    zstandard = None
+
+# Archivo frío de `webhooks`: NDJSON comprimido con zstd, un archivo por topic y
+# día (<dir>/<topic>/<YYYY-MM-DD>.ndjson.zst). Cada chunk archivado se agrega
+# como un frame zstd nuevo, así el archivo sigue siendo válido aunque el job se
+# corte a mitad. Las entregas son at-least-once: si el DELETE no llega a
+# commitear, el mismo chunk puede quedar archivado dos veces (replay dedup por
+# webhook_id). `replay` re-postea los payloads a un /webhook: pensado para
+# staging o para reconstruir un entorno, en producción pisaría webhook_latest con
+# eventos viejos.
+#
+#   python webhook_archive.py grep --topic items --since 2026-01-01 --pattern MLA123
+#   python webhook_archive.py replay --topic orders_v2 --since 2026-03-01 --url http://localhost:3000/webhook
+#   python webhook_archive.py replay --topic items --batch 5000 --url http://localhost:3000/webhook/batch
+
+ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "archive/webhooks")
+ZSTD_LEVEL = int(os.getenv("RETENTION_ZSTD_LEVEL", "9"))
+_SAFE_TOPIC_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("Falta el paquete 'zstandard' (pip install zstandard)")
+
+
+def _topic_dir(base_dir: str, topic: str) -> str:
+    return os.path.join(base_dir, _SAFE_TOPIC_RE.sub("_", topic or "sin_topic"))
+
+
+def archive_path(base_dir: str, topic: str, day: date) -> str:
+    return os.path.join(_topic_dir(base_dir, topic), f"{day.isoformat()}.ndjson.zst")
+
+
+def append_records(path: str, records):
+    """Agrega records (dicts) como un frame zstd y hace fsync antes de volver."""
+    _require_zstd()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    body = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+    frame = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body.encode("utf-8"))
+    with open(path, "ab") as fh:
+        fh.write(frame)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def iter_archive(path: str):
+    _require_zstd()
+    with open(path, "rb") as fh:
+        reader = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+        buffered = b""
+        while True:
+            chunk = reader.read(1 << 20)
+            if not chunk:
+                break
+            buffered += chunk
+            *lines, buffered = buffered.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+        if buffered.strip():
+            yield json.loads(buffered)
+
+
+def archive_files(base_dir: str, topic: str = None, since: date = None, until: date = None):
+    """Archivos del archivo frío en orden (topic, día), filtrados por rango de días."""
+    topics = [topic] if topic else sorted(os.listdir(base_dir)) if os.path.isdir(base_dir) else []
+    for t in topics:
+        topic_dir = _topic_dir(base_dir, t)
+        if not os.path.isdir(topic_dir):
+            continue
+        for name in sorted(os.listdir(topic_dir)):
+            if not name.endswith(".ndjson.zst"):
+                continue
+            day = date.fromisoformat(name.split(".", 1)[0])
+            if (since and day < since) or (until and day > until):
+                continue
+            yield os.path.join(topic_dir, name)
+
+
+def iter_records(base_dir: str, topic: str = None, since: date = None, until: date = None, pattern: str = None):
+    regex = re.compile(pattern) if pattern else None
+    for path in archive_files(base_dir, topic, since, until):
+        seen = set()  # un chunk re-archivado cae en el mismo archivo
+        for record in iter_archive(path):
+            webhook_id = record.get("webhook_id")
+            if webhook_id:
+                if webhook_id in seen:
+                    continue  # chunk archivado dos veces
+                seen.add(webhook_id)
+            if regex and not regex.search(json.dumps(record, ensure_ascii=False, default=str)):
+                continue
+            yield record
+
+
+def replay(records, url: str, rate: float):
+    """Re-postea el payload original de cada record al endpoint /webhook."""
+    interval = 1.0 / rate if rate > 0 else 0
+    sent = failed = 0
+    for record in records:
+        payload = record.get("payload")
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        req = urlrequest.Request(
+            url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urlrequest.urlopen(req, timeout=10) as response:
+                response.read()
+            sent += 1
+        except Exception as err:
+            failed += 1
+            print(f"❌ replay {record.get('webhook_id')}: {err}")
+        if interval:
+            time.sleep(interval)
+    return sent, failed
+
+
+def replay_batch(records, url: str, batch_size: int, token: str = None):
+    """Re-postea los payloads como NDJSON gzip a /webhook/batch, `batch_size` por
+    request. Devuelve (aceptados, duplicados, fallidos)."""
+    totals = {"accepted": 0, "duplicates": 0, "failed": 0}
+    headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    def post(lines):
+        req = urlrequest.Request(url, data=gzip.compress("".join(lines).encode("utf-8")), headers=headers, method="POST")
+        try:
+            with urlrequest.urlopen(req, timeout=120) as response:
+                summary = json.loads(response.read())
+            for key in ("accepted", "duplicates"):
+                totals[key] += summary.get(key, 0)
+            totals["failed"] += summary.get("failed", 0) + summary.get("invalid", 0)
+        except Exception as err:
+            totals["failed"] += len(lines)
+            print(f"❌ replay batch de {len(lines)}: {err}")
+
+    lines = []
+    for record in records:
+        payload = record.get("payload")
+        lines.append((payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)) + "\n")
+        if len(lines) >= batch_size:
+            post(lines)
+            lines = []
+    if lines:
+        post(lines)
+    return totals["accepted"], totals["duplicates"], totals["failed"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lectura del archivo frío de webhooks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("grep", "replay"):
+        p = sub.add_parser(name)
+        p.add_argument("--dir", default=ARCHIVE_DIR)
+        p.add_argument("--topic")
+        p.add_argument("--since", type=date.fromisoformat)
+        p.add_argument("--until", type=date.fromisoformat)
+        p.add_argument("--pattern", help="regex sobre el record serializado")
+    sub.choices["replay"].add_argument("--url", required=True, help="p.ej. http://localhost:3000/webhook")
+    sub.choices["replay"].add_argument("--rate", type=float, default=20, help="requests/seg (0 = sin límite)")
+    sub.choices["replay"].add_argument(
+        "--batch", type=int, default=0,
+        help="N eventos por POST a /webhook/batch (NDJSON gzip, sin previews); 0 = uno por POST a /webhook",
+    )
+
+    args = parser.parse_args(argv)
+    records = iter_records(args.dir, args.topic, args.since, args.until, args.pattern)
+    if args.command == "grep":
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False, default=str))
+    elif args.batch > 0:
+        started = datetime.now()
+        accepted, duplicates, failed = replay_batch(
+            records, args.url, args.batch, os.getenv("WEBHOOK_BATCH_TOKEN"),
+        )
+        print(f"✅ replay: {accepted} nuevos, {duplicates} duplicados, {failed} con error en {datetime.now() - started}")
+    else:
+        started = datetime.now()
+        sent, failed = replay(records, args.url, args.rate)
+        print(f"✅ replay: {sent} enviados, {failed} con error en {datetime.now() - started}")
+
+
+if __name__ == "__main__":
+    main()
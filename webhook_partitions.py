@@ -0,0 +1,139 @@
+import argparse
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from app import db_cursor
+
+# Ciclo de vida de las particiones de webhooks (migración 20261016_02):
+#   ensure: crea las particiones de los próximos N períodos (mensuales o semanales).
+#   retire: desadjunta (y con --drop borra) las particiones cuyo rango termina
+#           antes de now - older_than_days. Limpia también webhook_ids viejos.
+#   list:   particiones con su rango y tamaño.
+# Pensado para cron diario, p.ej. `python webhook_partitions.py ensure --ahead 3`.
+
+PARENT = "webhooks"
+_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def _period_start(now: datetime, interval: str) -> datetime:
+    day = now.astimezone(ZoneInfo("UTC")).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())  # lunes ISO
+    return day.replace(day=1)
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == "week":
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(start: datetime, interval: str) -> str:
+    if interval == "week":
+        year, week, _ = start.isocalendar()
+        return f"{PARENT}_p{year}w{week:02d}"
+    return f"{PARENT}_p{start:%Y_%m}"
+
+
+def list_partitions(cur):
+    """[(nombre, upper_bound|None, bound_expr, bytes)] ordenado por nombre."""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), pg_total_relation_size(c.oid)
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = %s::regclass
+         ORDER BY c.relname
+    """, (PARENT,))
+    partitions = []
+    for name, bound, size in cur.fetchall():
+        match = _BOUND_RE.search(bound or "")
+        upper = datetime.fromisoformat(match.group(1)) if match else None
+        partitions.append((name, upper, bound, size))
+    return partitions
+
+
+def ensure(ahead: int, interval: str, now: datetime = None):
+    """Crea las particiones que falten desde el período actual hasta +ahead."""
+    start = _period_start(now or datetime.now(ZoneInfo("UTC")), interval)
+    created = []
+    with db_cursor() as cur:
+        existing = list_partitions(cur)
+        covered_until = max((upper for _, upper, _, _ in existing if upper), default=None)
+        for _ in range(ahead + 1):
+            end = _next_period(start, interval)
+            # no pisar rangos ya cubiertos (legacy, o particiones de otro intervalo):
+            # la primera partición nueva arranca donde termina la última existente
+            lower = max(start, covered_until) if covered_until else start
+            if lower < end:
+                name = _partition_name(start, interval)
+                cur.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT} '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    (lower, end),
+                )
+                created.append(name)
+                covered_until = end
+            start = end
+    return created
+
+
+def retire(older_than_days: int, drop: bool = False, now: datetime = None):
+    """Desadjunta (o borra) particiones cuyo upper bound es <= cutoff. La DEFAULT
+    nunca se toca. Devuelve los nombres retirados."""
+    cutoff = (now or datetime.now(ZoneInfo("UTC"))) - timedelta(days=older_than_days)
+    retired = []
+    with db_cursor() as cur:
+        cur.execute("SELECT to_regclass('webhook_topic_counts') IS NOT NULL")
+        has_counts = cur.fetchone()[0]
+        for name, upper, _, _ in list_partitions(cur):
+            if upper is None or upper > cutoff:
+                continue
+            if has_counts:
+                # DETACH no dispara el trigger de DELETE: descontar a mano
+                cur.execute(f"""
+                    INSERT INTO webhook_topic_counts (topic, shard, raw_count)
+                    SELECT topic, 0, -COUNT(*) FROM "{name}" WHERE topic IS NOT NULL GROUP BY topic
+                    ON CONFLICT (topic, shard) DO UPDATE
+                        SET raw_count = webhook_topic_counts.raw_count + EXCLUDED.raw_count
+                """)
+            cur.execute(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}"')
+            if drop:
+                cur.execute(f'DROP TABLE "{name}"')
+            retired.append(name)
+        if retired:
+            # ML no redelivera tan tarde; sin esto webhook_ids crece sin límite
+            cur.execute("DELETE FROM webhook_ids WHERE received_at < %s", (cutoff,))
+    return retired
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Particiones de la tabla webhooks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ensure = sub.add_parser("ensure", help="crea particiones futuras")
+    p_ensure.add_argument("--ahead", type=int, default=3, help="períodos a crear por delante")
+    p_ensure.add_argument("--interval", choices=("month", "week"), default="month")
+
+    p_retire = sub.add_parser("retire", help="desadjunta/borra particiones viejas")
+    p_retire.add_argument("--older-than-days", type=int, required=True)
+    p_retire.add_argument("--drop", action="store_true", help="DROP en vez de sólo DETACH")
+
+    sub.add_parser("list", help="lista particiones")
+
+    args = parser.parse_args(argv)
+    if args.command == "ensure":
+        created = ensure(args.ahead, args.interval)
+        print(f"✅ particiones creadas: {', '.join(created) if created else 'ninguna'}")
+    elif args.command == "retire":
+        retired = retire(args.older_than_days, drop=args.drop)
+        action = "borradas" if args.drop else "desadjuntadas"
+        print(f"✅ particiones {action}: {', '.join(retired) if retired else 'ninguna'}")
+    else:
+        with db_cursor() as cur:
+            for name, upper, bound, size in list_partitions(cur):
+                print(f"{name:<28}{size / 1024 / 1024:>10.1f} MB  {bound}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from app import (
+    _redis_client,
+    INGEST_STREAM_KEY,
+    INGEST_STREAM_GROUP,
+    INGEST_DEAD_QUEUE_KEY,
+    WEBHOOK_RAW_JSONB,
+    db_cursor,
+    _insert_webhook_batch,
+    _dispatch_preview,
+    _invalidate_webhooks_page,
+    redis_batch,
+)
+
+# Drena el stream de ingesta (WEBHOOK_INGEST_STREAM=1) con un consumer group:
+# XREADGROUP en batches grandes -> un INSERT multi-fila + upsert de webhook_latest
+# -> commit -> XACK -> dispatch de previews de los eventos nuevos.
+# Si el proceso muere antes del XACK, las entradas quedan pendientes y otro
+# consumer (o este mismo al reiniciar) las reclama con XPENDING/XCLAIM.
+# El stream no se recorta por largo en el XADD: _trim_consumed() hace XTRIM MINID
+# hasta la entrada más vieja que algún group todavía no terminó.
+
+BATCH = int(os.getenv("INGEST_BATCH", "500"))
+BLOCK_MS = int(os.getenv("INGEST_BLOCK_MS", "5000"))
+RECLAIM_IDLE_MS = int(os.getenv("INGEST_RECLAIM_IDLE_MS", "60000"))
+RECLAIM_EVERY = float(os.getenv("INGEST_RECLAIM_EVERY", "30"))
+MAX_DELIVERIES = int(os.getenv("INGEST_MAX_DELIVERIES", "10"))
+TRIM_EVERY = float(os.getenv("INGEST_TRIM_EVERY", "60"))
+CONSUMER = os.getenv("INGEST_CONSUMER") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _ensure_group():
+    try:
+        _redis_client.xgroup_create(INGEST_STREAM_KEY, INGEST_STREAM_GROUP, id="0", mkstream=True)
+    except Exception as err:
+        if "BUSYGROUP" not in str(err):
+            raise
+
+
+def _enqueue_dead_letter(entry_id: str, body, error: str):
+    payload = {
+        "stream_id": entry_id,
+        "body": body,
+        "error": error,
+        "failed_at": datetime.now(ZoneInfo("UTC")).isoformat(),
+    }
+    _redis_client.rpush(INGEST_DEAD_QUEUE_KEY, json.dumps(payload))
+
+
+def _decode_entries(entries):
+    """Separa entradas parseables de las inválidas (estas van directo a dead-letter)."""
+    valid, invalid = [], []
+    for entry_id, fields in entries:
+        body = (fields or {}).get("body")
+        try:
+            evento = json.loads(body)
+            if not isinstance(evento, dict) or not evento:
+                raise ValueError("body vacío o no-objeto")
+            valid.append((entry_id, evento, body))
+        except Exception as err:
+            invalid.append((entry_id, body, str(err)))
+    return valid, invalid
+
+
+def _write_batch(valid):
+    # el body del stream ya es el JSON original: con WEBHOOK_RAW_JSONB va directo a ::jsonb
+    raws = [body for _, _, body in valid] if WEBHOOK_RAW_JSONB else None
+    with db_cursor() as cur:
+        inserted, latest_error = _insert_webhook_batch(cur, [e for _, e, _ in valid], raws)
+    if latest_error:
+        print(f"⚠️ ingest: upsert webhook_latest falló: {latest_error}")
+    return inserted
+
+
+def process_entries(entries):
+    """Persiste un batch del stream. Devuelve (nuevos, duplicados, inválidos).
+
+    XACK sólo después del commit. Si el batch completo falla se reintenta
+    entrada por entrada para aislar la que rompe; las que siguen fallando
+    quedan pendientes y las reclama _reclaim_pending.
+    """
+    valid, invalid = _decode_entries(entries)
+    for entry_id, body, error in invalid:
+        _enqueue_dead_letter(entry_id, body, error)
+
+    acked = [entry_id for entry_id, _, _ in invalid]
+    written = []
+    if valid:
+        try:
+            written = list(zip(valid, _write_batch(valid)))
+        except Exception as err:
+            print(f"❌ ingest: batch de {len(valid)} falló ({err}), reintento individual")
+            for item in valid:
+                try:
+                    written.append((item, _write_batch([item])[0]))
+                except Exception as item_err:
+                    print(f"❌ ingest: {item[0]} sigue pendiente: {item_err}")
+
+    acked.extend(item[0] for item, _ in written)
+    if acked:
+        _redis_client.xack(INGEST_STREAM_KEY, INGEST_STREAM_GROUP, *acked)
+
+    new_events = [item[1] for item, ok in written if ok]
+    # un pipeline para los encolados de preview de todo el batch
+    with redis_batch():
+        _invalidate_webhooks_page(*{e.get("topic") for e in new_events if e.get("resource")})
+        for evento in new_events:
+            results = {"errors": []}
+            _dispatch_preview(evento.get("resource", ""), results)
+            for error in results["errors"]:
+                print(f"⚠️ ingest preview {evento.get('resource')}: {error}")
+
+    return len(new_events), len(written) - len(new_events), len(invalid)
+
+
+def _reclaim_pending():
+    """Reclama entradas pendientes de consumers caídos (idle > RECLAIM_IDLE_MS).
+    Las que superan MAX_DELIVERIES van a dead-letter para no trabar el stream."""
+    pending = _redis_client.xpending_range(
+        INGEST_STREAM_KEY, INGEST_STREAM_GROUP,
+        min="-", max="+", count=BATCH, idle=RECLAIM_IDLE_MS,
+    )
+    if not pending:
+        return 0
+
+    retry_ids = []
+    for p in pending:
+        entry_id = p["message_id"]
+        if p["times_delivered"] >= MAX_DELIVERIES:
+            found = _redis_client.xrange(INGEST_STREAM_KEY, min=entry_id, max=entry_id)
+            body = found[0][1].get("body") if found else None
+            _enqueue_dead_letter(entry_id, body, f"max_deliveries={p['times_delivered']}")
+            _redis_client.xack(INGEST_STREAM_KEY, INGEST_STREAM_GROUP, entry_id)
+        else:
+            retry_ids.append(entry_id)
+
+    if not retry_ids:
+        return 0
+    claimed = _redis_client.xclaim(
+        INGEST_STREAM_KEY, INGEST_STREAM_GROUP, CONSUMER, RECLAIM_IDLE_MS, retry_ids,
+    )
+    # una entrada pendiente sin cuerpo fue borrada del stream sin pasar por
+    # Postgres (XDEL / XTRIM manual): queda registrada en dead-letter antes del XACK
+    live = [(entry_id, fields) for entry_id, fields in claimed if fields]
+    gone = [entry_id for entry_id, fields in claimed if not fields]
+    for entry_id in gone:
+        print(f"❌ ingest: {entry_id} pendiente pero ya no está en el stream (evento perdido)")
+        _enqueue_dead_letter(entry_id, None, "trimmed_before_write")
+    if gone:
+        _redis_client.xack(INGEST_STREAM_KEY, INGEST_STREAM_GROUP, *gone)
+    if live:
+        process_entries(live)
+    return len(live)
+
+
+def _stream_id(entry_id):
+    ms, _, seq = str(entry_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _trim_consumed():
+    """XTRIM MINID hasta la entrada más vieja que algún consumer group no
+    terminó: la primera pendiente del group o, si no tiene, la última entregada.
+    Todo lo anterior ya fue entregado y ackeado por todos. Devuelve lo recortado."""
+    groups = _redis_client.xinfo_groups(INGEST_STREAM_KEY)
+    if not groups:
+        return 0
+    floor = None
+    for group in groups:
+        name = group["name"]
+        pending = _redis_client.xpending(INGEST_STREAM_KEY, name)
+        candidate = pending["min"] if pending.get("pending") else group["last-delivered-id"]
+        if _stream_id(candidate) == (0, 0):
+            return 0  # un group que todavía no leyó nada: no se recorta
+        if floor is None or _stream_id(candidate) < _stream_id(floor):
+            floor = candidate
+    # approximate: Redis recorta por nodos enteros (nunca más allá de MINID)
+    return _redis_client.xtrim(INGEST_STREAM_KEY, minid=floor, approximate=True)
+
+
+def run_worker():
+    if _redis_client is None:
+        raise RuntimeError("Redis no está disponible. No se puede iniciar worker_ingest.")
+
+    _ensure_group()
+    print(f"🔄 worker_ingest ({CONSUMER}) consumiendo stream: {INGEST_STREAM_KEY} / {INGEST_STREAM_GROUP}")
+    last_reclaim = last_trim = 0.0
+    while True:
+        if time.time() - last_trim >= TRIM_EVERY:
+            last_trim = time.time()
+            try:
+                trimmed = _trim_consumed()
+                if trimmed:
+                    print(f"🧹 ingest: {trimmed} entradas ya procesadas recortadas del stream")
+            except Exception as err:
+                print(f"❌ ingest: trim falló: {err}")
+
+        if time.time() - last_reclaim >= RECLAIM_EVERY:
+            last_reclaim = time.time()
+            try:
+                reclaimed = _reclaim_pending()
+                if reclaimed:
+                    print(f"♻️ ingest: {reclaimed} entradas pendientes reclamadas")
+            except Exception as err:
+                print(f"❌ ingest: reclaim falló: {err}")
+
+        response = _redis_client.xreadgroup(
+            INGEST_STREAM_GROUP, CONSUMER, {INGEST_STREAM_KEY: ">"},
+            count=BATCH, block=BLOCK_MS,
+        )
+        if not response:
+            continue
+
+        for _, entries in response:
+            try:
+                new, dup, bad = process_entries(entries)
+                print(f"✅ ingest: {len(entries)} entradas (nuevos={new}, dup={dup}, inválidos={bad})")
+            except Exception as err:
+                # sin XACK: quedan pendientes y se reclaman en el próximo ciclo
+                print(f"❌ ingest: batch sin commitear: {err}")
+                time.sleep(1)
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,112 @@
+import os
+import time
+
+from app import (
+    db_cursor,
+    fetch_and_store_preview,
+    redis_batch,
+)
+
+# Drena preview_outbox (WEBHOOK_PREVIEW_OUTBOX=1). Cada ciclo reclama hasta BATCH
+# filas en un solo round trip (UPDATE ... FOR UPDATE SKIP LOCKED + lease), así
+# varias instancias pueden correr en paralelo sin pisarse. Las filas del mismo
+# resource dentro del batch se procesan una sola vez. Éxito -> DELETE;
+# error -> backoff vía available_at, y tras MAX_ATTEMPTS queda marcada dead_at.
+
+BATCH = int(os.getenv("OUTBOX_BATCH", "200"))
+LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "600"))
+IDLE_SLEEP = float(os.getenv("OUTBOX_IDLE_SLEEP", "2"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "3"))
+
+
+def claim_batch(limit=BATCH):
+    """Toma filas disponibles con lease. Devuelve [(id, resource, attempts)]."""
+    with db_cursor() as cur:
+        cur.execute("""
+            UPDATE preview_outbox o
+               SET claimed_until = NOW() + make_interval(secs => %s),
+                   attempts = o.attempts + 1
+             WHERE o.id IN (
+                SELECT id
+                  FROM preview_outbox
+                 WHERE dead_at IS NULL
+                   AND available_at <= NOW()
+                   AND (claimed_until IS NULL OR claimed_until < NOW())
+                 ORDER BY available_at, id
+                 LIMIT %s
+                 FOR UPDATE SKIP LOCKED
+             )
+            RETURNING o.id, o.resource, o.attempts
+        """, (LEASE_SECONDS, limit))
+        return cur.fetchall()
+
+
+def _complete(ids):
+    with db_cursor() as cur:
+        cur.execute("DELETE FROM preview_outbox WHERE id = ANY(%s)", (ids,))
+
+
+def _fail(ids, attempts, error):
+    with db_cursor() as cur:
+        if attempts >= MAX_ATTEMPTS:
+            cur.execute("""
+                UPDATE preview_outbox
+                   SET dead_at = NOW(), claimed_until = NULL, last_error = %s
+                 WHERE id = ANY(%s)
+            """, (error, ids))
+        else:
+            backoff_seconds = min(60, attempts * 10)
+            cur.execute("""
+                UPDATE preview_outbox
+                   SET available_at = NOW() + make_interval(secs => %s),
+                       claimed_until = NULL, last_error = %s
+                 WHERE id = ANY(%s)
+            """, (backoff_seconds, error, ids))
+
+
+def process_batch(rows):
+    """Procesa un batch reclamado. Devuelve (resources_ok, resources_fallidos)."""
+    by_resource = {}
+    for row_id, resource, attempts in rows:
+        ids, max_attempts = by_resource.get(resource, ([], 0))
+        ids.append(row_id)
+        by_resource[resource] = (ids, max(max_attempts, attempts))
+
+    done, failed = [], 0
+    for resource, (ids, attempts) in by_resource.items():
+        try:
+            with redis_batch():
+                # sin raise_errors el fallo volvería como preview "Error" y el
+                # job se borraría como hecho, sin backoff ni dead_at
+                fetch_and_store_preview(resource, raise_errors=True)
+            done.extend(ids)
+        except Exception as err:
+            failed += 1
+            print(f"❌ outbox {resource}: {err}")
+            _fail(ids, attempts, str(err))
+
+    if done:
+        _complete(done)
+    return len(by_resource) - failed, failed
+
+
+def run_worker():
+    print(f"🔄 worker_outbox drenando preview_outbox (batch={BATCH}, lease={LEASE_SECONDS}s)")
+    while True:
+        try:
+            rows = claim_batch()
+        except Exception as err:
+            print(f"❌ outbox: claim falló: {err}")
+            time.sleep(IDLE_SLEEP)
+            continue
+
+        if not rows:
+            time.sleep(IDLE_SLEEP)
+            continue
+
+        ok, failed = process_batch(rows)
+        print(f"✅ outbox: {len(rows)} filas -> {ok} previews ok, {failed} con error")
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -1,17 +1,31 @@
 import json
+import os
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from app import (
     _redis_client,
+    _redis_deferred,
     PREVIEW_QUEUE_KEY,
     PREVIEW_DEAD_QUEUE_KEY,
+    PREVIEW_COALESCE,
+    PREVIEW_DUE_KEY,
+    PREVIEW_ATTEMPTS_KEY,
+    PREVIEW_LANES,
+    PREVIEW_LANE_WEIGHTS,
+    _preview_lane,
+    _preview_lane_key,
+    _schedule_preview,
+    _claim_due_previews,
     fetch_and_store_preview,
+    redis_batch,
 )
 
 
 MAX_ATTEMPTS = 3
+CLAIM_ROUNDS = int(os.getenv("PREVIEW_CLAIM_ROUNDS", "1"))  # rondas weighted-fair por ciclo (peso * rondas por lane)
+POLL_INTERVAL = float(os.getenv("PREVIEW_POLL_INTERVAL", "0.5"))
 
 
 def _enqueue_dead_letter(message: dict, error: str):
@@ -35,35 +49,108 @@ def _retry_or_dead(message: dict, error: str):
     message["attempt"] = next_attempt
     message["last_error"] = error
     message["requeued_at"] = datetime.now(ZoneInfo("UTC")).isoformat()
-    _redis_client.rpush(PREVIEW_QUEUE_KEY, json.dumps(message))
+    lane = _preview_lane(message.get("resource") or "")
+    _redis_client.rpush(_preview_lane_key(PREVIEW_QUEUE_KEY, lane), json.dumps(message))
+
+
+def _retry_or_dead_coalesced(resource: str, error: str):
+    """Reintento en modo coalesce: el attempt vive en un hash y el reintento se
+    re-agenda con vencimiento fijo (sin bloquear el worker con sleep)."""
+    attempt = _redis_client.hincrby(PREVIEW_ATTEMPTS_KEY, resource, 1)
+    if attempt >= MAX_ATTEMPTS:
+        _redis_client.hdel(PREVIEW_ATTEMPTS_KEY, resource)
+        _enqueue_dead_letter({"resource": resource, "attempt": attempt}, error)
+        return
+    _schedule_preview(resource, delay=min(10, (attempt + 1) * 2))
+
+
+def run_coalesced_worker():
+    print(f"🔄 worker_preview (coalesce) drenando vencimientos: {PREVIEW_DUE_KEY}")
+    while True:
+        resources = _claim_due_previews(CLAIM_ROUNDS)
+        if not resources:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        for resource in resources:
+            try:
+                with redis_batch():  # SSE del preview + limpieza del attempt en un round trip
+                    fetch_and_store_preview(resource, raise_errors=True)
+                    _redis_deferred(lambda client: client.hdel(PREVIEW_ATTEMPTS_KEY, resource))
+                print(f"✅ Preview procesado: {resource}")
+            except Exception as err:
+                print(f"❌ Error procesando preview {resource}: {err}")
+                _retry_or_dead_coalesced(resource, str(err))
+
+
+def _lane_queue_keys():
+    # la lista sin lane queda al final: drena jobs encolados antes del deploy
+    return [_preview_lane_key(PREVIEW_QUEUE_KEY, lane) for lane in PREVIEW_LANES] + [PREVIEW_QUEUE_KEY]
+
+
+def _blocking_queue_keys():
+    """Keys para el BLPOP de espera: sólo lanes con peso > 0 (peso 0 pausa la
+    lane, igual que en _pop_weighted) y la lista legacy sólo si `other` > 0."""
+    keys = [_preview_lane_key(PREVIEW_QUEUE_KEY, lane) for lane in PREVIEW_LANES if PREVIEW_LANE_WEIGHTS.get(lane, 0) > 0]
+    if PREVIEW_LANE_WEIGHTS.get("other", 0) > 0:
+        keys.append(PREVIEW_QUEUE_KEY)
+    return keys
+
+
+def _pop_weighted(rounds: int = CLAIM_ROUNDS):
+    """Una ronda weighted-fair: hasta `peso * rounds` mensajes de cada lane, en
+    orden de prioridad, en un solo round trip (LRANGE + LTRIM atómico por lane)."""
+    weights = [PREVIEW_LANE_WEIGHTS.get(lane, 0) * rounds for lane in PREVIEW_LANES]
+    weights.append(PREVIEW_LANE_WEIGHTS.get("other", 0) * rounds)  # legacy
+    pipe = _redis_client.pipeline(transaction=True)
+    for key, count in zip(_lane_queue_keys(), weights):
+        if count > 0:
+            pipe.lrange(key, 0, count - 1)
+            pipe.ltrim(key, count, -1)
+    replies = pipe.execute()
+    return [raw for batch in replies[0::2] for raw in batch]
+
+
+def _process_message(raw_message):
+    message = None
+    try:
+        message = json.loads(raw_message)
+        resource = message.get("resource")
+        if not resource:
+            raise ValueError("Mensaje sin 'resource'")
+
+        with redis_batch():
+            fetch_and_store_preview(resource, raise_errors=True)
+        print(f"✅ Preview procesado: {resource}")
+    except Exception as err:
+        print(f"❌ Error procesando preview queue: {err}")
+        parsed = message if isinstance(message, dict) else {"raw": raw_message, "attempt": 1}
+        _retry_or_dead(parsed, str(err))
 
 
 def run_worker():
     if _redis_client is None:
         raise RuntimeError("Redis no está disponible. No se puede iniciar worker_preview.")
+    if PREVIEW_COALESCE:
+        return run_coalesced_worker()
 
-    print(f"🔄 worker_preview escuchando cola: {PREVIEW_QUEUE_KEY}")
+    weights = ", ".join(f"{lane}={PREVIEW_LANE_WEIGHTS.get(lane, 0)}" for lane in PREVIEW_LANES)
+    print(f"🔄 worker_preview escuchando lanes de {PREVIEW_QUEUE_KEY} ({weights})")
     while True:
-        item = _redis_client.blpop(PREVIEW_QUEUE_KEY, timeout=5)
-        if not item:
-            continue
+        messages = _pop_weighted()
+        if not messages:
+            # todo vacío: bloquea en las lanes activas; BLPOP respeta el orden de keys
+            keys = _blocking_queue_keys()
+            if not keys:
+                time.sleep(POLL_INTERVAL)  # todas las lanes en pausa
+                continue
+            item = _redis_client.blpop(keys, timeout=5)
+            if not item:
+                continue
+            messages = [item[1]]
 
-        _, raw_message = item
-        try:
-            message = json.loads(raw_message)
-            resource = message.get("resource")
-            if not resource:
-                raise ValueError("Mensaje sin 'resource'")
-
-            fetch_and_store_preview(resource)
-            print(f"✅ Preview procesado: {resource}")
-        except Exception as err:
-            print(f"❌ Error procesando preview queue: {err}")
-            try:
-                parsed = message if isinstance(message, dict) else {"raw": raw_message, "attempt": 1}
-            except Exception:
-                parsed = {"raw": raw_message, "attempt": 1}
-            _retry_or_dead(parsed, str(err))
+        for raw_message in messages:
+            _process_message(raw_message)
 
 
 if __name__ == "__main__":